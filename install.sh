@@ -39,6 +39,7 @@ mkdir -p "$BINDIR"
 mkdir -p "$COREDIR"
 mkdir -p "$MODULEDIR"
 mkdir -p "$CONFIGDIR"
+mkdir -p "$CONFIGDIR/conf.d"
 mkdir -p /var/log/yarp
 mkdir -p /var/run/yarp
 
@@ -49,7 +50,19 @@ install -m 755 src/core/yarp "$BINDIR/yarp"
 install -m 755 src/core/yarp-apply.sh "$BINDIR/yarp-apply"
 install -m 755 src/core/yarp-check.sh "$BINDIR/yarp-check"
 install -m 644 src/core/yarp_config.py "$COREDIR/yarp_config.py"
+install -m 644 src/core/yarp_model.py "$COREDIR/yarp_model.py"
+install -m 644 src/core/yarp_schema.py "$COREDIR/yarp_schema.py"
+install -m 644 src/core/yarp_plan.py "$COREDIR/yarp_plan.py"
+install -m 644 src/core/yarp_diff.py "$COREDIR/yarp_diff.py"
+install -m 644 src/core/yarp_rollback.py "$COREDIR/yarp_rollback.py"
+install -m 644 src/core/yarp_metrics.py "$COREDIR/yarp_metrics.py"
+install -m 644 src/core/yarp_trace.py "$COREDIR/yarp_trace.py"
+install -m 644 src/core/yarp_exec.py "$COREDIR/yarp_exec.py"
+install -m 644 src/core/yarp_status.py "$COREDIR/yarp_status.py"
+install -m 644 src/core/yarp_stats.py "$COREDIR/yarp_stats.py"
+install -m 644 src/core/yarp_conntrack.py "$COREDIR/yarp_conntrack.py"
 install -m 644 src/core/yarp_logger.py "$COREDIR/yarp_logger.py"
+install -m 644 src/core/yarp_apply.py "$COREDIR/yarp_apply.py"
 install -m 644 VERSION "$PREFIX/VERSION"
 
 # Copie des modules
@@ -68,6 +81,7 @@ touch "$MODULEDIR/__init__.py"
 echo ""
 echo "[5/8] Installation du service OpenRC..."
 install -m 755 src/init/yarp /etc/init.d/yarp
+install -m 755 src/init/yarp-stats /etc/init.d/yarp-stats
 
 # MOTD
 echo ""
@@ -52,6 +52,18 @@ for file in \
     /opt/yarp/bin/yarp-check \
     /opt/yarp/core/yarp_config.py \
     /opt/yarp/core/yarp_logger.py \
+    /opt/yarp/core/yarp_apply.py \
+    /opt/yarp/core/yarp_model.py \
+    /opt/yarp/core/yarp_schema.py \
+    /opt/yarp/core/yarp_plan.py \
+    /opt/yarp/core/yarp_diff.py \
+    /opt/yarp/core/yarp_rollback.py \
+    /opt/yarp/core/yarp_metrics.py \
+    /opt/yarp/core/yarp_trace.py \
+    /opt/yarp/core/yarp_exec.py \
+    /opt/yarp/core/yarp_status.py \
+    /opt/yarp/core/yarp_stats.py \
+    /opt/yarp/core/yarp_conntrack.py \
     /opt/yarp/modules/network.py \
     /opt/yarp/modules/routing.py \
     /opt/yarp/modules/nat.py \
@@ -0,0 +1,607 @@
+#!/usr/bin/env python3
+"""
+YARP Apply
+Application complète de la configuration dans un seul processus
+"""
+
+import contextlib
+import json
+import sys
+import os
+import re
+import time
+
+YARP_DIR = "/opt/yarp"
+sys.path.insert(0, os.path.join(YARP_DIR, 'core'))
+sys.path.insert(0, os.path.join(YARP_DIR, 'modules'))
+
+from yarp_config import YARPConfig
+from yarp_logger import get_logger
+from yarp_plan import Plan, History, is_read_only
+from yarp_diff import diff_config, affected_phases, ALL_PHASES
+from yarp_rollback import RollbackManager, read_pending
+from yarp_metrics import metrics, write_summary
+from yarp_logger import dropped_records, flush_logs
+from yarp_trace import tracer
+from yarp_exec import executor, command_line
+from yarp_status import invalidate_cache
+
+CONFIG_FILE = "/etc/yarp/config.yaml"
+ALPINE_INTERFACES = "/etc/network/interfaces"
+ALPINE_BACKUP = "/etc/network/interfaces.yarp-backup"
+STATE_DIR = "/var/lib/yarp"
+# Dernier apply réussi : fragments (chemin → sha256, sections) et
+# configuration fusionnée, référence du prochain apply incrémental
+APPLIED_FRAGMENTS = os.path.join(STATE_DIR, "applied-fragments.json")
+APPLIED_CONFIG = os.path.join(STATE_DIR, "applied-config.json")
+BOOT_ID_FILE = "/proc/sys/kernel/random/boot_id"
+
+# Modifications affichées en détail (les suivantes sont comptées)
+MAX_REPORTED_CHANGES = 50
+
+
+class ApplyOrchestrator:
+    """Enchaîne les phases de yarp apply avec une configuration partagée.
+
+    La configuration est chargée et validée une seule fois, puis passée
+    aux managers des modules instanciés dans le même processus. La durée
+    de chaque phase est mesurée et journalisée.
+
+    Toutes les phases sont rejouées, ce qui répare aussi les écarts
+    survenus hors de YARP (chaîne vidée, route supprimée). Avec
+    incremental=True (yarp reload), seules les phases concernées par les
+    modifications depuis le dernier apply réussi (yarp_diff) le sont.
+    Avec plan=True, rien n'est modifié : les opérations sont enregistrées
+    dans self.plan (yarp plan). Avec confirm=N, un instantané est pris
+    avant la première modification ; il est restauré aussitôt si l'apply
+    échoue, ou après N secondes sans yarp confirm (yarp_rollback).
+    """
+
+    def __init__(self, config_file=CONFIG_FILE, incremental=False, plan=False, confirm=None):
+        self.config_file = config_file
+        self.incremental = incremental
+        self.plan = Plan() if plan else None
+        self.confirm = confirm if not plan else None
+        self.rollback = None
+        self.config = None
+        self.logger = None
+        # (phase, durée en ms, succès)
+        self.timings = []
+        # Phases à rejouer (None : toutes) et modifications (yarp_diff.Change)
+        self.selected = None
+        self.skipped = []
+        self.changes = None
+
+    def _run_command(self, cmd, check=True, timeout=None):
+        """Exécute une commande système avec logging (voir yarp_exec)"""
+        if self.plan is not None and not is_read_only(command_line(cmd)):
+            return self.plan.command(command_line(cmd))
+        return executor.run(cmd, timeout=timeout, logger=self.logger)
+
+    def _write_file(self, path, content):
+        """Écrit un fichier (en mode plan : enregistré s'il change)"""
+        if self.plan is not None:
+            try:
+                with open(path, 'r') as f:
+                    if f.read() == content:
+                        return
+            except IOError:
+                pass
+            self.plan.write(path)
+            return
+        with open(path, 'w') as f:
+            f.write(content)
+
+    def _manager(self, manager):
+        """Passe le mode plan à un manager de module"""
+        manager.plan = self.plan
+        return manager
+
+    def _phase(self, name, func):
+        """Exécute une phase en mesurant sa durée"""
+        if self.plan is not None:
+            self.plan.begin(name)
+        start = time.monotonic()
+        try:
+            with tracer.span(name, "phase"):
+                success = func()
+        except Exception as e:
+            if self.logger:
+                self.logger.error(f"Phase {name}: exception {type(e).__name__}: {e}")
+            print(f"[ERROR] Phase {name}: {type(e).__name__}: {e}", file=sys.stderr)
+            success = False
+        duration_ms = int((time.monotonic() - start) * 1000)
+        self.timings.append((name, duration_ms, bool(success)))
+        # Les durées d'un plan ne sont pas celles d'un apply : pas d'historique
+        if self.plan is None:
+            metrics.record_phase(name, duration_ms, success)
+            if self.logger:
+                self.logger.info(
+                    f"Phase {name}: {duration_ms} ms",
+                    phase=name, duration_ms=duration_ms, success=bool(success)
+                )
+        return success
+
+    # ------------------------------------------------------------------ #
+    #  Phases                                                              #
+    # ------------------------------------------------------------------ #
+
+    def load_config(self):
+        """Charge et valide la configuration (une seule fois par apply)"""
+        config = YARPConfig(self.config_file)
+        if not config.load() or not config.validate():
+            print("[ERROR] Configuration invalide", file=sys.stderr)
+            return False
+
+        self.config = config
+        self.logger = get_logger("yarp", {'logging': config.get_logging()})
+        return True
+
+    def configure_alpine(self):
+        """Sauvegarde /etc/network/interfaces et retire les interfaces YARP"""
+        try:
+            if not os.path.exists(ALPINE_BACKUP) and os.path.exists(ALPINE_INTERFACES):
+                self.logger.info("Sauvegarde de la configuration Alpine originale...")
+                with open(ALPINE_INTERFACES, 'r') as src:
+                    self._write_file(ALPINE_BACKUP, src.read())
+
+            lines = [
+                "# Configuration réseau Alpine - Géré par YARP",
+                "# Les interfaces suivantes sont gérées par YARP:",
+            ]
+            for iface in self.config.get_interfaces():
+                lines.append(f"# - {iface} (géré par YARP)")
+            lines += ["", "auto lo", "iface lo inet loopback"]
+
+            self._write_file(ALPINE_INTERFACES, "\n".join(lines) + "\n")
+            self.logger.info("Configuration Alpine mise à jour")
+            return True
+        except IOError as e:
+            self.logger.error(f"Impossible de mettre à jour {ALPINE_INTERFACES}: {e}")
+            return False
+
+    def configure_system(self):
+        """Hostname, /etc/hosts et timezone"""
+        system = self.config.get_system()
+        hostname = system.get('hostname', '')
+        domain = system.get('domain', '')
+        timezone = system.get('timezone', '')
+
+        if hostname:
+            self.logger.info(f"Configuration hostname: {hostname}")
+            self._run_command(["hostname", hostname], check=False)
+            try:
+                self._write_file("/etc/hostname", f"{hostname}\n")
+
+                # Entrée /etc/hosts avec FQDN si domain est défini
+                names = f"{hostname}.{domain} {hostname}" if domain else hostname
+                with open("/etc/hosts", 'r') as f:
+                    hosts = f.read().splitlines()
+                hosts = [
+                    f"127.0.0.1\tlocalhost {names}" if re.match(r'^127\.0\.0\.1.*localhost', line) else line
+                    for line in hosts
+                ]
+                self._write_file("/etc/hosts", "\n".join(hosts) + "\n")
+            except IOError as e:
+                self.logger.error(f"Impossible de configurer le hostname: {e}")
+                return False
+
+        # Note: domain et search dans /etc/resolv.conf sont gérés par le module dns.py
+
+        if timezone:
+            self.logger.info(f"Configuration timezone: {timezone}")
+            zoneinfo = f"/usr/share/zoneinfo/{timezone}"
+            if not os.path.isfile(zoneinfo):
+                # Tenter d'installer tzdata si absent
+                self.logger.info(f"Installation de tzdata pour {timezone}...")
+                self._run_command("apk add --no-cache tzdata", check=False, timeout=300)
+
+            if self.plan is not None:
+                if not os.path.islink("/etc/localtime") or os.readlink("/etc/localtime") != zoneinfo:
+                    self.plan.write("/etc/localtime")
+                self._write_file("/etc/timezone", f"{timezone}\n")
+            elif os.path.isfile(zoneinfo):
+                try:
+                    if os.path.lexists("/etc/localtime"):
+                        os.remove("/etc/localtime")
+                    os.symlink(zoneinfo, "/etc/localtime")
+                    self._write_file("/etc/timezone", f"{timezone}\n")
+                    self.logger.info(f"Timezone configuré: {timezone}")
+                except OSError as e:
+                    self.logger.error(f"Impossible de configurer la timezone: {e}")
+                    return False
+            else:
+                self.logger.warning(f"Timezone invalide ou tzdata non disponible: {timezone}")
+
+        return True
+
+    def configure_dns(self):
+        from dns import DNSManager
+        return self._manager(DNSManager(self.config)).apply()
+
+    def configure_network(self):
+        from network import NetworkManager
+        return self._manager(NetworkManager(self.config)).apply_all()
+
+    def configure_routing(self):
+        from routing import RoutingManager
+        return self._manager(RoutingManager(self.config)).apply_all()
+
+    def configure_nat(self):
+        from nat import NATManager
+        return self._manager(NATManager(self.config)).apply_all()
+
+    def configure_firewall(self):
+        from firewall import FirewallManager
+        return self._manager(FirewallManager(self.config)).apply_all()
+
+    def save_state(self):
+        """Sauvegarde l'état réseau et firewall appliqué, et la
+        configuration correspondante (référence du prochain apply incrémental)"""
+        os.makedirs(STATE_DIR, exist_ok=True)
+        for filename, cmd in (
+            ("interfaces.json", "ip -j addr show"),
+            ("routes.json", "ip -j route show"),
+            ("iptables.rules", "iptables-save"),
+            ("ip6tables.rules", "ip6tables-save"),
+        ):
+            success, stdout, _ = self._run_command(cmd, check=False)
+            if not success:
+                continue
+            with open(os.path.join(STATE_DIR, filename), 'w') as f:
+                f.write(stdout)
+
+        applied = {
+            'config_file': os.path.abspath(self.config_file),
+            'boot_id': self._boot_id(),
+            'version': self._version(),
+            'fragments': {
+                fragment.path: {'sha256': fragment.sha256, 'sections': list(fragment.sections)}
+                for fragment in self.config.fragments
+            },
+        }
+        # La configuration d'abord : des fragments enregistrés désignent
+        # toujours la configuration qui leur correspond
+        for path, data, options in (
+            (APPLIED_CONFIG, self.config.config, {'separators': (',', ':'), 'default': str}),
+            (APPLIED_FRAGMENTS, applied, {'indent': 2}),
+        ):
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(data, f, **options)
+            os.replace(tmp_path, path)
+        invalidate_cache()
+
+        self.logger.info("État sauvegardé")
+        return True
+
+    def take_snapshot(self):
+        """Instantané de l'état courant avant apply --confirm.
+
+        Si un apply précédent attend encore sa confirmation, son
+        instantané (dernier état confirmé) est conservé.
+        """
+        self.rollback = RollbackManager(self.config.get_logging())
+        if read_pending() is not None and self.rollback.load() is not None:
+            print("Apply précédent non confirmé : son instantané est conservé")
+            return True
+        self.rollback.capture()
+        return True
+
+    # ------------------------------------------------------------------ #
+    #  Apply incrémental                                                   #
+    # ------------------------------------------------------------------ #
+
+    def _boot_id(self):
+        try:
+            with open(BOOT_ID_FILE) as f:
+                return f.read().strip()
+        except OSError:
+            return None
+
+    def _version(self):
+        try:
+            with open(os.path.join(YARP_DIR, "VERSION")) as f:
+                return f.read().strip()
+        except OSError:
+            return None
+
+    def _read_json(self, path):
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def changes_since_applied(self, strict=True):
+        """Modifications (yarp_diff.Change) depuis le dernier apply réussi.
+
+        Retourne None si aucune référence n'est utilisable. Avec strict,
+        également après un redémarrage (état noyau perdu), une mise à jour
+        de YARP ou pour un autre fichier de configuration : tout est alors
+        rejoué. Si aucun fragment n'a changé, la configuration appliquée
+        n'est pas relue.
+        """
+        applied = self._read_json(APPLIED_FRAGMENTS)
+        if not isinstance(applied, dict) or not isinstance(applied.get('fragments'), dict):
+            return None
+        if strict and (
+            applied.get('config_file') != os.path.abspath(self.config_file)
+            or applied.get('boot_id') != self._boot_id()
+            or applied.get('version') != self._version()
+        ):
+            return None
+
+        previous = {path: (entry or {}).get('sha256') for path, entry in applied['fragments'].items()}
+        current = {fragment.path: fragment.sha256 for fragment in self.config.fragments}
+        if previous == current:
+            return []
+
+        before = self._read_json(APPLIED_CONFIG)
+        if not isinstance(before, dict):
+            return None
+        return diff_config(before, self.config.config)
+
+    def _has_route_feeds(self):
+        """Indique si des routes viennent de fichiers externes (routing.static[].file)"""
+        routing = self.config.get_routing() or {}
+        routes = list(routing.get('static') or ())
+        for table in (routing.get('tables') or {}).values():
+            routes.extend(table.get('routes') or ())
+        return any(isinstance(route, dict) and route.get('file') for route in routes)
+
+    def select_phases(self):
+        """Détermine les phases à rejouer (self.selected, None : toutes)"""
+        if not self.incremental:
+            return
+        changes = self.changes_since_applied()
+        if changes is None:
+            return
+
+        self.changes = changes
+        self.report_changes()
+        self.selected = set(self.phases_for(changes))
+
+    def phases_for(self, changes):
+        """Phases à rejouer pour des modifications (None : toutes)"""
+        if changes is None:
+            return list(ALL_PHASES)
+        phases = set(affected_phases(changes))
+        # Le contenu des flux de routes n'est pas dans la configuration :
+        # la réconciliation du routage est toujours rejouée
+        if self._has_route_feeds():
+            phases.add("routing")
+        return [phase for phase in ALL_PHASES if phase in phases]
+
+    def report_changes(self):
+        """Affiche et journalise les modifications depuis le dernier apply"""
+        self.logger.info(
+            f"{len(self.changes)} modification(s) depuis le dernier apply",
+            changes=[change.to_dict() for change in self.changes[:MAX_REPORTED_CHANGES]],
+            phases=affected_phases(self.changes)
+        )
+        for change in self.changes[:MAX_REPORTED_CHANGES]:
+            print(f"  {change}")
+        if len(self.changes) > MAX_REPORTED_CHANGES:
+            print(f"  ... et {len(self.changes) - MAX_REPORTED_CHANGES} autres")
+
+    # ------------------------------------------------------------------ #
+    #  Orchestration                                                       #
+    # ------------------------------------------------------------------ #
+
+    def phases(self):
+        """Phases de l'apply, dans l'ordre d'exécution"""
+        return [
+            ("alpine", self.configure_alpine, "Erreur lors de la mise à jour de la configuration Alpine"),
+            ("system", self.configure_system, "Erreur lors de la configuration système"),
+            ("dns", self.configure_dns, "Erreur lors de la configuration DNS"),
+            ("network", self.configure_network, "Erreur lors de la configuration réseau"),
+            ("routing", self.configure_routing, "Erreur lors de la configuration du routage"),
+            ("nat", self.configure_nat, "Erreur lors de la configuration NAT"),
+            ("firewall", self.configure_firewall, "Erreur lors de la configuration Firewall"),
+            ("state", self.save_state, "Erreur lors de la sauvegarde de l'état"),
+        ]
+
+    def run(self):
+        """Applique toute la configuration ; s'arrête à la première erreur"""
+        with tracer.span("yarp plan" if self.plan is not None else "yarp apply", "apply") as span:
+            success = self._run()
+            span.set(success=success, full=self.selected is None, skipped=self.skipped)
+        return success
+
+    def _run(self):
+        start = time.monotonic()
+        print("=" * 50)
+        print("YARP - " + ("Plan (aucune modification)" if self.plan else "Application de la configuration"))
+        print("=" * 50)
+
+        if not self._phase("validation", self.load_config):
+            return False
+        self.select_phases()
+        if self.confirm is not None:
+            if not self._phase("snapshot", self.take_snapshot):
+                return False
+        elif self.plan is None and read_pending() is not None:
+            print("[WARNING] Un apply précédent attend sa confirmation : "
+                  "sans 'yarp confirm', cet apply sera aussi annulé")
+
+        success = True
+        for name, func, message in self.phases():
+            if self.selected is not None and name != "state" and name not in self.selected:
+                self.skipped.append(name)
+                continue
+            if self.plan is not None and name == "state":
+                continue
+            if not self._phase(name, func):
+                if self.plan is not None:
+                    self.plan.failed = name
+                # Le handler console n'affiche pas les erreurs
+                self.logger.error(message)
+                print(f"[ERROR] {message}", file=sys.stderr)
+                success = False
+                break
+
+        if self.plan is not None:
+            return success
+
+        total_ms = int((time.monotonic() - start) * 1000)
+        self.report_timings(total_ms)
+        self.save_metrics(success, total_ms)
+        if success:
+            self.logger.info("✓ Configuration appliquée avec succès", duration_ms=total_ms)
+        if self.rollback is not None:
+            self.finish_transaction(success)
+        return success
+
+    def finish_transaction(self, success):
+        """apply --confirm : restaure l'instantané si l'apply a échoué,
+        sinon démarre le délai de confirmation"""
+        if not success:
+            print("Retour à l'état précédent...", file=sys.stderr)
+            if self.rollback.rollback("échec de l'apply"):
+                print("État précédent restauré", file=sys.stderr)
+            else:
+                print("[ERROR] Restauration incomplète, voir les logs", file=sys.stderr)
+            return
+        self.rollback.arm(self.confirm, os.path.abspath(self.config_file))
+        print(f"\nConfirmez avec 'yarp confirm' dans les {self.confirm} s, "
+              "sinon l'état précédent sera restauré")
+
+    def show_diff(self, as_json=False):
+        """Affiche les modifications depuis le dernier apply et les phases
+        qu'un yarp reload rejouerait (yarp diff)"""
+        if not self.load_config():
+            return False
+        changes = self.changes_since_applied()
+        phases = self.phases_for(changes)
+        if changes is None:
+            # Diff informatif même si l'apply rejouerait tout (redémarrage...)
+            changes = self.changes_since_applied(strict=False)
+
+        if as_json:
+            print(json.dumps({
+                'applied': changes is not None,
+                'changes': [change.to_dict() for change in changes or ()],
+                'phases': phases,
+            }, indent=2, ensure_ascii=False))
+            return True
+
+        if changes is None:
+            print("Aucun apply précédent : toute la configuration serait appliquée")
+        elif not changes:
+            print("Aucune modification depuis le dernier apply")
+        else:
+            for change in changes:
+                print(change)
+        print(f"Phases à rejouer: {', '.join(phases) or 'aucune'}")
+        return True
+
+    def print_plan(self, as_json=False):
+        """Affiche le plan enregistré, avec les coûts estimés d'après les logs"""
+        files = self.config.get_logging().get('files', {}) if self.config else {}
+        history = History.from_logs(
+            path for path in (files.get('application'), files.get('debug')) if path
+        )
+        if as_json:
+            report = self.plan.to_dict(history)
+            report['skipped'] = self.skipped
+            report['changes'] = [change.to_dict() for change in self.changes or ()]
+            print(json.dumps(report, indent=2, ensure_ascii=False))
+            return
+        print(self.plan.render(history))
+        if self.skipped:
+            print(f"Inchangées (non rejouées): {', '.join(self.skipped)}")
+
+    def save_metrics(self, success, total_ms):
+        """Résumé des durées de l'apply dans /var/lib/yarp/metrics/, avec
+        la taille de la configuration pour comparer des routeurs différents"""
+        summary = metrics.summary(
+            version=self._version(),
+            success=success,
+            full=self.selected is None,
+            duration_ms=total_ms,
+            config=self.config.get_model().sizes(),
+            skipped=self.skipped,
+            log_dropped=dropped_records(),
+        )
+        try:
+            write_summary(summary)
+        except OSError as e:
+            self.logger.warning(f"Impossible d'enregistrer les métriques: {e}")
+
+    def write_trace(self, path):
+        """Exporte les spans de l'apply (format Chrome trace-event)"""
+        # Les écritures de log en file font partie de la trace
+        flush_logs()
+        try:
+            tracer.export(path)
+        except OSError as e:
+            print(f"[ERROR] Impossible d'écrire la trace {path}: {e}", file=sys.stderr)
+            return
+        print(f"Trace écrite dans {path} ({len(tracer.events)} spans, "
+              "à ouvrir dans ui.perfetto.dev ou chrome://tracing)", file=sys.stderr)
+
+    def report_timings(self, total_ms):
+        """Affiche la durée de chaque phase"""
+        print("\n" + "=" * 50)
+        print("Durée par phase")
+        print("=" * 50)
+        for name, duration_ms, success in self.timings:
+            status = "" if success else "  ✗"
+            print(f"  {name:<12} {duration_ms:>7} ms{status}")
+        print(f"  {'total':<12} {total_ms:>7} ms")
+        if self.skipped:
+            print(f"  Inchangées (non rejouées): {', '.join(self.skipped)}")
+
+
+def _option_value(argv, option):
+    """Retire `option valeur` de argv et retourne la valeur (None si absente)"""
+    if option not in argv:
+        return None
+    index = argv.index(option)
+    if index + 1 >= len(argv) or argv[index + 1].startswith("--"):
+        print(f"Usage: yarp apply {option} <valeur> [config_file]", file=sys.stderr)
+        sys.exit(1)
+    value = argv[index + 1]
+    del argv[index:index + 2]
+    return value
+
+
+def main():
+    # Gestion des arguments :
+    # yarp_apply.py [--incremental] [--confirm N] [--trace fichier.json] [--plan|--diff [--json]] [config_file]
+    # --full est accepté pour compatibilité : c'est le comportement par défaut
+    argv = sys.argv[1:]
+    confirm = _option_value(argv, "--confirm")
+    if confirm is not None:
+        if not confirm.isdigit() or int(confirm) == 0:
+            print("Usage: yarp apply --confirm <secondes> [config_file]", file=sys.stderr)
+            sys.exit(1)
+        confirm = int(confirm)
+    trace_file = _option_value(argv, "--trace")
+    if trace_file is not None:
+        tracer.enable()
+    options = {arg for arg in argv if arg.startswith("--")}
+    args = [arg for arg in argv if not arg.startswith("--")]
+    config_file = args[0] if args else CONFIG_FILE
+
+    orchestrator = ApplyOrchestrator(
+        config_file, incremental="--incremental" in options, plan="--plan" in options, confirm=confirm
+    )
+    if "--diff" in options:
+        sys.exit(0 if orchestrator.show_diff(as_json="--json" in options) else 1)
+    if orchestrator.plan is None:
+        success = orchestrator.run()
+    else:
+        # Plan : la sortie des modules passe sur stderr, stdout ne contient que le plan
+        with contextlib.redirect_stdout(sys.stderr):
+            success = orchestrator.run()
+        if orchestrator.config is not None:
+            orchestrator.print_plan(as_json="--json" in options)
+    if trace_file is not None:
+        orchestrator.write_trace(trace_file)
+    sys.exit(0 if success else 1)
+
+
+if __name__ == "__main__":
+    main()
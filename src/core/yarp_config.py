@@ -7,307 +7,461 @@ Parse et valide le fichier de configuration YAML
 import yaml
 import sys
 import os
-import re
-import ipaddress
+import glob
+import hashlib
+import marshal
 from pathlib import Path
 
+from yarp_model import build_model, parse_fwmark, ModelError
+from yarp_schema import (
+    validate as validate_schema, locate, has_errors, Diagnostic, ERROR, WARNING,
+    ROUTE_TYPES, FEED_FORMATS, DNS_FORWARDER_BACKENDS, SafeLoader, format_path,
+)
+import yarp_schema
+
+# Cache de la configuration validée, indexé par le hash du fichier : les
+# chargements suivants (modules lancés par yarp apply) évitent le parsing
+# YAML et la validation
+CONFIG_CACHE_DIR = "/var/run/yarp/config-cache"
+CONFIG_CACHE_KEEP = 4
+
+# Fragments de configuration : fichiers listés par `include:` dans le
+# fichier principal, puis conf.d/*.yaml (à côté du fichier principal),
+# fusionnés dans cet ordre. Chaque fragment est analysé et mis en cache
+# séparément : l'index associe chemin → (mtime_ns, taille, sha256,
+# sections, includes) et le contenu analysé est rangé sous son sha256
+FRAGMENT_CACHE_DIR = os.path.join(CONFIG_CACHE_DIR, "fragments")
+FRAGMENT_INDEX = os.path.join(FRAGMENT_CACHE_DIR, "index.marshal")
+CONFD_DIR = "conf.d"
+
+
+class FragmentError(Exception):
+    """Fragment illisible ou incompatible avec les autres fragments"""
+
+
+class Fragment:
+    """Fichier de configuration (principal, inclus ou de conf.d).
+
+    `sections` liste les sections de premier niveau définies par le
+    fichier ; `data` n'est chargé que si la configuration fusionnée
+    doit être reconstruite.
+    """
+
+    __slots__ = ('path', 'sha256', 'sections', 'includes', 'data')
+
+    def __init__(self, path, sha256, sections, includes, data=None):
+        self.path = path
+        self.sha256 = sha256
+        self.sections = sections
+        self.includes = includes
+        self.data = data
+
+
 class YARPConfig:
     def __init__(self, config_file="/etc/yarp/config.yaml"):
         self.config_file = config_file
         self.config = None
-        
+        self.validated = False
+        self.model = None
+        self.diagnostics = []
+        self.fragments = []
+        self._cache_key = None
+        # Avertissements repris du cache, à afficher par validate()
+        self._replay_diagnostics = False
+        # Origine des valeurs fusionnées, pour localiser les diagnostics :
+        # chemin → fragment qui l'a défini, chemin de liste → [(début, fragment)]
+        self._owners = {}
+        self._segments = {}
+
     def load(self):
-        """Charge le fichier de configuration"""
+        """Charge le fichier de configuration et ses fragments.
+
+        Si une configuration identique a déjà été validée, elle est reprise
+        du cache sans parsing YAML ni nouvelle validation. Sinon seuls les
+        fragments modifiés depuis le dernier chargement sont analysés.
+        """
+        if not os.path.isfile(self.config_file):
+            print(f"Erreur: Fichier {self.config_file} introuvable", file=sys.stderr)
+            return False
+
         try:
-            with open(self.config_file, 'r') as f:
-                self.config = yaml.safe_load(f)
+            self.fragments = self._load_fragments()
+        except FragmentError as e:
+            print(f"Erreur: {e}", file=sys.stderr)
+            return False
+
+        self._cache_key = self._compute_cache_key()
+        cached = self._read_cache()
+        if cached is not None:
+            self.config, self.diagnostics = cached
+            self.validated = True
+            self._replay_diagnostics = bool(self.diagnostics)
             return True
-        except FileNotFoundError:
-            print(f"Erreur: Fichier {self.config_file} introuvable", file=sys.stderr)
+
+        try:
+            self.config = self._merge_fragments()
+            return True
+        except FragmentError as e:
+            print(f"Erreur: {e}", file=sys.stderr)
             return False
+
+    # ------------------------------------------------------------------ #
+    #  Fragments                                                           #
+    # ------------------------------------------------------------------ #
+
+    def _fragment_paths(self, main):
+        """Fichiers inclus par le fichier principal, puis ceux de conf.d"""
+        base = os.path.dirname(os.path.abspath(self.config_file))
+        paths = []
+        for pattern in main.includes:
+            pattern = os.path.join(base, os.path.expanduser(pattern))
+            matches = sorted(glob.glob(pattern))
+            if not matches and not glob.has_magic(pattern):
+                raise FragmentError(f"{main.path}: fichier inclus introuvable: {pattern}")
+            paths.extend(matches)
+        paths.extend(sorted(glob.glob(os.path.join(base, CONFD_DIR, "*.yaml"))))
+        return paths
+
+    def _load_fragments(self):
+        """Liste ordonnée des fragments (le fichier principal en premier)"""
+        index = self._read_fragment_index()
+        updated = dict(index)
+
+        main = self._load_fragment(os.path.abspath(self.config_file), index, updated)
+        fragments = [main]
+        seen = {main.path}
+        for path in self._fragment_paths(main):
+            path = os.path.abspath(path)
+            if path in seen:
+                continue
+            seen.add(path)
+            fragment = self._load_fragment(path, index, updated)
+            if fragment.includes:
+                raise FragmentError(f"{path}: 'include' n'est autorisé que dans {main.path}")
+            fragments.append(fragment)
+
+        if updated != index:
+            self._write_fragment_index(updated)
+        return fragments
+
+    def _load_fragment(self, path, index, updated):
+        """Charge un fragment ; le fichier n'est lu que si sa date ou sa taille a changé"""
+        try:
+            st = os.stat(path)
+        except OSError as e:
+            raise FragmentError(f"{path}: {e.strerror}")
+
+        entry = index.get(path)
+        if entry and entry[0] == st.st_mtime_ns and entry[1] == st.st_size:
+            return Fragment(path, *entry[2:])
+
+        try:
+            with open(path, 'rb') as f:
+                source = f.read()
+        except OSError as e:
+            raise FragmentError(f"{path}: {e.strerror}")
+        sha256 = hashlib.sha256(source).hexdigest()
+
+        if entry and entry[2] == sha256:
+            # Fichier touché sans modification : l'analyse en cache reste valable
+            fragment = Fragment(path, *entry[2:])
+        else:
+            fragment = self._parse_fragment(path, source, sha256)
+            self._write_fragment_data(fragment)
+        updated[path] = (st.st_mtime_ns, st.st_size, sha256, fragment.sections, fragment.includes)
+        return fragment
+
+    def _parse_fragment(self, path, source, sha256):
+        try:
+            data = yaml.load(source, Loader=SafeLoader)
         except yaml.YAMLError as e:
-            print(f"Erreur de parsing YAML: {e}", file=sys.stderr)
-            return False
-    
-    def validate(self):
-        """Valide la configuration"""
+            raise FragmentError(f"Erreur de parsing YAML ({path}): {e}")
+        if data is None:
+            data = {}
+        if not isinstance(data, dict):
+            raise FragmentError(f"{path}: le fichier doit contenir un dictionnaire")
+
+        includes = data.pop('include', None) or ()
+        if isinstance(includes, str):
+            includes = (includes,)
+        if not isinstance(includes, (list, tuple)) or not all(isinstance(i, str) for i in includes):
+            raise FragmentError(f"{path}: 'include' doit être un chemin ou une liste de chemins")
+        return Fragment(path, sha256, tuple(data), tuple(includes), data)
+
+    def _fragment_data(self, fragment):
+        """Contenu d'un fragment : cache par sha256, sinon relecture du fichier"""
+        if fragment.data is not None:
+            return fragment.data
+        try:
+            with open(os.path.join(FRAGMENT_CACHE_DIR, f"{fragment.sha256}.marshal"), 'rb') as f:
+                data = marshal.load(f)
+            if isinstance(data, dict):
+                fragment.data = data
+                return data
+        except (OSError, EOFError, ValueError, TypeError):
+            pass
+
+        try:
+            with open(fragment.path, 'rb') as f:
+                source = f.read()
+        except OSError as e:
+            raise FragmentError(f"{fragment.path}: {e.strerror}")
+        fragment.data = self._parse_fragment(fragment.path, source, fragment.sha256).data
+        return fragment.data
+
+    def _read_fragment_index(self):
+        try:
+            with open(FRAGMENT_INDEX, 'rb') as f:
+                index = marshal.load(f)
+        except (OSError, EOFError, ValueError, TypeError):
+            return {}
+        return index if isinstance(index, dict) else {}
+
+    def _write_fragment_index(self, index):
+        """Enregistre l'index (best effort) et supprime les contenus orphelins"""
+        tmp_path = f"{FRAGMENT_INDEX}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(FRAGMENT_CACHE_DIR, exist_ok=True)
+            # Fichiers disparus : retirés de l'index
+            index = {path: entry for path, entry in index.items() if os.path.exists(path)}
+            with open(tmp_path, 'wb') as f:
+                marshal.dump(index, f)
+            os.replace(tmp_path, FRAGMENT_INDEX)
+
+            referenced = {f"{entry[2]}.marshal" for entry in index.values()}
+            for entry in os.scandir(FRAGMENT_CACHE_DIR):
+                if entry.name.endswith('.marshal') and entry.path != FRAGMENT_INDEX \
+                        and entry.name not in referenced:
+                    os.remove(entry.path)
+        except OSError:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+    def _write_fragment_data(self, fragment):
+        try:
+            data = marshal.dumps(fragment.data)
+        except ValueError:
+            # Types non sérialisables (dates YAML...) : relu depuis le fichier
+            return
+        path = os.path.join(FRAGMENT_CACHE_DIR, f"{fragment.sha256}.marshal")
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(FRAGMENT_CACHE_DIR, exist_ok=True)
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+    def _merge_fragments(self):
+        """Fusionne les fragments dans l'ordre.
+
+        Les dictionnaires sont fusionnés récursivement et les listes
+        concaténées ; une même valeur scalaire définie différemment par
+        deux fragments est une erreur.
+        """
+        merged = {}
+        self._owners = {}
+        self._segments = {}
+        for fragment in self.fragments:
+            self._merge(merged, self._fragment_data(fragment), (), fragment)
+        return merged
+
+    def _merge(self, target, source, path, fragment):
+        for key, value in source.items():
+            key_path = path + (key,)
+            if key not in target:
+                target[key] = value
+                self._owners[key_path] = fragment
+            elif isinstance(target[key], dict) and isinstance(value, dict):
+                self._merge(target[key], value, key_path, fragment)
+            elif isinstance(target[key], list) and isinstance(value, list):
+                segments = self._segments.setdefault(key_path, [(0, self._origin(key_path)[0])])
+                segments.append((len(target[key]), fragment))
+                target[key] = target[key] + value
+            elif target[key] != value:
+                raise FragmentError(
+                    f"{format_path(key_path)}: valeurs différentes dans "
+                    f"{self._origin(key_path)[0].path} et {fragment.path}"
+                )
+
+    def _origin(self, path):
+        """Fragment d'où provient un chemin de la configuration fusionnée,
+        et le chemin correspondant dans ce fragment"""
+        fragment = self.fragments[0]
+        local = []
+        prefix = ()
+        for part in path:
+            if isinstance(part, int) and prefix in self._segments:
+                for start, owner in reversed(self._segments[prefix]):
+                    if part >= start:
+                        fragment = owner
+                        local.append(part - start)
+                        break
+            else:
+                local.append(part)
+            prefix += (part,)
+            fragment = self._owners.get(prefix, fragment)
+        return fragment, tuple(local)
+
+    # ------------------------------------------------------------------ #
+    #  Cache de la configuration validée                                   #
+    # ------------------------------------------------------------------ #
+
+    def _compute_cache_key(self):
+        """Hash des fragments, lié à la version du validateur (ce fichier et le schéma)"""
+        digest = hashlib.sha256()
+        for fragment in self.fragments:
+            digest.update(f"{fragment.path}\0{fragment.sha256}\0".encode())
+        for path in (__file__, yarp_schema.__file__):
+            try:
+                digest.update(str(os.path.getmtime(path)).encode())
+            except OSError:
+                pass
+        return digest.hexdigest()
+
+    def _cache_path(self):
+        return os.path.join(CONFIG_CACHE_DIR, f"{self._cache_key}.marshal")
+
+    def _read_cache(self):
+        """Retourne (configuration, avertissements) en cache, ou None"""
+        try:
+            with open(self._cache_path(), 'rb') as f:
+                config, warnings = marshal.load(f)
+            diagnostics = []
+            for path, code, message, line, file in warnings:
+                diagnostic = Diagnostic(path, code, message, WARNING)
+                diagnostic.line, diagnostic.file = line, file
+                diagnostics.append(diagnostic)
+        except (OSError, EOFError, ValueError, TypeError):
+            return None
+        return (config, diagnostics) if isinstance(config, dict) else None
+
+    def _write_cache(self):
+        """Enregistre la configuration validée et ses avertissements, déjà
+        localisés, pour les rejouer à chaque chargement (best effort).
+
+        Seuls les CONFIG_CACHE_KEEP fichiers les plus récents sont gardés.
+        """
+        if self._cache_key is None:
+            return
+        warnings = [
+            (d.path, d.code, d.message, d.line, d.file)
+            for d in self.diagnostics if d.severity == WARNING
+        ]
+        try:
+            data = marshal.dumps((self.config, warnings))
+        except ValueError:
+            # Types non sérialisables (dates YAML...) : pas de cache
+            return
+
+        path = self._cache_path()
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(CONFIG_CACHE_DIR, exist_ok=True)
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+
+            entries = sorted(
+                (entry for entry in os.scandir(CONFIG_CACHE_DIR) if entry.name.endswith('.marshal')),
+                key=lambda entry: entry.stat().st_mtime,
+                reverse=True
+            )
+            for entry in entries[CONFIG_CACHE_KEEP:]:
+                os.remove(entry.path)
+        except OSError:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+    def validate(self, report=True):
+        """Valide la configuration (immédiat si chargée depuis le cache).
+
+        Les diagnostics (yarp_schema.Diagnostic) restent disponibles dans
+        self.diagnostics ; ils sont localisés dans le fichier YAML et, si
+        report est vrai, affichés sur stderr. Une configuration reprise du
+        cache affiche les avertissements de sa validation d'origine.
+        """
         if not self.config:
             return False
-        
-        errors = []
-        
-        # Validation système
-        if 'system' in self.config:
-            if 'hostname' not in self.config['system']:
-                errors.append("system.hostname est requis")
-            
-            # Validation domain
-            if 'domain' in self.config['system']:
-                domain = self.config['system']['domain']
-                if not isinstance(domain, str) or not domain:
-                    errors.append("system.domain doit être une chaîne non vide")
-                elif not re.match(r'^[a-zA-Z0-9]([a-zA-Z0-9\-]*[a-zA-Z0-9])?(\.[a-zA-Z0-9]([a-zA-Z0-9\-]*[a-zA-Z0-9])?)*$', domain):
-                    errors.append(f"system.domain invalide: {domain} (format attendu: ex. lab.local, example.com)")
-            
-            # Validation timezone
-            if 'timezone' in self.config['system']:
-                timezone = self.config['system']['timezone']
-                if not isinstance(timezone, str) or not timezone:
-                    errors.append("system.timezone doit être une chaîne non vide")
-                elif not re.match(r'^[a-zA-Z]+(/[a-zA-Z0-9_\-]+)+$', timezone):
-                    errors.append(f"system.timezone invalide: {timezone} (format attendu: ex. Europe/Paris, America/New_York)")
-            
-            # Validation dns_servers
-            if 'dns_servers' in self.config['system']:
-                dns_servers = self.config['system']['dns_servers']
-                if not isinstance(dns_servers, list):
-                    errors.append("system.dns_servers doit être une liste")
-                elif len(dns_servers) == 0:
-                    errors.append("system.dns_servers ne peut pas être vide")
-                else:
-                    for idx, server in enumerate(dns_servers):
-                        try:
-                            ipaddress.ip_address(str(server))
-                        except ValueError:
-                            errors.append(f"system.dns_servers[{idx}] invalide: {server} (adresse IP attendue)")
-        
-        # Validation interfaces
-        if 'interfaces' in self.config:
-            for iface, config in self.config['interfaces'].items():
-                if 'ipv4' in config and config['ipv4'] != 'dhcp':
-                    try:
-                        ipaddress.ip_network(config['ipv4'], strict=False)
-                    except ValueError:
-                        errors.append(f"IPv4 invalide pour {iface}: {config['ipv4']}")
-
-                if 'ipv6' in config and config['ipv6'] != 'auto':
-                    try:
-                        ipaddress.ip_network(config['ipv6'], strict=False)
-                    except ValueError:
-                        errors.append(f"IPv6 invalide pour {iface}: {config['ipv6']}")
-
-                # Validation NAT/masquerading
-                if 'masquerading' in config:
-                    if not isinstance(config['masquerading'], bool):
-                        errors.append(f"masquerading pour {iface} doit être true/false")
-
-                    # Si masquerading activé, vérifier les sources
-                    if config['masquerading'] and 'masquerade_sources' in config:
-                        sources = config['masquerade_sources']
-                        if not isinstance(sources, list):
-                            errors.append(f"masquerade_sources pour {iface} doit être une liste")
-                        else:
-                            for idx, source in enumerate(sources):
-                                try:
-                                    ipaddress.ip_network(source, strict=False)
-                                except ValueError:
-                                    errors.append(f"Source invalide pour {iface}[{idx}]: {source}")
-
-                    # Avertir si masquerading sans sources
-                    if config['masquerading'] and 'masquerade_sources' not in config:
-                        errors.append(f"masquerading activé sur {iface} mais aucune source spécifiée")
-        
-        # Validation routes
-        if 'routing' in self.config and 'static' in self.config['routing']:
-            for idx, route in enumerate(self.config['routing']['static']):
-                if 'to' not in route:
-                    errors.append(f"Route {idx}: destination 'to' manquante")
-                if 'via' not in route and 'interface' not in route:
-                    errors.append(f"Route {idx}: 'via' ou 'interface' requis")
-
-        # Validation firewall
-        if 'firewall' in self.config:
-            fw = self.config['firewall']
-
-            # Validation des politiques par défaut
-            if 'default' in fw:
-                valid_policies = ('accept', 'drop', 'reject')
-                for chain in ('input', 'forward', 'output'):
-                    if chain in fw['default']:
-                        policy = fw['default'][chain]
-                        if not isinstance(policy, str) or policy.lower() not in valid_policies:
-                            errors.append(
-                                f"firewall.default.{chain} invalide: '{policy}' "
-                                f"(valeurs acceptées: {', '.join(valid_policies)})"
-                            )
-
-            # Validation stateful
-            if 'stateful' in fw:
-                if not isinstance(fw['stateful'], bool):
-                    errors.append("firewall.stateful doit être true/false")
-
-            # Validation des règles
-            if 'rules' in fw:
-                if not isinstance(fw['rules'], list):
-                    errors.append("firewall.rules doit être une liste")
-                else:
-                    valid_actions = ('accept', 'drop', 'reject')
-                    # Protocoles L4 (avec ports)
-                    l4_protocols = ('tcp', 'udp', 'sctp')
-                    # Protocoles L3 / sans port
-                    l3_protocols = ('icmp', 'gre', 'esp', 'ah', 'ipip', 'ospf', 'vrrp')
-                    valid_protocols = l4_protocols + l3_protocols
-                    interface_names = list(self.config.get('interfaces', {}).keys())
-
-                    for idx, rule in enumerate(fw['rules']):
-                        prefix = f"firewall.rules[{idx}]"
-
-                        # Champs obligatoires
-                        if 'name' not in rule:
-                            errors.append(f"{prefix}: 'name' est requis")
-
-                        if 'action' not in rule:
-                            errors.append(f"{prefix}: 'action' est requis")
-                        elif not isinstance(rule['action'], str) or rule['action'].lower() not in valid_actions:
-                            errors.append(
-                                f"{prefix}: action invalide: '{rule.get('action')}' "
-                                f"(valeurs acceptées: {', '.join(valid_actions)})"
-                            )
-
-                        # Validation de la chaîne (obligatoire)
-                        valid_chains = ('input', 'forward', 'output')
-                        if 'chain' not in rule:
-                            errors.append(f"{prefix}: 'chain' est requis (input, forward, output)")
-                        elif not isinstance(rule['chain'], str) or rule['chain'].lower() not in valid_chains:
-                            errors.append(
-                                f"{prefix}: chain invalide: '{rule.get('chain')}' "
-                                f"(valeurs acceptées: {', '.join(valid_chains)})"
-                            )
-                        else:
-                            chain = rule['chain'].lower()
-                            # Vérifier cohérence interface / chaîne
-                            if chain == 'input' and 'out_interface' in rule:
-                                errors.append(
-                                    f"{prefix}: 'out_interface' n'est pas compatible "
-                                    f"avec chain: input (le trafic INPUT n'a pas d'interface de sortie)"
-                                )
-                            if chain == 'output' and 'in_interface' in rule:
-                                errors.append(
-                                    f"{prefix}: 'in_interface' n'est pas compatible "
-                                    f"avec chain: output (le trafic OUTPUT n'a pas d'interface d'entrée)"
-                                )
-
-                        # Au moins un critère de matching requis
-                        has_match = any(
-                            k in rule for k in ('source', 'destination', 'in_interface', 'out_interface')
-                        )
-                        if not has_match:
-                            errors.append(
-                                f"{prefix}: au moins un critère de matching requis "
-                                f"(source, destination, in_interface, out_interface)"
-                            )
-
-                        # Validation des interfaces (facultatives)
-                        for iface_field in ('in_interface', 'out_interface'):
-                            if iface_field in rule:
-                                if not isinstance(rule[iface_field], str):
-                                    errors.append(f"{prefix}: '{iface_field}' doit être une chaîne")
-                                elif rule[iface_field] not in interface_names:
-                                    errors.append(
-                                        f"{prefix}: {iface_field} inconnue: '{rule[iface_field]}' "
-                                        f"(interfaces disponibles: {', '.join(interface_names)})"
-                                    )
-
-                        # Validation des adresses (facultatives)
-                        for addr_field in ('source', 'destination'):
-                            if addr_field in rule:
-                                addr = rule[addr_field]
-                                if not isinstance(addr, str):
-                                    errors.append(f"{prefix}: '{addr_field}' doit être une chaîne")
-                                elif addr.lower() == 'any':
-                                    # "any" = tout le trafic, pas de filtre adresse
-                                    pass
-                                else:
-                                    try:
-                                        ipaddress.ip_network(addr, strict=False)
-                                    except ValueError:
-                                        try:
-                                            ipaddress.ip_address(addr)
-                                        except ValueError:
-                                            errors.append(
-                                                f"{prefix}: {addr_field} invalide: '{addr}' "
-                                                f"(attendu: IP, CIDR ou 'any', ex: 192.168.1.0/24, 10.0.0.1, any)"
-                                            )
-
-                        # Validation protocols
-                        if 'protocols' in rule:
-                            protocols = rule['protocols']
-
-                            if isinstance(protocols, str):
-                                if protocols.lower() != 'any':
-                                    errors.append(
-                                        f"{prefix}: protocols en tant que chaîne doit être 'any', "
-                                        f"reçu: '{protocols}'"
-                                    )
-                            elif isinstance(protocols, dict):
-                                for proto, port_value in protocols.items():
-                                    if proto.lower() not in valid_protocols:
-                                        errors.append(
-                                            f"{prefix}: protocole non supporté: '{proto}' "
-                                            f"(supportés: {', '.join(valid_protocols)})"
-                                        )
-
-                                    # Validation des ports (uniquement pour les protocoles L4)
-                                    if proto.lower() in l4_protocols:
-                                        if isinstance(port_value, int):
-                                            if port_value < 1 or port_value > 65535:
-                                                errors.append(
-                                                    f"{prefix}: port {proto} hors limites: {port_value}"
-                                                )
-                                        elif isinstance(port_value, str):
-                                            # Range "8000:8100"
-                                            if ':' in port_value:
-                                                parts = port_value.split(':')
-                                                if len(parts) != 2:
-                                                    errors.append(
-                                                        f"{prefix}: range de ports {proto} invalide: '{port_value}'"
-                                                    )
-                                                else:
-                                                    for p in parts:
-                                                        if not p.isdigit() or int(p) < 1 or int(p) > 65535:
-                                                            errors.append(
-                                                                f"{prefix}: port dans le range {proto} invalide: '{p}'"
-                                                            )
-                                            else:
-                                                if not port_value.isdigit() or int(port_value) < 1 or int(port_value) > 65535:
-                                                    errors.append(
-                                                        f"{prefix}: port {proto} invalide: '{port_value}'"
-                                                    )
-                                        elif isinstance(port_value, list):
-                                            for pidx, p in enumerate(port_value):
-                                                if isinstance(p, int):
-                                                    if p < 1 or p > 65535:
-                                                        errors.append(
-                                                            f"{prefix}: port {proto}[{pidx}] hors limites: {p}"
-                                                        )
-                                                elif isinstance(p, str):
-                                                    if not p.isdigit() or int(p) < 1 or int(p) > 65535:
-                                                        errors.append(
-                                                            f"{prefix}: port {proto}[{pidx}] invalide: '{p}'"
-                                                        )
-                                                else:
-                                                    errors.append(
-                                                        f"{prefix}: port {proto}[{pidx}] type non supporté"
-                                                    )
-                                        elif proto.lower() not in l3_protocols:
-                                            errors.append(
-                                                f"{prefix}: valeur de ports {proto} invalide "
-                                                f"(attendu: int, str, ou liste)"
-                                            )
-                            else:
-                                errors.append(
-                                    f"{prefix}: protocols doit être 'any' ou un dict, "
-                                    f"reçu: {type(protocols).__name__}"
-                                )
+        if self.validated:
+            if report and self._replay_diagnostics:
+                self._print_diagnostics()
+            self._replay_diagnostics = False
+            return True
+
+        diagnostics = validate_schema(self.config)
+
+        # Modèle typé partagé par les modules (adresses déjà analysées)
+        if not has_errors(diagnostics):
+            try:
+                self.model = build_model(self.config)
+            except ModelError as e:
+                diagnostics.append(Diagnostic((), 'model', f"Modèle de configuration: {e}"))
 
+        self.diagnostics = diagnostics
+        if diagnostics:
+            self._locate_diagnostics()
+            if report:
+                self._print_diagnostics()
+        if has_errors(diagnostics):
+            return False
+
+        self.validated = True
+        self._write_cache()
+        return True
+
+    def _locate_diagnostics(self):
+        """Ajoute fichier et numéros de ligne (relit les fragments concernés,
+        uniquement en cas de problème)"""
+        by_fragment = {}
+        for diagnostic in self.diagnostics:
+            fragment, local = self._origin(diagnostic.path)
+            if len(self.fragments) > 1:
+                diagnostic.file = fragment.path
+            by_fragment.setdefault(fragment.path, ([], []))
+            by_fragment[fragment.path][0].append(diagnostic)
+            by_fragment[fragment.path][1].append(local)
+
+        for path, (diagnostics, paths) in by_fragment.items():
+            try:
+                with open(path, 'rb') as f:
+                    locate(diagnostics, f.read(), paths)
+            except OSError:
+                pass
+
+    def _print_diagnostics(self):
+        warnings = [d for d in self.diagnostics if d.severity == WARNING]
+        errors = [d for d in self.diagnostics if d.severity == ERROR]
+        if warnings:
+            print("Avertissements de validation:", file=sys.stderr)
+            for warning in warnings:
+                print(f"  - {warning}", file=sys.stderr)
         if errors:
             print("Erreurs de validation:", file=sys.stderr)
             for error in errors:
                 print(f"  - {error}", file=sys.stderr)
-            return False
-        
-        return True
-    
+
+    def get_model(self):
+        """Retourne le modèle typé de la configuration validée.
+
+        Si la configuration vient du cache (validate() n'a alors rien
+        recalculé), chaque section est construite à sa première lecture :
+        reconstruire tout le modèle coûterait plus que la validation sur
+        une grosse configuration, et relire un modèle sérialisé (pickle)
+        plus encore, les adresses étant réanalysées.
+        """
+        if self.model is None:
+            self.model = build_model(self.config, lazy=True)
+        return self.model
+
     def get_system(self):
         """Retourne la configuration système"""
         return self.config.get('system', {})
@@ -325,6 +479,26 @@ class YARPConfig:
         routing = self.get_routing()
         return routing.get('static', [])
 
+    def get_routing_tables(self):
+        """Retourne les tables de routage additionnelles (nom → table)"""
+        routing = self.get_routing()
+        return routing.get('tables', {})
+
+    def get_routing_rules(self):
+        """Retourne les règles de policy routing"""
+        routing = self.get_routing()
+        return routing.get('rules', [])
+
+    def get_dns_forwarder(self):
+        """Retourne la configuration du forwarder DNS local"""
+        dns = self.config.get('dns') or {}
+        return dns.get('forwarder', {})
+
+    def get_dns_probe(self):
+        """Retourne les paramètres de mesure des serveurs DNS amont"""
+        dns = self.config.get('dns') or {}
+        return dns.get('probe', {})
+
     def get_firewall(self):
         """Retourne la configuration du firewall"""
         return self.config.get('firewall', {})
@@ -347,6 +521,7 @@ class YARPConfig:
                 'network': 'INFO',
                 'routing': 'INFO',
                 'dns': 'INFO',
+                'nat': 'WARNING',
                 'firewall': 'WARNING'
             }
         }
@@ -375,9 +550,12 @@ def main():
     if len(sys.argv) < 2:
         print("Usage: yarp_config.py <command> [args]")
         print("Commands:")
-        print("  validate           - Valider la configuration")
+        print("  validate [--json]  - Valider la configuration (--json: diagnostics structurés)")
         print("  show              - Afficher la configuration")
         print("  get <section>     - Obtenir une section")
+        print("  keys <section>    - Lister les clés d'une section (une par ligne)")
+        print("  value <chemin>... - Valeurs de paramètres, une par ligne (ex: system.hostname)")
+        print("  fragments         - Lister les fichiers de configuration fusionnés")
         print("  dump-json         - Exporter en JSON")
         sys.exit(1)
     
@@ -389,6 +567,14 @@ def main():
     command = sys.argv[1]
     
     if command == "validate":
+        if "--json" in sys.argv[2:]:
+            import json
+            valid = config.validate(report=False)
+            print(json.dumps({
+                'valid': valid,
+                'diagnostics': [d.to_dict() for d in config.diagnostics],
+            }, indent=2, ensure_ascii=False))
+            sys.exit(0 if valid else 1)
         if config.validate():
             print("Configuration valide")
             sys.exit(0)
@@ -413,6 +599,32 @@ def main():
         elif section == "static-routes":
             print(yaml.dump(config.get_static_routes()))
     
+    elif command == "keys":
+        # Utilisé par yarp-apply.sh (ex: keys interfaces)
+        if len(sys.argv) < 3:
+            print("Usage: yarp_config.py keys <section>")
+            sys.exit(1)
+        section = config.config.get(sys.argv[2]) or {}
+        for key in section:
+            print(key)
+
+    elif command == "value":
+        # Utilisé par yarp-apply.sh (ex: value system.hostname system.domain) ;
+        # une ligne par chemin, vide si absent
+        if len(sys.argv) < 3:
+            print("Usage: yarp_config.py value <chemin>...")
+            sys.exit(1)
+        for path in sys.argv[2:]:
+            value = config.config
+            for part in path.split('.'):
+                value = value.get(part) if isinstance(value, dict) else None
+            print(value if value is not None and not isinstance(value, (dict, list)) else "")
+
+    elif command == "fragments":
+        for fragment in config.fragments:
+            sections = ', '.join(fragment.sections) or '-'
+            print(f"{fragment.sha256[:12]}  {fragment.path}  ({sections})")
+
     elif command == "dump-json":
         print(config.dump_json())
     
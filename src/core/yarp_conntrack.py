@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+YARP Conntrack
+Analyse de la table conntrack (yarp conntrack top) : lecture en flux,
+entrées agrégées par source, destination, protocole et état en mémoire
+bornée, remplissage de la table par rapport à nf_conntrack_max
+"""
+
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+from collections import Counter
+from operator import itemgetter
+
+CONNTRACK_PROC = "/proc/net/nf_conntrack"
+CONNTRACK_COUNT = "/proc/sys/net/netfilter/nf_conntrack_count"
+CONNTRACK_MAX = "/proc/sys/net/netfilter/nf_conntrack_max"
+
+DEFAULT_TOP = 10
+# Taille (octets) des blocs de lignes lus puis agrégés d'un coup
+CHUNK_SIZE = 1 << 20
+# Clés suivies par dimension (au moins) : au-delà, les moins fréquentes
+# sont écartées. Un bloc lu apporte quelques milliers de clés : une
+# capacité plus faible ferait trier les compteurs à chaque bloc
+MIN_CAPACITY = 10000
+
+DIMENSIONS = (
+    ('source', "Sources"),
+    ('destination', "Destinations"),
+    ('protocol', "Protocoles"),
+    ('state', "États"),
+)
+
+
+class TopK:
+    """Compteurs bornés des clés les plus fréquentes (space-saving par
+    lots).
+
+    Au-delà de 4 × `capacity` clés suivies, seules les `capacity` plus
+    fréquentes sont gardées et `floor` retient le plus grand compte
+    écarté. Une clé nouvelle part de `floor` : son compte ne sous-estime
+    jamais le nombre réel, qui est au moins compte - erreur.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.counts = {}
+        self.errors = {}
+        self.floor = 0
+
+    def update(self, batch):
+        """Fusionne un Counter de clés"""
+        counts, floor = self.counts, self.floor
+        for key, count in batch.items():
+            current = counts.get(key)
+            if current is None:
+                counts[key] = floor + count
+                if floor:
+                    self.errors[key] = floor
+            else:
+                counts[key] = current + count
+        if len(counts) > 4 * self.capacity:
+            self._prune()
+
+    def _prune(self):
+        ranked = sorted(self.counts.items(), key=itemgetter(1), reverse=True)
+        self.floor = max(self.floor, ranked[self.capacity][1])
+        self.counts = dict(ranked[:self.capacity])
+        self.errors = {key: self.errors[key] for key in self.counts if key in self.errors}
+
+    def top(self, n):
+        """[(clé, compte, erreur)] des n clés les plus fréquentes"""
+        ranked = sorted(self.counts.items(), key=itemgetter(1), reverse=True)[:n]
+        return [(key, count, self.errors.get(key, 0)) for key, count in ranked]
+
+
+# Entrée conntrack, sens d'origine : protocole, état (TCP, SCTP...),
+# source, destination. Formats /proc/net/nf_conntrack (« ipv4 2 tcp 6
+# 431999 ESTABLISHED src=... ») et conntrack -L (sans les deux premiers
+# champs). Le \n de tête permet au moteur de chercher les débuts de
+# ligne par recherche littérale.
+ENTRY_RE = re.compile(r'\n(?:ipv[46] +\d+ +)?(\w+) +\d+ +\d+ +(?:(\w+) +)?src=(\S+) dst=(\S+)')
+
+
+def _read_int(path):
+    try:
+        with open(path) as f:
+            return int(f.read().strip())
+    except (OSError, ValueError):
+        return None
+
+
+def open_table(path=None):
+    """Flux des entrées : fichier (« - » : entrée standard), sinon
+    /proc/net/nf_conntrack, sinon conntrack -L.
+
+    conntrack -L est lu au fil de sa sortie (Popen) : l'exécuteur
+    yarp_exec capture la sortie entière, soit plus de 100 Mo pour un
+    million d'entrées.
+    """
+    if path == "-":
+        return sys.stdin, None
+    if path:
+        return open(path), None
+    if os.path.exists(CONNTRACK_PROC):
+        return open(CONNTRACK_PROC), None
+    try:
+        process = subprocess.Popen(["conntrack", "-L"], stdout=subprocess.PIPE,
+                                   stderr=subprocess.DEVNULL, text=True)
+    except OSError:
+        raise OSError(f"{CONNTRACK_PROC} absent et conntrack introuvable (apk add conntrack-tools)")
+    return process.stdout, process
+
+
+def analyze(stream, top=DEFAULT_TOP, chunk_size=CHUNK_SIZE):
+    """Agrège les entrées du flux : {dimension: TopK}, entrées analysées,
+    lignes ignorées.
+
+    Le flux est lu par blocs de lignes complètes ; chaque bloc est
+    découpé par ENTRY_RE puis compté colonne par colonne (Counter), sans
+    boucle Python par entrée.
+    """
+    capacity = max(MIN_CAPACITY, 20 * top)
+    counters = {name: TopK(capacity) for name, _ in DIMENSIONS}
+    parsed = skipped = 0
+
+    while True:
+        lines = stream.readlines(chunk_size)
+        if not lines:
+            break
+        entries = ENTRY_RE.findall("\n" + "".join(lines))
+        parsed += len(entries)
+        skipped += len(lines) - len(entries)
+        if not entries:
+            continue
+        protocols, states, sources, destinations = zip(*entries)
+        for name, column in (('source', sources), ('destination', destinations),
+                             ('protocol', protocols), ('state', states)):
+            counters[name].update(Counter(column))
+    return counters, parsed, skipped
+
+
+def conntrack_top(path=None, top=DEFAULT_TOP):
+    """Rapport de yarp conntrack top (dictionnaire sérialisable en JSON)"""
+    start = time.monotonic()
+    stream, process = open_table(path)
+    try:
+        counters, parsed, skipped = analyze(stream, top)
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+        if process is not None:
+            process.wait()
+
+    count, maximum = _read_int(CONNTRACK_COUNT), _read_int(CONNTRACK_MAX)
+    # Table analysée depuis un fichier : son nombre d'entrées
+    if path:
+        count = parsed
+    report = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'source': path or (CONNTRACK_PROC if process is None else "conntrack -L"),
+        'entries': parsed,
+        'skipped': skipped,
+        'count': count,
+        'max': maximum,
+        'fill_percent': round(100 * count / maximum, 1) if count is not None and maximum else None,
+        'duration_ms': int((time.monotonic() - start) * 1000),
+        'top': {},
+    }
+    for name, _ in DIMENSIONS:
+        report['top'][name] = [
+            {'key': key or "-", 'entries': entries, 'error': error}
+            for key, entries, error in counters[name].top(top)
+        ]
+    return report
+
+
+def print_report(report):
+    fill = f" ({report['fill_percent']} %)" if report['fill_percent'] is not None else ""
+    print(f"Table conntrack : {report['count']} / {report['max'] or '?'} entrées{fill}")
+    print(f"Analysées : {report['entries']} entrées de {report['source']} en {report['duration_ms']} ms")
+    if not report['entries']:
+        return
+
+    total = report['entries']
+    approximate = False
+    for name, title in DIMENSIONS:
+        print(f"\n{title:<40} {'entrées':>10} {'%':>6}")
+        for item in report['top'][name]:
+            mark = "~" if item['error'] else " "
+            approximate = approximate or bool(item['error'])
+            print(f"  {item['key']:<38} {mark}{item['entries']:>9} {100 * item['entries'] / total:>6.1f}")
+    if approximate:
+        print("\n~ : compte approché (majoré), table trop variée pour un comptage exact")
+
+
+def _usage():
+    print("Usage: yarp conntrack top [-n N] [--json] [--file <fichier|->]")
+    sys.exit(1)
+
+
+def main():
+    # Gestion des arguments : yarp_conntrack.py top [-n N] [--json] [--file F]
+    args = sys.argv[1:]
+    if not args or args[0] != "top":
+        _usage()
+
+    top, path = DEFAULT_TOP, None
+    for option in ("-n", "--file"):
+        if option in args:
+            index = args.index(option)
+            if index + 1 >= len(args):
+                _usage()
+            value = args[index + 1]
+            if option == "-n":
+                if not value.isdigit() or int(value) < 1:
+                    _usage()
+                top = int(value)
+            else:
+                path = value
+
+    try:
+        report = conntrack_top(path, top)
+    except OSError as e:
+        print(f"Erreur: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    # Cas 1: sortie JSON (supervision)
+    if "--json" in args:
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+    # Cas 2: rapport lisible
+    else:
+        print_report(report)
+
+
+if __name__ == "__main__":
+    main()
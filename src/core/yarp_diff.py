@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+YARP Config Diff
+Différence sémantique entre la configuration appliquée et la nouvelle,
+par section et par objet, et phases de yarp apply concernées
+"""
+
+import json
+
+# Phases de yarp apply rejouables (la sauvegarde de l'état est toujours faite)
+ALL_PHASES = ('alpine', 'system', 'dns', 'network', 'routing', 'nat', 'firewall')
+
+# system : phases par paramètre (domain et dns_servers vont dans resolv.conf)
+SYSTEM_PHASES = {
+    'hostname': ('system',),
+    'domain': ('system', 'dns'),
+    'timezone': ('system',),
+    'dns_servers': ('dns',),
+}
+
+# interfaces : une interface ajoutée ou retirée touche tout ce qui en
+# dépend ; un changement d'adresse vide l'interface (routes comprises)
+# et change les adresses d'écoute du forwarder DNS
+INTERFACE_PHASES = ('alpine', 'dns', 'network', 'routing', 'nat')
+INTERFACE_FIELD_PHASES = {
+    'ipv4': ('network', 'routing', 'dns'),
+    'ipv6': ('network', 'routing', 'dns'),
+    'masquerading': ('nat',),
+    'masquerade_sources': ('nat',),
+}
+
+ADDED = '+'
+REMOVED = '-'
+CHANGED = '~'
+
+
+class Change:
+    """Modification d'un objet de la configuration.
+
+    `path` désigne l'objet (ex: firewall.rules[ssh]), `detail` résume le
+    changement et `phases` liste les phases de yarp apply à rejouer.
+    """
+
+    __slots__ = ('op', 'path', 'detail', 'phases')
+
+    def __init__(self, op, path, detail="", phases=ALL_PHASES):
+        self.op = op
+        self.path = path
+        self.detail = detail
+        self.phases = tuple(phases)
+
+    def __str__(self):
+        return f"{self.op} {self.path}: {self.detail}" if self.detail else f"{self.op} {self.path}"
+
+    def to_dict(self):
+        return {'op': self.op, 'path': self.path, 'detail': self.detail, 'phases': list(self.phases)}
+
+
+def _short(value):
+    """Valeur compacte pour les messages"""
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False, sort_keys=True, default=str)
+    return str(value)
+
+
+def _describe(before, after):
+    """Résumé d'une valeur modifiée : éléments ajoutés/retirés d'une
+    liste, ancienne → nouvelle valeur sinon"""
+    if isinstance(before, list) and isinstance(after, list):
+        removed = [_short(item) for item in before if item not in after]
+        added = [_short(item) for item in after if item not in before]
+        parts = [f"+{item}" for item in added] + [f"-{item}" for item in removed]
+        return " ".join(parts) if parts else "ordre modifié"
+    text = f"{_short(before)} → {_short(after)}"
+    return text if len(text) <= 80 else "modifié"
+
+
+def _field_changes(before, after):
+    """Champs modifiés entre deux dictionnaires : [(champ, description)]"""
+    fields = []
+    for key in list(before) + [key for key in after if key not in before]:
+        if key not in after:
+            fields.append((key, "retiré"))
+        elif key not in before:
+            fields.append((key, f"= {_short(after[key])}"))
+        elif before[key] != after[key]:
+            fields.append((key, _describe(before[key], after[key])))
+    return fields
+
+
+def _keyed(items, key):
+    """Indexe une liste d'objets par identifiant ; un doublon reçoit un
+    suffixe #2, #3... dans l'ordre de la liste"""
+    keyed = {}
+    for item in items or ():
+        base = key(item) if isinstance(item, dict) else _short(item)
+        name, count = base, 1
+        while name in keyed:
+            count += 1
+            name = f"{base}#{count}"
+        keyed[name] = item
+    return keyed
+
+
+def _diff_objects(path, before, after, phases, ordered=False):
+    """Objets ajoutés, retirés ou modifiés entre deux index nom → objet.
+
+    Avec `ordered`, un changement d'ordre des objets est aussi signalé.
+    """
+    changes = []
+    for name, item in after.items():
+        if name not in before:
+            changes.append(Change(ADDED, f"{path}[{name}]", phases=phases))
+        elif before[name] != item:
+            detail = ""
+            if isinstance(before[name], dict) and isinstance(item, dict):
+                detail = ", ".join(f"{field} {text}" for field, text in _field_changes(before[name], item))
+            changes.append(Change(CHANGED, f"{path}[{name}]", detail, phases))
+    for name in before:
+        if name not in after:
+            changes.append(Change(REMOVED, f"{path}[{name}]", phases=phases))
+
+    if ordered:
+        common_before = [name for name in before if name in after]
+        common_after = [name for name in after if name in before]
+        if common_before != common_after:
+            changes.append(Change(CHANGED, path, "ordre modifié", phases))
+    return changes
+
+
+def _diff_fields(path, before, after, phases, skip=()):
+    """Paramètres simples d'une section (hors listes d'objets `skip`)"""
+    before = {k: v for k, v in before.items() if k not in skip}
+    after = {k: v for k, v in after.items() if k not in skip}
+    return [
+        Change(CHANGED, f"{path}.{field}", text, phases)
+        for field, text in _field_changes(before, after)
+    ]
+
+
+def _route_key(route):
+    if route.get('file'):
+        return f"file:{route['file']}"
+    return str(route.get('to'))
+
+
+def _rule_key(rule):
+    return " ".join(f"{key}={_short(value)}" for key, value in sorted(rule.items()))
+
+
+def _diff_system(before, after):
+    return [
+        Change(CHANGED, f"system.{field}", text, SYSTEM_PHASES.get(field, ('system',)))
+        for field, text in _field_changes(before, after)
+    ]
+
+
+def _diff_interfaces(before, after):
+    changes = []
+    for name, config in after.items():
+        config = config or {}
+        if name not in before:
+            changes.append(Change(ADDED, f"interfaces.{name}", phases=INTERFACE_PHASES))
+            continue
+        for field, text in _field_changes(before[name] or {}, config):
+            phases = INTERFACE_FIELD_PHASES.get(field, ('network',))
+            changes.append(Change(CHANGED, f"interfaces.{name}.{field}", text, phases))
+    for name in before:
+        if name not in after:
+            changes.append(Change(REMOVED, f"interfaces.{name}", phases=INTERFACE_PHASES))
+    return changes
+
+
+def _diff_routing(before, after):
+    phases = ('routing',)
+    changes = _diff_objects(
+        "routing.static",
+        _keyed(before.get('static'), _route_key),
+        _keyed(after.get('static'), _route_key),
+        phases,
+    )
+
+    tables_before = before.get('tables') or {}
+    tables_after = after.get('tables') or {}
+    for name in list(tables_after) + [name for name in tables_before if name not in tables_after]:
+        table_before = tables_before.get(name)
+        table_after = tables_after.get(name)
+        if table_before == table_after:
+            continue
+        if table_before is None or table_after is None:
+            op = ADDED if table_before is None else REMOVED
+            changes.append(Change(op, f"routing.tables.{name}", phases=phases))
+            continue
+        changes.extend(_diff_fields(f"routing.tables.{name}", table_before, table_after, phases, skip=('routes',)))
+        changes.extend(_diff_objects(
+            f"routing.tables.{name}.routes",
+            _keyed(table_before.get('routes'), _route_key),
+            _keyed(table_after.get('routes'), _route_key),
+            phases,
+        ))
+
+    changes.extend(_diff_objects(
+        "routing.rules",
+        _keyed(before.get('rules'), _rule_key),
+        _keyed(after.get('rules'), _rule_key),
+        phases,
+        ordered=True,
+    ))
+    changes.extend(_diff_fields("routing", before, after, phases, skip=('static', 'tables', 'rules')))
+    return changes
+
+
+def _diff_firewall(before, after):
+    phases = ('firewall',)
+    changes = _diff_objects(
+        "firewall.rules",
+        _keyed(before.get('rules'), lambda rule: str(rule.get('name', 'unnamed'))),
+        _keyed(after.get('rules'), lambda rule: str(rule.get('name', 'unnamed'))),
+        phases,
+        ordered=True,
+    )
+    changes.extend(_diff_fields("firewall", before, after, phases, skip=('rules',)))
+    return changes
+
+
+def _diff_dns(before, after):
+    return _diff_fields("dns", before, after, ('dns',))
+
+
+def _diff_logging(before, after):
+    # Relu à chaque apply : aucune phase à rejouer
+    return _diff_fields("logging", before, after, ())
+
+
+SECTION_DIFFS = {
+    'system': _diff_system,
+    'interfaces': _diff_interfaces,
+    'routing': _diff_routing,
+    'firewall': _diff_firewall,
+    'dns': _diff_dns,
+    'logging': _diff_logging,
+}
+
+
+def diff_config(before, after):
+    """Modifications (liste de Change) de la configuration `before` à `after`"""
+    changes = []
+    for section in list(after) + [section for section in before if section not in after]:
+        old, new = before.get(section), after.get(section)
+        if old == new:
+            continue
+        diff = SECTION_DIFFS.get(section)
+        if diff is not None and isinstance(old or {}, dict) and isinstance(new or {}, dict):
+            changes.extend(diff(old or {}, new or {}))
+        else:
+            op = ADDED if old is None else REMOVED if new is None else CHANGED
+            changes.append(Change(op, section))
+    return changes
+
+
+def affected_phases(changes):
+    """Phases à rejouer pour un ensemble de modifications"""
+    phases = set()
+    for change in changes:
+        phases.update(change.phases)
+    return [phase for phase in ALL_PHASES if phase in phases]
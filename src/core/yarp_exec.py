@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+YARP Exec
+Exécution des commandes système des modules : argv sans shell, délai
+par commande, journalisation et mesure centralisées, enregistrement et
+rejeu du flux de commandes (tests et profilage sans root)
+"""
+
+import collections
+import json
+import os
+import shlex
+import subprocess
+import sys
+import time
+
+YARP_DIR = "/opt/yarp"
+sys.path.insert(0, os.path.join(YARP_DIR, 'core'))
+
+from yarp_trace import tracer
+
+# Délai par défaut d'une commande (s) ; un ip -batch de 100k routes
+# prend quelques secondes
+DEFAULT_TIMEOUT = 60
+# Codes de retour de timeout(1) et du shell, conservés pour les appelants
+TIMEOUT_RETURN_CODE = 124
+NOT_FOUND_RETURN_CODE = 127
+
+# Opérateurs du shell : une commande sous forme de chaîne est découpée
+# par shlex et exécutée sans /bin/sh, ils n'auraient aucun effet
+SHELL_OPERATORS = frozenset(('|', '||', '&&', ';', '&', '>', '>>', '<', '2>&1', '2>/dev/null'))
+
+# Variables d'environnement : enregistrer le flux de commandes dans un
+# fichier JSON lines, ou le rejouer depuis un tel fichier
+RECORD_ENV = "YARP_EXEC_RECORD"
+REPLAY_ENV = "YARP_EXEC_REPLAY"
+
+
+def command_argv(cmd):
+    """argv d'une commande (liste, ou chaîne découpée comme par le shell)"""
+    if not isinstance(cmd, str):
+        return [str(arg) for arg in cmd]
+    argv = shlex.split(cmd)
+    operators = SHELL_OPERATORS.intersection(argv)
+    if operators:
+        raise ValueError(f"opérateur shell {' '.join(sorted(operators))} non supporté")
+    return argv
+
+
+def command_line(cmd):
+    """Forme texte d'une commande (logs, métriques, plan)"""
+    return cmd if isinstance(cmd, str) else shlex.join(str(arg) for arg in cmd)
+
+
+class CommandResult:
+    """Résultat d'une commande, transmis aux hooks et enregistré"""
+
+    __slots__ = ('command', 'argv', 'input', 'returncode', 'stdout', 'stderr', 'duration_ms', 'replayed')
+
+    def __init__(self, command, argv, input, returncode, stdout, stderr, duration_ms, replayed=False):
+        self.command = command
+        self.argv = argv
+        self.input = input
+        self.returncode = returncode
+        self.stdout = stdout
+        self.stderr = stderr
+        self.duration_ms = duration_ms
+        self.replayed = replayed
+
+    @property
+    def success(self):
+        return self.returncode == 0
+
+    def to_dict(self):
+        return {
+            'command': self.command,
+            'argv': self.argv,
+            'input': self.input,
+            'returncode': self.returncode,
+            'stdout': self.stdout,
+            'stderr': self.stderr,
+            'duration_ms': self.duration_ms,
+        }
+
+
+def spawn(argv, input=None, timeout=DEFAULT_TIMEOUT):
+    """Exécute argv (sans shell) : (code de retour, stdout, stderr)"""
+    try:
+        result = subprocess.run(argv, capture_output=True, text=True, input=input, timeout=timeout)
+    except subprocess.TimeoutExpired as e:
+        stdout = e.stdout.decode(errors='replace') if isinstance(e.stdout, bytes) else (e.stdout or "")
+        return TIMEOUT_RETURN_CODE, stdout, f"Délai dépassé ({timeout} s): {shlex.join(argv)}"
+    except FileNotFoundError:
+        return NOT_FOUND_RETURN_CODE, "", f"{argv[0]}: commande introuvable"
+    except OSError as e:
+        return NOT_FOUND_RETURN_CODE, "", f"{argv[0]}: {e}"
+    return result.returncode, result.stdout, result.stderr
+
+
+class Replay:
+    """Résultats enregistrés, rendus dans l'ordre pour chaque commande.
+
+    Une commande rejouée plus souvent qu'enregistrée reçoit son dernier
+    résultat ; une commande absente de l'enregistrement échoue (127).
+    """
+
+    def __init__(self, records):
+        self.results = collections.defaultdict(collections.deque)
+        self.last = {}
+        self.missing = []
+        for record in records:
+            self.results[tuple(record['argv'])].append(record)
+
+    @classmethod
+    def from_file(cls, path):
+        records = []
+        with open(path) as f:
+            for line in f:
+                if line.strip():
+                    records.append(json.loads(line))
+        return cls(records)
+
+    def __call__(self, argv, input=None, timeout=None):
+        key = tuple(argv)
+        queue = self.results.get(key)
+        if queue:
+            self.last[key] = queue.popleft()
+        record = self.last.get(key)
+        if record is None:
+            command = shlex.join(argv)
+            self.missing.append(command)
+            return NOT_FOUND_RETURN_CODE, "", f"{command}: absente de l'enregistrement"
+        return record['returncode'], record['stdout'], record['stderr']
+
+
+class CommandExecutor:
+    """Exécuteur de commandes partagé par les managers.
+
+    `runner(argv, input, timeout)` produit le résultat : spawn() par
+    défaut, un Replay ou une fonction de test. Chaque commande est
+    mesurée, tracée (yarp_trace), journalisée par le logger de l'appelant
+    (command_execution, qui alimente yarp_metrics) puis passée aux hooks.
+    Un échec est toujours retourné, jamais levé.
+    """
+
+    def __init__(self):
+        self.runner = spawn
+        self.hooks = []
+        self.record_file = None
+
+    def use(self, runner=None):
+        """Remplace l'exécution réelle (None : revenir à spawn)"""
+        self.runner = runner or spawn
+
+    def replay(self, path):
+        """Rejoue un flux enregistré au lieu d'exécuter les commandes"""
+        self.runner = Replay.from_file(path)
+        return self.runner
+
+    def record(self, path):
+        """Enregistre chaque commande et son résultat (JSON lines)"""
+        self.stop_recording()
+        self.record_file = open(path, 'w', buffering=1)
+
+    def stop_recording(self):
+        if self.record_file is not None:
+            self.record_file.close()
+            self.record_file = None
+
+    def add_hook(self, hook):
+        """hook(CommandResult) est appelé après chaque commande"""
+        self.hooks.append(hook)
+
+    def remove_hook(self, hook):
+        if hook in self.hooks:
+            self.hooks.remove(hook)
+
+    def run(self, cmd, input=None, timeout=None, logger=None):
+        """Exécute une commande (argv ou chaîne sans opérateur shell) :
+        (succès, stdout, stderr). Une chaîne que shlex ne peut découper
+        (guillemet non fermé) ou qui contient un opérateur shell échoue
+        sans être lancée."""
+        command = command_line(cmd)
+        try:
+            argv = command_argv(cmd)
+        except ValueError as e:
+            message = f"Commande non exécutée ({e}): {command}"
+            if logger is not None:
+                logger.error(message)
+            return False, "", message
+        timeout = timeout or DEFAULT_TIMEOUT
+        lines = input.count("\n") if input else 0
+
+        with tracer.span(command, "command") as span:
+            start_time = time.monotonic()
+            returncode, stdout, stderr = self.runner(argv, input=input, timeout=timeout)
+            duration_ms = int((time.monotonic() - start_time) * 1000)
+            span.set(success=returncode == 0)
+            if lines:
+                span.set(lines=lines)
+
+        if logger is not None:
+            # Nombre de lignes d'un ip -batch ou d'un iptables-restore
+            details = {'lines': lines} if lines else {}
+            logger.command_execution(command, returncode, duration_ms, **details)
+
+        if self.hooks or self.record_file is not None:
+            result = CommandResult(command, argv, input, returncode, stdout, stderr, duration_ms,
+                                   replayed=self.runner is not spawn)
+            if self.record_file is not None:
+                self.record_file.write(json.dumps(result.to_dict(), ensure_ascii=False) + "\n")
+            for hook in self.hooks:
+                hook(result)
+
+        return returncode == 0, stdout, stderr
+
+
+# Exécuteur du processus, configurable par l'environnement
+executor = CommandExecutor()
+if os.environ.get(REPLAY_ENV):
+    executor.replay(os.environ[REPLAY_ENV])
+if os.environ.get(RECORD_ENV):
+    executor.record(os.environ[RECORD_ENV])
@@ -4,23 +4,207 @@ YARP Logger Module
 Système de logs avancé et configurable pour YARP
 """
 
+import atexit
+import copy
 import json
 import logging
 import logging.handlers
+import queue
 import sys
+import threading
 from datetime import datetime
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
+
+from yarp_metrics import metrics
+from yarp_trace import tracer
+
+# File d'attente des enregistrements destinés aux fichiers de log : au-delà,
+# les messages DEBUG et INFO sont abandonnés (et comptés) plutôt que de
+# ralentir l'apply
+LOG_QUEUE_SIZE = 10000
+# Attente maximale (s) d'une place dans la file pour un WARNING ou une ERROR
+LOG_QUEUE_TIMEOUT = 1.0
+
+
+class _LogListener(logging.handlers.QueueListener):
+    """Thread d'écriture des fichiers de log.
+
+    Chaque élément de la file est un couple (handlers de fichiers du
+    logger émetteur, enregistrement) : un seul thread sert tous les
+    loggers du processus.
+    """
+
+    def __init__(self, log_queue, pipeline):
+        super().__init__(log_queue)
+        self.pipeline = pipeline
+
+    def enqueue_sentinel(self):
+        # File pleine à l'arrêt : attendre que le thread la vide
+        self.queue.put(self._sentinel)
+
+    def handle(self, item):
+        handlers, record = item
+        with tracer.span("écriture log", "log"):
+            self._handle(handlers, record)
+
+    def _handle(self, handlers, record):
+        dropped = self.pipeline.dropped - self.pipeline.reported
+        if dropped:
+            self.pipeline.reported += dropped
+            self._write(handlers, logging.makeLogRecord({
+                'name': record.name, 'levelno': logging.WARNING, 'levelname': 'WARNING',
+                'msg': f"{dropped} message(s) de log perdus (file d'écriture pleine)",
+                'context': {'dropped': dropped},
+            }))
+        self._write(handlers, record)
+
+    def _write(self, handlers, record):
+        for handler in handlers:
+            if record.levelno >= handler.level:
+                handler.handle(record)
+
+
+class _LogPipeline:
+    """File bornée et thread d'écriture partagés par tous les loggers du
+    processus, vidés à la sortie du processus"""
+
+    def __init__(self, maxsize=LOG_QUEUE_SIZE):
+        self.queue = queue.Queue(maxsize)
+        # Enregistrements abandonnés, et déjà signalés dans les fichiers
+        self.dropped = 0
+        self.reported = 0
+        self.listener = _LogListener(self.queue, self)
+        self.listener.start()
+        atexit.register(self.stop)
+
+    def put(self, handlers, record):
+        try:
+            if record.levelno >= logging.WARNING:
+                self.queue.put((handlers, record), timeout=LOG_QUEUE_TIMEOUT)
+            else:
+                self.queue.put_nowait((handlers, record))
+        except queue.Full:
+            self.dropped += 1
+
+    def flush(self):
+        """Attend que tous les enregistrements en file soient écrits"""
+        if self.listener._thread is not None:
+            self.queue.join()
+
+    def stop(self):
+        """Écrit les enregistrements en attente et arrête le thread"""
+        if self.listener._thread is None:
+            return
+        self.listener.stop()
+        if self.dropped:
+            print(f"YARP: {self.dropped} message(s) de log perdus (file d'écriture pleine)",
+                  file=sys.stderr)
+
+
+_pipeline = None
+_pipeline_lock = threading.Lock()
+
+
+def _get_pipeline() -> _LogPipeline:
+    """Pipeline d'écriture du processus, démarré au premier fichier de log"""
+    global _pipeline
+    with _pipeline_lock:
+        if _pipeline is None:
+            _pipeline = _LogPipeline()
+        return _pipeline
+
+
+def flush_logs():
+    """Attend l'écriture de tous les enregistrements en file"""
+    if _pipeline is not None:
+        _pipeline.flush()
+
+
+def dropped_records() -> int:
+    """Nombre d'enregistrements abandonnés faute de place dans la file"""
+    return _pipeline.dropped if _pipeline is not None else 0
+
+
+# Formate les traces d'exception avant la mise en file
+_TRACEBACK_FORMATTER = logging.Formatter()
+
+
+class _FileQueueHandler(logging.handlers.QueueHandler):
+    """Envoie les enregistrements d'un logger vers ses fichiers de log
+    par la file partagée : l'écriture et le formatage JSON se font dans
+    le thread d'écriture, pas dans celui de l'appelant"""
+
+    def __init__(self, handlers: List[logging.Handler]):
+        super().__init__(None)
+        self.handlers = handlers
+        self.pipeline = _get_pipeline()
+
+    def prepare(self, record):
+        # Comme QueueHandler.prepare : le message est figé dans le thread
+        # de l'appelant, qui peut modifier les arguments une fois l'appel
+        # revenu. La trace d'exception est formatée ici aussi mais gardée
+        # à part (exc_text) pour le champ 'exception' des logs JSON
+        record = copy.copy(record)
+        record.message = record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info and not record.exc_text:
+            record.exc_text = _TRACEBACK_FORMATTER.formatException(record.exc_info)
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        self.pipeline.put(self.handlers, record)
+
+# Registre du processus : un YARPLogger par nom, et des handlers partagés
+# entre loggers (un seul RotatingFileHandler par fichier de log)
+_loggers: Dict[str, "YARPLogger"] = {}
+_handlers: Dict[tuple, logging.Handler] = {}
+_registry_lock = threading.RLock()
+
+
+def _shared_handler(key: tuple, create) -> logging.Handler:
+    """Handler enregistré sous `key`, créé par `create()` au premier appel"""
+    with _registry_lock:
+        handler = _handlers.get(key)
+        if handler is None:
+            handler = _handlers[key] = create()
+        return handler
+
+
+def _release_unused_handlers():
+    """Ferme les handlers qui ne servent plus à aucun logger (après une
+    reconfiguration), une fois leurs enregistrements en file écrits"""
+    with _registry_lock:
+        used = set()
+        for yarp_logger in _loggers.values():
+            used.update(map(id, yarp_logger.logger.handlers))
+            used.update(map(id, yarp_logger._file_handlers))
+        unused = [key for key, handler in _handlers.items() if id(handler) not in used]
+        if not unused:
+            return
+        flush_logs()
+        for key in unused:
+            _handlers.pop(key).close()
+
 
 class YARPLogger:
     def __init__(self, name: str = "yarp", config: Optional[Dict] = None):
         self.name = name
         self.logger = logging.getLogger(name)
         self.config = config or {}
+        self._file_handlers = []
         self._setup_logger()
 
+    def reconfigure(self, config: Optional[Dict] = None):
+        """Applique une nouvelle configuration sans recréer le logger"""
+        self.config = config or {}
+        self._setup_logger()
+        _release_unused_handlers()
+
     def _setup_logger(self):
         """Configure le logger selon la configuration"""
-        # Nettoyer les handlers existants
+        # Retirer les handlers de la configuration précédente (partagés :
+        # ils ne sont pas fermés ici)
         self.logger.handlers.clear()
 
         # Niveau global
@@ -55,11 +239,18 @@ class YARPLogger:
         return getattr(logging, level_str.upper(), logging.INFO)
 
     def _setup_console_handler(self):
-        """Configure l'handler console"""
-        console_handler = logging.StreamHandler(sys.stdout)
-
+        """Configure l'handler console (partagé par format et par flux :
+        yarp plan redirige stdout)"""
         logging_config = self.config.get('logging', {})
         console_format = logging_config.get('formats', {}).get('console', 'simple')
+        stream = sys.stdout
+        self.logger.addHandler(_shared_handler(
+            ('console', console_format, id(stream)),
+            lambda: self._create_console_handler(console_format, stream)
+        ))
+
+    def _create_console_handler(self, console_format: str, stream) -> logging.Handler:
+        console_handler = logging.StreamHandler(stream)
 
         if console_format == 'minimal':
             formatter = logging.Formatter('%(message)s')
@@ -75,13 +266,14 @@ class YARPLogger:
 
         # Console seulement pour INFO et WARNING (pas DEBUG ni ERROR en double)
         console_handler.addFilter(lambda record: record.levelno in [logging.INFO, logging.WARNING])
-
-        self.logger.addHandler(console_handler)
+        return console_handler
 
     def _setup_file_handlers(self):
-        """Configure les handlers de fichiers"""
+        """Configure les handlers de fichiers, alimentés par la file
+        d'écriture partagée"""
         logging_config = self.config.get('logging', {})
         files_config = logging_config.get('files', {})
+        self._file_handlers = []
 
         # Handler application (tous les logs)
         if 'application' in files_config:
@@ -107,53 +299,64 @@ class YARPLogger:
                 "error"
             )
 
+        if self._file_handlers:
+            self.logger.addHandler(_FileQueueHandler(self._file_handlers))
+
     def _add_file_handler(self, filepath: str, level: int, handler_type: str):
-        """Ajoute un handler de fichier avec rotation"""
+        """Ajoute un handler de fichier avec rotation, ouvert une seule
+        fois par processus pour un même fichier, format et filtre"""
+        logging_config = self.config.get('logging', {})
+        file_format = logging_config.get('formats', {}).get('file', 'json')
+        debug = bool(logging_config.get('debug', False))
+        key = ('file', filepath, handler_type, file_format, debug)
         try:
-            # Créer le répertoire si nécessaire
-            import os
-            os.makedirs(os.path.dirname(filepath), exist_ok=True)
-
-            # Handler avec rotation (5MB max, 5 fichiers)
-            handler = logging.handlers.RotatingFileHandler(
-                filepath, maxBytes=5*1024*1024, backupCount=5
+            handler = _shared_handler(
+                key, lambda: self._create_file_handler(filepath, level, handler_type, file_format, debug)
             )
-            handler.setLevel(level)
-
-            # Format selon config
-            logging_config = self.config.get('logging', {})
-            file_format = logging_config.get('formats', {}).get('file', 'json')
-
-            if file_format == 'json':
-                formatter = JSONFormatter()
-            elif file_format == 'detailed':
-                formatter = logging.Formatter(
-                    '[%(asctime)s] [%(name)s] [%(levelname)s] [%(funcName)s:%(lineno)d] %(message)s'
-                )
-            else:  # text
-                formatter = logging.Formatter(
-                    '[%(asctime)s] [%(levelname)s] %(message)s'
-                )
-
-            handler.setFormatter(formatter)
-
-            # Filtrer selon le type de handler
-            if handler_type == "error":
-                handler.addFilter(lambda record: record.levelno >= logging.ERROR)
-            elif handler_type == "debug":
-                # Debug handler prend tout
-                pass
-            else:
-                # Application handler exclut le DEBUG (sauf si mode debug)
-                min_level = logging.DEBUG if logging_config.get('debug', False) else logging.INFO
-                handler.addFilter(lambda record: record.levelno >= min_level)
-
-            self.logger.addHandler(handler)
-
+            self._file_handlers.append(handler)
         except Exception as e:
             # Si impossible de créer le fichier, au moins logger vers console
             print(f"Impossible de créer le fichier de log {filepath}: {e}", file=sys.stderr)
 
+    def _create_file_handler(self, filepath: str, level: int, handler_type: str,
+                             file_format: str, debug: bool) -> logging.Handler:
+        # Créer le répertoire si nécessaire
+        import os
+        os.makedirs(os.path.dirname(filepath), exist_ok=True)
+
+        # Handler avec rotation (5MB max, 5 fichiers)
+        handler = logging.handlers.RotatingFileHandler(
+            filepath, maxBytes=5*1024*1024, backupCount=5
+        )
+        handler.setLevel(level)
+
+        # Format selon config
+        if file_format == 'json':
+            formatter = JSONFormatter()
+        elif file_format == 'detailed':
+            formatter = logging.Formatter(
+                '[%(asctime)s] [%(name)s] [%(levelname)s] [%(funcName)s:%(lineno)d] %(message)s'
+            )
+        else:  # text
+            formatter = logging.Formatter(
+                '[%(asctime)s] [%(levelname)s] %(message)s'
+            )
+
+        handler.setFormatter(formatter)
+
+        # Filtrer selon le type de handler
+        if handler_type == "error":
+            handler.addFilter(lambda record: record.levelno >= logging.ERROR)
+        elif handler_type == "debug":
+            # Debug handler prend tout
+            pass
+        else:
+            # Application handler exclut le DEBUG (sauf si mode debug)
+            min_level = logging.DEBUG if debug else logging.INFO
+            handler.addFilter(lambda record: record.levelno >= min_level)
+
+        return handler
+
     # Méthodes de logging avec contexte
     def debug(self, message: str, **context):
         """Log debug avec contexte optionnel"""
@@ -196,12 +399,15 @@ class YARPLogger:
         else:
             self.debug(f"{operation} sur {interface}: {status}", **context)
 
-    def command_execution(self, command: str, return_code: int, duration_ms: int = None):
-        """Log spécialisé pour l'exécution de commandes"""
+    def command_execution(self, command: str, return_code: int, duration_ms: int = None, **details):
+        """Log spécialisé pour l'exécution de commandes (durée agrégée
+        par module et nature de commande, voir yarp_metrics)"""
+        metrics.record_command(self.name, command, return_code, duration_ms, details.get('lines', 0))
         context = {
             'command': command,
             'return_code': return_code,
-            'duration_ms': duration_ms
+            'duration_ms': duration_ms,
+            **details
         }
         if return_code == 0:
             self.debug(f"Commande réussie: {command}", **context)
@@ -226,17 +432,32 @@ class JSONFormatter(logging.Formatter):
         if hasattr(record, 'context'):
             log_entry['context'] = record.context
 
-        # Ajouter l'exception si présente
-        if record.exc_info:
-            log_entry['exception'] = self.formatException(record.exc_info)
+        # Ajouter l'exception si présente (déjà formatée par
+        # _FileQueueHandler quand l'enregistrement vient de la file)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            log_entry['exception'] = record.exc_text
 
         return json.dumps(log_entry, ensure_ascii=False)
 
 
 # Factory function pour créer des loggers facilement
 def get_logger(name: str = "yarp", config: Optional[Dict] = None) -> YARPLogger:
-    """Créé un logger YARP configuré"""
-    return YARPLogger(name, config)
+    """Logger YARP `name` du processus, créé au premier appel.
+
+    Les appels suivants retournent le même logger, reconfiguré sur place
+    si `config` diffère. Les fichiers de log sont partagés entre loggers
+    sans être rouverts (voir _shared_handler).
+    """
+    config = config or {}
+    with _registry_lock:
+        yarp_logger = _loggers.get(name)
+        if yarp_logger is None:
+            yarp_logger = _loggers[name] = YARPLogger(name, config)
+        elif yarp_logger.config != config:
+            yarp_logger.reconfigure(config)
+        return yarp_logger
 
 
 # Logger par défaut pour compatibilité
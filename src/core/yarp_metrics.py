@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+YARP Metrics
+Agrégation en mémoire des durées de commandes et de phases d'un apply,
+et historique des résumés dans /var/lib/yarp/metrics/
+"""
+
+import bisect
+import json
+import os
+import socket
+import sys
+import time
+
+YARP_DIR = "/opt/yarp"
+sys.path.insert(0, os.path.join(YARP_DIR, 'core'))
+
+from yarp_plan import command_kind
+
+METRICS_DIR = "/var/lib/yarp/metrics"
+LAST_APPLY_FILE = os.path.join(METRICS_DIR, "last-apply.json")
+HISTORY_FILE = os.path.join(METRICS_DIR, "history.jsonl")
+# Nombre de résumés conservés dans l'historique
+MAX_HISTORY = 500
+
+
+def _bucket_bounds():
+    """Bornes supérieures (ms) des classes d'histogramme : 0 puis
+    1, 1.2, 1.5, 2, 2.5, 3, 4, 5, 6, 8 × 10^n jusqu'à 10^6 ms"""
+    bounds = [0]
+    for exponent in range(0, 6):
+        for mantissa in (1, 1.2, 1.5, 2, 2.5, 3, 4, 5, 6, 8):
+            bounds.append(mantissa * 10 ** exponent)
+    bounds.append(10 ** 6)
+    return bounds
+
+
+BUCKET_BOUNDS = _bucket_bounds()
+
+
+class Histogram:
+    """Histogramme de durées à classes fixes (mémoire bornée).
+
+    Les percentiles sont la borne supérieure de la classe concernée,
+    soit une erreur de 25 % au plus ; le maximum est exact.
+    """
+
+    __slots__ = ('buckets', 'count', 'failures', 'lines', 'total', 'max')
+
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKET_BOUNDS) + 1)
+        self.count = 0
+        self.failures = 0
+        self.lines = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, duration_ms, success=True, lines=0):
+        self.buckets[bisect.bisect_left(BUCKET_BOUNDS, duration_ms)] += 1
+        self.count += 1
+        if not success:
+            self.failures += 1
+        self.lines += lines
+        self.total += duration_ms
+        self.max = max(self.max, duration_ms)
+
+    def percentile(self, fraction):
+        if not self.count:
+            return None
+        rank = fraction * self.count
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if seen >= rank and count:
+                bound = BUCKET_BOUNDS[index] if index < len(BUCKET_BOUNDS) else self.max
+                return min(bound, self.max)
+        return self.max
+
+    def to_dict(self):
+        summary = {
+            'count': self.count,
+            'failures': self.failures,
+            'p50_ms': self.percentile(0.5),
+            'p95_ms': self.percentile(0.95),
+            'max_ms': self.max,
+            'total_ms': round(self.total, 1),
+        }
+        if self.lines:
+            summary['lines'] = self.lines
+        return summary
+
+
+class Metrics:
+    """Durées des commandes (par module et nature de commande) et des
+    phases d'un apply"""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        # {module: {nature de commande: Histogram}}
+        self.commands = {}
+        # [(phase, durée ms, succès)] dans l'ordre d'exécution
+        self.phases = []
+
+    def record_command(self, module, command, return_code, duration_ms, lines=0):
+        if duration_ms is None:
+            return
+        kinds = self.commands.setdefault(module, {})
+        kind = command_kind(command)
+        histogram = kinds.get(kind)
+        if histogram is None:
+            histogram = kinds[kind] = Histogram()
+        histogram.add(duration_ms, return_code == 0, lines)
+
+    def record_phase(self, phase, duration_ms, success):
+        self.phases.append((phase, duration_ms, bool(success)))
+
+    def summary(self, **context):
+        """Résumé JSON de l'apply ; `context` s'ajoute aux champs communs"""
+        return {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'hostname': socket.gethostname(),
+            **context,
+            'phases': [
+                {'phase': phase, 'duration_ms': duration_ms, 'success': success}
+                for phase, duration_ms, success in self.phases
+            ],
+            'commands': {
+                module: {kind: histogram.to_dict() for kind, histogram in sorted(kinds.items())}
+                for module, kinds in sorted(self.commands.items())
+            },
+        }
+
+
+# Agrégats du processus, alimentés par YARPLogger.command_execution
+metrics = Metrics()
+
+
+def write_summary(summary):
+    """Écrit le résumé du dernier apply et l'ajoute à l'historique
+    (MAX_HISTORY derniers apply)"""
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    tmp_path = f"{LAST_APPLY_FILE}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(summary, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, LAST_APPLY_FILE)
+
+    lines = read_history_lines()
+    lines.append(json.dumps(summary, ensure_ascii=False, separators=(',', ':')))
+    tmp_path = f"{HISTORY_FILE}.tmp"
+    with open(tmp_path, 'w') as f:
+        f.write("\n".join(lines[-MAX_HISTORY:]) + "\n")
+    os.replace(tmp_path, HISTORY_FILE)
+
+
+def read_history_lines():
+    try:
+        with open(HISTORY_FILE) as f:
+            return [line.rstrip("\n") for line in f if line.strip()]
+    except OSError:
+        return []
+
+
+def read_history():
+    """Résumés des apply précédents, du plus ancien au plus récent"""
+    history = []
+    for line in read_history_lines():
+        try:
+            history.append(json.loads(line))
+        except ValueError:
+            continue
+    return history
+
+
+def _format_ms(value):
+    return "-" if value is None else f"{value:g}"
+
+
+def print_summary(summary):
+    """Affiche un résumé : phases puis commandes par module"""
+    status = "succès" if summary.get('success') else "échec"
+    print(f"Apply du {summary.get('timestamp')} ({status}, {summary.get('duration_ms')} ms, "
+          f"version {summary.get('version') or 'inconnue'})")
+    sizes = summary.get('config') or {}
+    if sizes:
+        print("Configuration: " + ", ".join(f"{key} {value}" for key, value in sizes.items()))
+
+    print("\nPhases:")
+    for phase in summary.get('phases', ()):
+        mark = "" if phase['success'] else "  ✗"
+        print(f"  {phase['phase']:<12} {phase['duration_ms']:>7} ms{mark}")
+
+    print(f"\n  {'module':<10} {'commande':<22} {'nb':>6} {'échecs':>6} "
+          f"{'p50':>7} {'p95':>7} {'max':>7}")
+    for module, kinds in summary.get('commands', {}).items():
+        for kind, stats in kinds.items():
+            print(f"  {module:<10} {kind[:22]:<22} {stats['count']:>6} {stats['failures']:>6} "
+                  f"{_format_ms(stats['p50_ms']):>7} {_format_ms(stats['p95_ms']):>7} "
+                  f"{_format_ms(stats['max_ms']):>7}")
+
+
+def print_history(history):
+    """Une ligne par apply : durée totale, phases et taille de la configuration"""
+    for summary in history:
+        phases = " ".join(f"{phase['phase']}={phase['duration_ms']}" for phase in summary.get('phases', ()))
+        sizes = summary.get('config') or {}
+        status = "ok" if summary.get('success') else "ÉCHEC"
+        print(f"{summary.get('timestamp')} {summary.get('version') or '-':<8} {status:<5} "
+              f"{summary.get('duration_ms', 0):>7} ms  règles={sizes.get('firewall_rules', '-')} "
+              f"routes={sizes.get('routes', '-')}  {phases}")
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: yarp_metrics.py <command> [--json]")
+        print("Commands:")
+        print("  show      - Durées du dernier apply (phases, commandes p50/p95/max)")
+        print("  history   - Un résumé par apply (historique borné)")
+        sys.exit(1)
+
+    command = sys.argv[1]
+    as_json = "--json" in sys.argv[2:]
+
+    if command == "show":
+        try:
+            with open(LAST_APPLY_FILE) as f:
+                summary = json.load(f)
+        except (OSError, ValueError):
+            print("Aucune métrique : aucun apply enregistré")
+            sys.exit(1)
+        if as_json:
+            print(json.dumps(summary, indent=2, ensure_ascii=False))
+        else:
+            print_summary(summary)
+    elif command == "history":
+        history = read_history()
+        if as_json:
+            print(json.dumps(history, indent=2, ensure_ascii=False))
+        else:
+            print_history(history)
+    else:
+        print(f"Commande inconnue: {command}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
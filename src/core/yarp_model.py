@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+"""
+YARP Config Model
+Modèle typé de la configuration, construit une seule fois par section
+"""
+
+import re
+import ipaddress
+
+# Nom d'interface Linux : 15 caractères maximum, sans espace ni '/'
+IFNAME_PATTERN = re.compile(r'^[^\s/]{1,15}$')
+
+# Protocoles firewall sans notion de port
+L3_PROTOCOLS = ('icmp', 'gre', 'esp', 'ah', 'ipip', 'ospf', 'vrrp')
+# Protocoles firewall avec ports
+L4_PROTOCOLS = ('tcp', 'udp', 'sctp')
+
+MAIN_TABLE = 254
+
+
+class ModelError(Exception):
+    """Configuration impossible à convertir en modèle"""
+
+
+def parse_fwmark(value):
+    """Convertit une marque firewall (2, "0x2" ou "0x2/0xff") en (marque, masque).
+
+    Retourne None si la valeur est invalide. Le masque vaut None s'il
+    n'est pas précisé.
+    """
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return (value, None) if 0 < value <= 0xFFFFFFFF else None
+    if not isinstance(value, str):
+        return None
+
+    mark, _, mask = value.partition('/')
+    try:
+        mark = int(mark, 0)
+        mask = int(mask, 0) if mask else None
+    except ValueError:
+        return None
+    if not 0 < mark <= 0xFFFFFFFF or (mask is not None and not 0 < mask <= 0xFFFFFFFF):
+        return None
+    return mark, mask
+
+
+def normalize_ports(value):
+    """Normalise une valeur de ports en tuple de chaînes iptables.
+
+    80 → ("80",), "8000:8100" → ("8000:8100",), [80, "443"] → ("80", "443")
+    """
+    if isinstance(value, bool):
+        return ()
+    if isinstance(value, (int, str)):
+        return (str(value),)
+    if isinstance(value, list):
+        return tuple(str(p) for p in value)
+    return ()
+
+
+# Analyses mémorisées le temps de la construction d'une section : un même
+# réseau ou une même passerelle revient souvent dans des milliers de
+# règles, qui partagent alors le même objet
+_networks = {}
+_gateways = {}
+
+
+def _parse_network(value):
+    network = _networks.get(value)
+    if network is None:
+        network = _networks[value] = ipaddress.ip_network(str(value), strict=False)
+    return network
+
+
+def _parse_gateway(value):
+    """Adresse de passerelle normalisée (chaîne)"""
+    gateway = _gateways.get(value)
+    if gateway is None:
+        gateway = _gateways[value] = str(ipaddress.ip_address(str(value)))
+    return gateway
+
+
+def _network(value):
+    """Réseau source/destination d'une règle ; None pour 'any'"""
+    if value is None or str(value).lower() == 'any':
+        return None
+    return _parse_network(value)
+
+
+class NatSource:
+    """Réseau source masqueradé vers une interface"""
+
+    __slots__ = ('interface', 'network')
+
+    def __init__(self, interface, network):
+        self.interface = interface
+        self.network = network
+
+    @property
+    def cidr(self):
+        return self.network.with_prefixlen
+
+
+class Interface:
+    """Interface réseau gérée par YARP"""
+
+    __slots__ = ('name', 'ipv4', 'dhcp', 'ipv6', 'ipv6_auto', 'masquerading', 'nat_sources')
+
+    def __init__(self, name, data):
+        self.name = name
+        ipv4 = data.get('ipv4')
+        ipv6 = data.get('ipv6')
+        self.dhcp = ipv4 == 'dhcp'
+        self.ipv4 = ipaddress.ip_interface(ipv4) if ipv4 and not self.dhcp else None
+        self.ipv6_auto = ipv6 == 'auto'
+        self.ipv6 = ipaddress.ip_interface(ipv6) if ipv6 and not self.ipv6_auto else None
+        self.masquerading = data.get('masquerading', False) is True
+        self.nat_sources = ()
+        if self.masquerading:
+            self.nat_sources = tuple(
+                NatSource(name, _parse_network(source))
+                for source in data.get('masquerade_sources') or ()
+            )
+
+
+class Rule:
+    """Règle firewall (chaîne, action et protocoles en minuscules).
+
+    `protocols` vaut None pour 'any', sinon un tuple de (protocole,
+    ports) où ports est un tuple vide pour les protocoles sans port.
+    `mark` est le couple (marque, masque) d'une règle action: mark.
+    """
+
+    __slots__ = (
+        'name', 'chain', 'action', 'source', 'destination',
+        'in_interface', 'out_interface', 'protocols', 'mark',
+    )
+
+    def __init__(self, data):
+        self.name = str(data.get('name', 'unnamed'))
+        self.chain = str(data.get('chain', 'forward')).lower()
+        self.action = str(data.get('action', 'accept')).lower()
+        self.source = _network(data.get('source'))
+        self.destination = _network(data.get('destination'))
+        self.in_interface = data.get('in_interface')
+        self.out_interface = data.get('out_interface')
+
+        protocols = data.get('protocols', 'any')
+        if isinstance(protocols, dict):
+            self.protocols = tuple(
+                (proto.lower(), () if proto.lower() in L3_PROTOCOLS else normalize_ports(ports))
+                for proto, ports in protocols.items()
+            )
+        else:
+            self.protocols = None
+
+        self.mark = None
+        if self.action == 'mark':
+            self.mark = parse_fwmark(data.get('mark'))
+            if self.mark is None:
+                raise ModelError(f"Règle '{self.name}': marque invalide: {data.get('mark')}")
+
+
+class Route:
+    """Route statique, ou entrée de flux externe si `file` est défini.
+
+    Pour un flux, `network` vaut None et les autres champs servent de
+    valeurs par défaut aux lignes du fichier. Les passerelles sont des
+    adresses normalisées ; `nexthops` est un tuple trié de (via,
+    interface, poids) pour une route multipath.
+    """
+
+    __slots__ = (
+        'table', 'type', 'network', 'via', 'interface', 'metric',
+        'nexthops', 'file', 'format',
+    )
+
+    def __init__(self, data, table=MAIN_TABLE):
+        self.table = table
+        self.type = data.get('type') or 'unicast'
+        self.file = data.get('file')
+        self.format = data.get('format', 'text') if self.file else None
+        self.network = None if self.file else _parse_network(data['to'])
+        self.via = _parse_gateway(data['via']) if data.get('via') else None
+        self.interface = data.get('interface')
+        self.metric = int(data['metric']) if data.get('metric') else None
+
+        self.nexthops = None
+        if data.get('nexthops'):
+            self.nexthops = tuple(sorted(
+                (
+                    _parse_gateway(hop['via']) if hop.get('via') else None,
+                    hop.get('interface'),
+                    int(hop.get('weight', 1)),
+                )
+                for hop in data['nexthops']
+            ))
+
+        devices = [self.interface] + [hop[1] for hop in self.nexthops or ()]
+        if any(name and not IFNAME_PATTERN.match(str(name)) for name in devices):
+            raise ModelError(f"Route {data.get('to') or self.file}: nom d'interface invalide")
+
+
+class ConfigModel:
+    """Modèle complet : interfaces, règles firewall et routes statiques.
+
+    Chaque section est construite à sa première lecture : un module ne
+    paie que les sections qu'il utilise (voir build_model).
+    """
+
+    __slots__ = ('_config', '_interfaces', '_rules', '_routes')
+
+    def __init__(self, config):
+        self._config = config
+        self._interfaces = None
+        self._rules = None
+        self._routes = None
+
+    @property
+    def interfaces(self):
+        if self._interfaces is None:
+            self._interfaces = _convert(lambda: {
+                name: Interface(name, data or {})
+                for name, data in (self._config.get('interfaces') or {}).items()
+            })
+        return self._interfaces
+
+    @property
+    def rules(self):
+        if self._rules is None:
+            firewall = self._config.get('firewall') or {}
+            self._rules = _convert(lambda: tuple(Rule(rule) for rule in firewall.get('rules') or ()))
+        return self._rules
+
+    @property
+    def routes(self):
+        if self._routes is None:
+            self._routes = _convert(self._build_routes)
+        return self._routes
+
+    def _build_routes(self):
+        routing = self._config.get('routing') or {}
+        routes = [Route(route) for route in routing.get('static') or ()]
+        for table in (routing.get('tables') or {}).values():
+            routes.extend(Route(route, table['id']) for route in table.get('routes') or ())
+        return tuple(routes)
+
+    def sizes(self):
+        """Nombre d'interfaces, de règles et de routes, sans construire les sections"""
+        config = self._config
+        firewall = config.get('firewall') or {}
+        routing = config.get('routing') or {}
+        return {
+            'interfaces': len(config.get('interfaces') or {}),
+            'firewall_rules': len(firewall.get('rules') or ()),
+            'routes': len(routing.get('static') or ()) + sum(
+                len(table.get('routes') or ()) for table in (routing.get('tables') or {}).values()
+            ),
+        }
+
+    def nat_sources(self):
+        """Sources masqueradées, par interface (nom → tuple de NatSource)"""
+        return {
+            name: iface.nat_sources
+            for name, iface in self.interfaces.items()
+            if iface.nat_sources
+        }
+
+
+def _convert(build):
+    """Construit une section du modèle (erreurs de conversion → ModelError)"""
+    try:
+        return build()
+    except (ValueError, TypeError, KeyError, AttributeError) as e:
+        raise ModelError(str(e))
+    finally:
+        _networks.clear()
+        _gateways.clear()
+
+
+def build_model(config, lazy=False):
+    """Construit le modèle d'une configuration validée.
+
+    Lève ModelError si une valeur ne peut pas être convertie. Avec lazy,
+    les sections ne sont construites qu'à leur première lecture : réservé
+    à une configuration déjà validée (reprise du cache), dont la
+    conversion ne peut plus échouer.
+    """
+    model = ConfigModel(config)
+    if not lazy:
+        # Toutes les sections : les erreurs sont signalées à la validation
+        model.interfaces, model.rules, model.routes
+    return model
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+YARP Plan
+Enregistrement des opérations d'un apply à blanc (yarp plan) et
+estimation de leur coût à partir des durées journalisées
+"""
+
+import json
+import os
+import re
+import statistics
+
+# Commandes de lecture : exécutées normalement en mode plan, car les
+# managers en ont besoin pour comparer l'état du noyau à la configuration
+READ_ONLY_PATTERNS = [re.compile(pattern) for pattern in (
+    r'^ip(\s+-\S+)*\s+(link|addr|address|route|rule|nexthop|neigh)(\s+\S+)*?\s+(show|list|ls|get)\b',
+    r'^ip(\s+-\S+)*\s+(link|addr|address|route|rule|nexthop)\s*$',
+    r'^ip(\s+-\S+)*\s+-br\b',
+    r'^ip6?tables(\s+-t\s+\w+)?\s+(-S|-L|-C|--list|--check)\b',
+    r'^ip6?tables-save\b',
+    r'^sysctl\s+(-n\s+)?[\w.]+$',
+    r'^(pgrep|cat|grep|which|test)\b',
+)]
+
+# Actions iptables, pour regrouper les commandes par nature
+IPTABLES_ACTIONS = ('-A', '-I', '-D', '-R', '-F', '-P', '-N', '-X', '-Z')
+
+# Coût par défaut d'une opération sans historique (ms)
+DEFAULT_OPERATION_MS = 5
+# Volume de log lu pour l'historique (fin de chaque fichier)
+HISTORY_MAX_BYTES = 5 * 1024 * 1024
+
+
+def is_read_only(cmd):
+    """Indique si une commande (première commande d'un pipeline) ne modifie rien"""
+    first = cmd.split('|', 1)[0].strip()
+    return any(pattern.match(first) for pattern in READ_ONLY_PATTERNS)
+
+
+def command_kind(cmd):
+    """Nature d'une commande pour l'historique des durées.
+
+    "ip -6 route replace ..." → "ip route replace", "iptables -t nat -A
+    POSTROUTING ..." → "iptables -A", "ip -force -batch -" → "ip -batch"
+    """
+    tokens = cmd.split()
+    if tokens[:1] == ['timeout'] and len(tokens) > 2:
+        tokens = tokens[2:]
+    if not tokens:
+        return ""
+
+    program = tokens[0]
+    if program == 'ip':
+        if '-batch' in tokens:
+            return "ip -batch"
+        words = [token for token in tokens[1:] if not token.startswith('-')]
+        return " ".join(['ip'] + words[:2])
+    if program in ('iptables', 'ip6tables'):
+        action = next((token for token in tokens[1:] if token in IPTABLES_ACTIONS), "")
+        return f"{program} {action}".strip()
+    if program == 'sysctl':
+        return "sysctl -w" if '-w' in tokens else program
+    return program
+
+
+class Operation:
+    """Opération qu'un apply effectuerait.
+
+    `kind` : command (commande système, `lines` pour l'entrée d'un
+    ip -batch), file (écriture de fichier) ou process (signal à un
+    processus).
+    """
+
+    __slots__ = ('kind', 'target', 'lines')
+
+    def __init__(self, kind, target, lines=()):
+        self.kind = kind
+        self.target = target
+        self.lines = tuple(lines)
+
+    @property
+    def count(self):
+        """Nombre d'opérations noyau (une par ligne d'un batch)"""
+        return len(self.lines) or 1
+
+    def to_dict(self):
+        entry = {'kind': self.kind, 'target': self.target}
+        if self.lines:
+            entry['lines'] = list(self.lines)
+        return entry
+
+
+class Plan:
+    """Opérations enregistrées, par phase, au lieu d'être exécutées"""
+
+    def __init__(self):
+        # [(phase, [Operation])] dans l'ordre d'exécution
+        self.phases = []
+        # Phase en échec : l'apply s'arrêterait après elle
+        self.failed = None
+
+    def begin(self, phase):
+        self.phases.append((phase, []))
+
+    def _add(self, operation):
+        if not self.phases:
+            self.begin("validation")
+        self.phases[-1][1].append(operation)
+
+    def command(self, cmd, input=None):
+        """Enregistre une commande ; retourne le résultat d'un succès"""
+        lines = [line for line in (input or "").splitlines() if line.strip()]
+        self._add(Operation('command', cmd, lines))
+        return True, "", ""
+
+    def write(self, path):
+        """Enregistre l'écriture (ou le remplacement) d'un fichier"""
+        self._add(Operation('file', path))
+
+    def process(self, description):
+        """Enregistre une action sur un processus (démarrage, arrêt)"""
+        self._add(Operation('process', description))
+
+    def operations(self):
+        return [operation for _, operations in self.phases for operation in operations]
+
+    def estimate(self, history):
+        """Coût estimé (ms) de chaque phase : [(phase, opérations, ms)]"""
+        estimates = []
+        for phase, operations in self.phases:
+            cost = 0.0
+            for operation in operations:
+                cost += history.operation_cost(operation)
+            estimates.append((phase, operations, cost))
+        return estimates
+
+    def to_dict(self, history):
+        phases = []
+        for phase, operations, cost in self.estimate(history):
+            phases.append({
+                'phase': phase,
+                'count': sum(operation.count for operation in operations),
+                'estimated_ms': round(cost, 1),
+                'history_ms': history.phase_duration(phase),
+                'operations': [operation.to_dict() for operation in operations],
+            })
+        return {
+            'phases': phases,
+            'count': sum(phase['count'] for phase in phases),
+            'estimated_ms': round(sum(phase['estimated_ms'] for phase in phases), 1),
+            'failed': self.failed,
+        }
+
+    def render(self, history, verbose=True):
+        """Plan lisible : opérations numérotées, regroupées par phase"""
+        lines = []
+        total_count, total_cost = 0, 0.0
+        for phase, operations, cost in self.estimate(history):
+            count = sum(operation.count for operation in operations)
+            total_count += count
+            total_cost += cost
+            previous = history.phase_duration(phase)
+            previous = f", dernier apply: {previous} ms" if previous is not None else ""
+            lines.append(f"[{phase}] {count} opération(s), ~{cost:.0f} ms estimées{previous}")
+            if not verbose:
+                continue
+            for number, operation in enumerate(operations, 1):
+                prefix = "écrire " if operation.kind == 'file' else ""
+                lines.append(f"  {number:>4}. {prefix}{operation.target}")
+                for line in operation.lines:
+                    lines.append(f"          {line}")
+        lines.append(f"Total: {total_count} opération(s), ~{total_cost:.0f} ms estimées")
+        if self.failed:
+            lines.append(f"Échec de la phase {self.failed} : l'apply s'arrêterait à cette phase")
+        return "\n".join(lines)
+
+
+class History:
+    """Durées passées lues dans les logs JSON (champ context.duration_ms).
+
+    Les commandes (command_execution) donnent la durée moyenne d'une
+    opération par nature de commande ; les phases de yarp apply, la médiane des
+    derniers apply.
+    """
+
+    def __init__(self):
+        self.commands = {}
+        self.phases = {}
+
+    @classmethod
+    def from_logs(cls, paths):
+        history = cls()
+        for path in paths:
+            history._read(path)
+        return history
+
+    def _read(self, path):
+        try:
+            with open(path, 'rb') as f:
+                f.seek(0, os.SEEK_END)
+                f.seek(max(0, f.tell() - HISTORY_MAX_BYTES))
+                data = f.read().decode('utf-8', errors='replace')
+        except OSError:
+            return
+
+        for line in data.splitlines():
+            if '"duration_ms"' not in line:
+                continue
+            try:
+                context = json.loads(line).get('context') or {}
+            except (ValueError, AttributeError):
+                continue
+            duration_ms = context.get('duration_ms')
+            if not isinstance(duration_ms, (int, float)):
+                continue
+            if context.get('command'):
+                # Durée par opération : un ip -batch en compte une par ligne
+                kind = command_kind(context['command'])
+                lines = context.get('lines') or 1
+                self.commands.setdefault(kind, []).append(duration_ms / lines)
+            elif context.get('phase'):
+                self.phases.setdefault(context['phase'], []).append(duration_ms)
+
+    def command_cost(self, cmd):
+        durations = self.commands.get(command_kind(cmd))
+        if durations:
+            return statistics.fmean(durations)
+        every = [d for durations in self.commands.values() for d in durations]
+        return statistics.fmean(every) if every else DEFAULT_OPERATION_MS
+
+    def operation_cost(self, operation):
+        if operation.kind == 'command':
+            return self.command_cost(operation.target) * operation.count
+        return DEFAULT_OPERATION_MS
+
+    def phase_duration(self, phase, last=5):
+        """Médiane des `last` dernières durées de la phase, ou None"""
+        durations = self.phases.get(phase)
+        if not durations:
+            return None
+        return int(statistics.median(durations[-last:]))
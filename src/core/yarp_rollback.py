@@ -0,0 +1,637 @@
+#!/usr/bin/env python3
+"""
+YARP Rollback
+Instantané de l'état noyau avant un apply et retour arrière automatique
+si l'apply n'est pas confirmé à temps (yarp apply --confirm N, yarp confirm)
+"""
+
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import time
+import uuid
+
+YARP_DIR = "/opt/yarp"
+sys.path.insert(0, os.path.join(YARP_DIR, 'core'))
+
+from yarp_logger import get_logger
+from yarp_exec import executor
+from yarp_status import invalidate_cache
+
+STATE_DIR = "/var/lib/yarp"
+ROLLBACK_DIR = os.path.join(STATE_DIR, "rollback")
+SNAPSHOT_FILE = os.path.join(ROLLBACK_DIR, "snapshot.json")
+# Copie des fichiers d'état de yarp apply au moment de l'instantané
+SNAPSHOT_STATE_DIR = os.path.join(ROLLBACK_DIR, "state")
+# Apply en attente de confirmation ; renommé par le timer à l'expiration
+PENDING_FILE = os.path.join(ROLLBACK_DIR, "pending.json")
+EXPIRED_FILE = os.path.join(ROLLBACK_DIR, "expired.json")
+BOOT_ID_FILE = "/proc/sys/kernel/random/boot_id"
+
+# Fichiers d'état restaurés avec le noyau : le prochain apply incrémental
+# se compare ainsi à la configuration effectivement en place
+STATE_FILES = (
+    "applied-config.json", "applied-fragments.json",
+    "interfaces.json", "routes.json", "iptables.rules", "ip6tables.rules",
+)
+
+# Paramètres noyau modifiés par yarp apply (module nat)
+SYSCTLS = ("net.ipv4.ip_forward", "net.ipv6.conf.all.forwarding")
+
+# Chaînes prédéfinies par table iptables : une table absente de
+# l'instantané mais créée depuis est remise à vide
+BUILTIN_CHAINS = {
+    'filter': ('INPUT', 'FORWARD', 'OUTPUT'),
+    'nat': ('PREROUTING', 'INPUT', 'OUTPUT', 'POSTROUTING'),
+    'mangle': ('PREROUTING', 'INPUT', 'FORWARD', 'OUTPUT', 'POSTROUTING'),
+    'raw': ('PREROUTING', 'OUTPUT'),
+    'security': ('INPUT', 'FORWARD', 'OUTPUT'),
+}
+
+# Types de route noyau (sortie ip -N) ; local, broadcast, anycast et
+# multicast sont gérés par le noyau avec les adresses
+ROUTE_TYPES = {
+    1: 'unicast', 2: 'local', 3: 'broadcast', 4: 'anycast', 5: 'multicast',
+    6: 'blackhole', 7: 'unreachable', 8: 'prohibit', 9: 'throw', 10: 'nat',
+}
+KERNEL_ROUTE_TYPES = ('local', 'broadcast', 'anycast', 'multicast')
+# Protocoles des routes recréées par le noyau (kernel, ra)
+KERNEL_PROTOCOLS = ('2', '9')
+LOCAL_TABLE = '255'
+MAIN_TABLE = '254'
+
+# Erreurs ip -batch sans conséquence pour la restauration (objet déjà
+# présent ou déjà absent)
+BENIGN_BATCH_ERRORS = ("File exists", "No such process", "Cannot assign requested address")
+
+# Intervalle de vérification du fichier d'attente par le timer (s)
+WAIT_INTERVAL = 1
+
+
+def read_pending():
+    """Apply en attente de confirmation (dict), ou None.
+
+    Une attente antérieure au dernier démarrage est abandonnée :
+    l'instantané ne correspond plus à rien dans le noyau.
+    """
+    try:
+        with open(PENDING_FILE) as f:
+            pending = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if pending.get('boot_id') != _boot_id():
+        _remove(PENDING_FILE)
+        return None
+    return pending
+
+
+def _boot_id():
+    try:
+        with open(BOOT_ID_FILE) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+        return True
+    except FileNotFoundError:
+        return False
+
+
+def _write_json(path, data):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+class RollbackManager:
+    """Instantané restaurable de l'état réseau et firewall.
+
+    L'instantané contient la sortie d'iptables-save/ip6tables-save, les
+    adresses et l'état des interfaces, les routes hors routes du noyau,
+    les règles de policy routing et les objets nexthop, sous forme de
+    lignes ip -batch. La restauration compare l'état courant à
+    l'instantané et ne programme que les différences : un
+    iptables-restore par famille et quelques appels ip -batch.
+
+    Les fichiers écrits par les phases alpine, system et dns
+    (/etc/hostname, resolv.conf...) ne sont pas restaurés.
+    """
+
+    def __init__(self, logging_config=None):
+        self.logging_config = logging_config or {}
+        self.logger = get_logger("rollback", {'logging': self.logging_config})
+
+    def _run_command(self, cmd, check=True, input=None):
+        """Exécute une commande système avec logging (voir yarp_exec)"""
+        return executor.run(cmd, input=input, logger=self.logger)
+
+    def _run_batch(self, lines, ipv6=False):
+        """Exécute des lignes ip en un seul appel ip -force -batch.
+
+        Retourne le nombre de lignes en échec (hors erreurs bénignes).
+        """
+        if not lines:
+            return 0
+        ip_cmd = "ip -6" if ipv6 else "ip"
+        success, _, stderr = self._run_command(
+            f"{ip_cmd} -force -batch -", check=False, input="\n".join(lines) + "\n"
+        )
+        if success:
+            return 0
+
+        failed = 0
+        previous = ""
+        for line in stderr.splitlines():
+            if line.startswith("Command failed"):
+                if not any(benign in previous for benign in BENIGN_BATCH_ERRORS):
+                    failed += 1
+                    self.logger.error(f"Échec batch restauration ({line}): {previous}")
+            else:
+                previous = line
+        return failed
+
+    def _dump(self, cmd):
+        """Sortie JSON d'une commande ip -j (liste vide en cas d'échec)"""
+        success, stdout, stderr = self._run_command(cmd, check=False)
+        if not success:
+            self.logger.warning(f"{cmd}: {stderr.strip()}")
+            return []
+        try:
+            return json.loads(stdout or "[]")
+        except ValueError:
+            return []
+
+    # ------------------------------------------------------------------ #
+    #  Lecture de l'état noyau                                             #
+    # ------------------------------------------------------------------ #
+
+    def _addresses(self):
+        """Adresses statiques (clé → ligne d'ajout) et état des liens.
+
+        Les adresses dynamiques (DHCP, SLAAC) et IPv6 de lien restent à
+        leur client ou au noyau.
+        """
+        addresses, links = {}, {}
+        for link in self._dump("ip -j addr show"):
+            name = link.get('ifname')
+            if not name or name == 'lo':
+                continue
+            links[name] = 'UP' in (link.get('flags') or ())
+            for info in link.get('addr_info') or ():
+                if info.get('dynamic') or info.get('scope') == 'link' or not info.get('local'):
+                    continue
+                address = f"{info['local']}/{info.get('prefixlen')}"
+                spec = f"address add {address}"
+                if info.get('broadcast'):
+                    spec += f" broadcast {info['broadcast']}"
+                if info.get('scope') not in (None, 'global'):
+                    spec += f" scope {info['scope']}"
+                addresses[f"{address} dev {name}"] = f"{spec} dev {name}"
+        return addresses, links
+
+    def _route_lines(self, entry, version):
+        """(ligne de suppression, ligne de remplacement) d'une route
+        issue de `ip -N -j route show`, ou None pour une route du noyau"""
+        route_type = entry.get('type', 1)
+        route_type = ROUTE_TYPES.get(int(route_type), route_type) if str(route_type).isdigit() else route_type
+        table = str(entry.get('table', MAIN_TABLE))
+        if (
+            table == LOCAL_TABLE
+            or route_type in KERNEL_ROUTE_TYPES
+            or str(entry.get('protocol')) in KERNEL_PROTOCOLS
+        ):
+            return None
+
+        dst = entry.get('dst', 'default')
+        if dst == 'default':
+            dst = '0.0.0.0/0' if version == 4 else '::/0'
+        elif '/' not in dst:
+            dst = f"{dst}/{32 if version == 4 else 128}"
+        if route_type != 'unicast':
+            dst = f"{route_type} {dst}"
+        if entry.get('tos'):
+            dst += f" tos {entry['tos']}"
+        identity = f"{dst} metric {entry.get('metric', 0)} table {table}"
+
+        spec = dst
+        if entry.get('nhid'):
+            spec += f" nhid {entry['nhid']}"
+        else:
+            spec += self._hop_spec(entry)
+        for field, keyword in (('protocol', 'proto'), ('scope', 'scope'), ('prefsrc', 'src')):
+            if entry.get(field) is not None:
+                spec += f" {keyword} {entry[field]}"
+        spec += f" metric {entry.get('metric', 0)} table {table}"
+        if not entry.get('nhid'):
+            for hop in entry.get('nexthops') or ():
+                spec += f" nexthop{self._hop_spec(hop)} weight {hop.get('weight', 1)}"
+        return f"route del {identity}", f"route replace {spec}"
+
+    def _hop_spec(self, hop):
+        """via/dev d'une route ou d'un next-hop (sortie ip -j)"""
+        spec = ""
+        via = hop.get('via')
+        if isinstance(via, dict):
+            family = "inet6 " if via.get('family') == 'inet6' else ""
+            spec += f" via {family}{via.get('host')}"
+        elif hop.get('gateway'):
+            spec += f" via {hop['gateway']}"
+        if hop.get('dev'):
+            spec += f" dev {hop['dev']}"
+        if 'onlink' in (hop.get('flags') or ()):
+            spec += " onlink"
+        return spec
+
+    def _routes(self, version):
+        """Routes hors noyau : ligne de suppression → ligne de remplacement"""
+        routes = {}
+        for entry in self._dump(f"ip -{version} -N -j route show table all"):
+            lines = self._route_lines(entry, version)
+            if lines:
+                routes[lines[0]] = lines[1]
+        return routes
+
+    def _rule_spec(self, entry):
+        """Spécification ip d'une règle issue de `ip -N -j rule show`"""
+        spec = f"priority {entry.get('priority', 0)}"
+        if entry.get('not'):
+            spec += " not"
+        for field, keyword in (('src', 'from'), ('dst', 'to')):
+            address = entry.get(field)
+            if address and address != 'all':
+                length = entry.get(f"{field}len")
+                spec += f" {keyword} {address}/{length}" if length is not None else f" {keyword} {address}"
+        if entry.get('tos'):
+            spec += f" tos {entry['tos']}"
+        if 'fwmark' in entry:
+            spec += f" fwmark {entry['fwmark']}/{entry.get('fwmask', '0xffffffff')}"
+        for field in ('iif', 'oif'):
+            if entry.get(field):
+                spec += f" {field} {entry[field]}"
+        if 'table' in entry:
+            spec += f" table {entry['table']}"
+        elif entry.get('action') == 'goto':
+            spec += f" goto {entry.get('target')}"
+        elif entry.get('action'):
+            spec += f" {entry['action']}"
+        if entry.get('protocol') is not None:
+            spec += f" protocol {entry['protocol']}"
+        return spec
+
+    def _rules(self, version):
+        return [self._rule_spec(entry) for entry in self._dump(f"ip -{version} -N -j rule show")]
+
+    def _nexthops(self):
+        """Objets nexthop : identifiant → spécification"""
+        nexthops = {}
+        for entry in self._dump("ip -N -j nexthop show"):
+            spec = f"id {entry['id']}"
+            if entry.get('group'):
+                members = "/".join(
+                    f"{member['id']},{member.get('weight', 1)}" for member in entry['group']
+                )
+                spec += f" group {members}"
+            elif entry.get('blackhole'):
+                spec += " blackhole"
+            else:
+                spec += self._hop_spec(entry)
+            if entry.get('protocol') is not None:
+                spec += f" proto {entry['protocol']}"
+            nexthops[str(entry['id'])] = spec
+        return nexthops
+
+    def _sysctls(self):
+        values = {}
+        for key in SYSCTLS:
+            success, stdout, _ = self._run_command(f"sysctl -n {key}", check=False)
+            if success:
+                values[key] = stdout.strip()
+        return values
+
+    def _iptables(self):
+        """Sortie d'iptables-save par famille (None si indisponible)"""
+        payloads = {}
+        for version, cmd in (('4', "iptables-save"), ('6', "ip6tables-save")):
+            success, stdout, _ = self._run_command(cmd, check=False)
+            payloads[version] = stdout if success else None
+        return payloads
+
+    # ------------------------------------------------------------------ #
+    #  Instantané                                                          #
+    # ------------------------------------------------------------------ #
+
+    def capture(self):
+        """Prend un instantané de l'état courant et l'enregistre"""
+        start = time.monotonic()
+        addresses, links = self._addresses()
+        snapshot = {
+            'created': time.time(),
+            'boot_id': _boot_id(),
+            'iptables': self._iptables(),
+            'links': links,
+            'addresses': addresses,
+            'nexthops': self._nexthops(),
+            'routes': {str(version): self._routes(version) for version in (4, 6)},
+            'rules': {str(version): self._rules(version) for version in (4, 6)},
+            'sysctls': self._sysctls(),
+            'state_files': [],
+        }
+
+        os.makedirs(SNAPSHOT_STATE_DIR, exist_ok=True)
+        for name in STATE_FILES:
+            path = os.path.join(STATE_DIR, name)
+            if os.path.exists(path):
+                shutil.copy2(path, os.path.join(SNAPSHOT_STATE_DIR, name))
+                snapshot['state_files'].append(name)
+        _write_json(SNAPSHOT_FILE, snapshot)
+
+        duration_ms = int((time.monotonic() - start) * 1000)
+        routes = sum(len(routes) for routes in snapshot['routes'].values())
+        self.logger.info(
+            f"Instantané pris: {len(addresses)} adresses, {routes} routes ({duration_ms} ms)",
+            duration_ms=duration_ms, addresses=len(addresses), routes=routes
+        )
+        return snapshot
+
+    def load(self):
+        try:
+            with open(SNAPSHOT_FILE) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def clear(self):
+        """Supprime l'instantané et les fichiers d'attente"""
+        for path in (PENDING_FILE, EXPIRED_FILE, SNAPSHOT_FILE):
+            _remove(path)
+        shutil.rmtree(SNAPSHOT_STATE_DIR, ignore_errors=True)
+
+    # ------------------------------------------------------------------ #
+    #  Restauration                                                        #
+    # ------------------------------------------------------------------ #
+
+    def _normalize_iptables(self, payload):
+        """Contenu comparable d'une sortie iptables-save (sans
+        commentaires ni compteurs)"""
+        lines = [
+            re.sub(r'\[\d+:\d+\]', '', line)
+            for line in payload.splitlines()
+            if line and not line.startswith('#')
+        ]
+        return "\n".join(lines)
+
+    def _restore_iptables(self, payloads):
+        """Recharge les tables iptables de l'instantané (un
+        iptables-restore par famille) ; retourne le nombre d'échecs"""
+        failed = 0
+        current = self._iptables()
+        for version, program in (('4', "iptables"), ('6', "ip6tables")):
+            payload = payloads.get(version)
+            if payload is None or current.get(version) is None:
+                continue
+            if self._normalize_iptables(payload) == self._normalize_iptables(current[version]):
+                continue
+
+            # Tables créées depuis l'instantané : remises à vide
+            saved = set(re.findall(r'^\*(\w+)', payload, re.MULTILINE))
+            for table in re.findall(r'^\*(\w+)', current[version], re.MULTILINE):
+                if table in saved or table not in BUILTIN_CHAINS:
+                    continue
+                chains = "".join(f":{chain} ACCEPT [0:0]\n" for chain in BUILTIN_CHAINS[table])
+                payload += f"*{table}\n{chains}COMMIT\n"
+
+            success, _, stderr = self._run_command(f"{program}-restore", check=False, input=payload)
+            if not success:
+                self.logger.error(f"Échec de {program}-restore: {stderr.strip()}")
+                failed += 1
+        return failed
+
+    def _restore_ip(self, snapshot):
+        """Restaure adresses, routes, règles et objets nexthop par
+        différence avec l'état courant ; retourne le nombre d'échecs"""
+        addresses, links = self._addresses()
+        nexthops = self._nexthops()
+        saved_nexthops = snapshot.get('nexthops') or {}
+
+        # Ajouts et remplacements avant suppressions, comme le routage
+        first = [
+            f"link set dev {name} up"
+            for name, up in (snapshot.get('links') or {}).items()
+            if up and links.get(name) is False
+        ]
+        first += [spec for key, spec in snapshot['addresses'].items() if key not in addresses]
+        # Nexthops simples avant les groupes qui les référencent
+        first += sorted(
+            (f"nexthop replace {spec}" for nh_id, spec in saved_nexthops.items() if nexthops.get(nh_id) != spec),
+            key=lambda line: " group " in line
+        )
+
+        # Groupes avant les nexthops simples qu'ils référencent
+        stale = sorted(
+            (nh_id for nh_id in nexthops if nh_id not in saved_nexthops),
+            key=lambda nh_id: " group " not in nexthops[nh_id]
+        )
+        last = [f"nexthop del id {nh_id}" for nh_id in stale]
+        last += [f"address del {key}" for key in addresses if key not in snapshot['addresses']]
+        last += [
+            f"link set dev {name} down"
+            for name, up in (snapshot.get('links') or {}).items()
+            if not up and links.get(name) is True
+        ]
+
+        failed = self._run_batch(first)
+        counts = {'routes': 0, 'rules': 0}
+        for version in (4, 6):
+            saved_routes = snapshot['routes'].get(str(version)) or {}
+            saved_rules = snapshot['rules'].get(str(version)) or []
+            routes = self._routes(version)
+            rules = self._rules(version)
+
+            lines = [f"rule add {spec}" for spec in saved_rules if spec not in rules]
+            lines += [spec for key, spec in saved_routes.items() if routes.get(key) != spec]
+            lines += [key for key in routes if key not in saved_routes]
+            lines += [f"rule del {spec}" for spec in rules if spec not in saved_rules]
+            counts['routes'] += sum(line.startswith("route ") for line in lines)
+            counts['rules'] += sum(line.startswith("rule ") for line in lines)
+            failed += self._run_batch(lines, ipv6=(version == 6))
+
+        failed += self._run_batch(last)
+        self.logger.info(
+            f"Restauration: {len(first) + len(last)} modifications d'interfaces, "
+            f"{counts['routes']} de routes, {counts['rules']} de règles",
+            routes=counts['routes'], rules=counts['rules']
+        )
+        return failed
+
+    def restore(self, snapshot):
+        """Ramène le noyau à l'état de l'instantané ; retourne True si
+        toutes les opérations ont réussi"""
+        start = time.monotonic()
+        # Le firewall d'abord : c'est lui qui coupe le plus souvent l'accès
+        failed = self._restore_iptables(snapshot.get('iptables') or {})
+        failed += self._restore_ip(snapshot)
+
+        current = self._sysctls()
+        for key, value in (snapshot.get('sysctls') or {}).items():
+            if current.get(key) != value and not self._run_command(f"sysctl -w {key}={value}", check=False)[0]:
+                failed += 1
+
+        for name in STATE_FILES:
+            path = os.path.join(STATE_DIR, name)
+            if name in snapshot.get('state_files', ()):
+                shutil.copy2(os.path.join(SNAPSHOT_STATE_DIR, name), path)
+            else:
+                _remove(path)
+        invalidate_cache()
+
+        duration_ms = int((time.monotonic() - start) * 1000)
+        self.logger.info(
+            f"État précédent restauré en {duration_ms} ms ({failed} échecs)",
+            duration_ms=duration_ms, failed=failed
+        )
+        return failed == 0
+
+    # ------------------------------------------------------------------ #
+    #  Confirmation                                                        #
+    # ------------------------------------------------------------------ #
+
+    def arm(self, seconds, config_file=None):
+        """Démarre le délai de confirmation ; à son expiration, un
+        processus détaché restaure l'instantané.
+
+        Un nouvel apply --confirm avant confirmation relance le délai
+        avec le même instantané (dernier état confirmé).
+        """
+        token = uuid.uuid4().hex
+        _write_json(PENDING_FILE, {
+            'token': token,
+            'deadline': time.time() + seconds,
+            'seconds': seconds,
+            'boot_id': _boot_id(),
+            'config_file': config_file,
+            'logging': self.logging_config,
+        })
+        subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), "wait", token],
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            start_new_session=True,
+        )
+        self.logger.info(
+            f"Apply en attente de confirmation ({seconds} s)", seconds=seconds
+        )
+        return token
+
+    def confirm(self):
+        """Confirme l'apply en attente ; retourne False s'il n'y en a pas"""
+        if read_pending() is None or not _remove(PENDING_FILE):
+            return False
+        self.clear()
+        self.logger.info("Apply confirmé, instantané supprimé")
+        return True
+
+    def _claim(self, token=None):
+        """Prend la main sur l'attente (contre une confirmation
+        simultanée) ; retourne False si elle a été confirmée entre-temps"""
+        try:
+            os.replace(PENDING_FILE, EXPIRED_FILE)
+        except FileNotFoundError:
+            return False
+        with open(EXPIRED_FILE) as f:
+            pending = json.load(f)
+        if token is not None and pending.get('token') != token:
+            # Réarmée entre la lecture et le renommage : l'autre timer décide
+            os.replace(EXPIRED_FILE, PENDING_FILE)
+            return False
+        return True
+
+    def rollback(self, reason):
+        """Restaure l'instantané et supprime l'attente"""
+        snapshot = self.load()
+        if snapshot is None:
+            self.logger.error("Retour arrière impossible: instantané introuvable")
+            self.clear()
+            return False
+        self.logger.warning(f"Retour à l'état précédent: {reason}", reason=reason)
+        success = self.restore(snapshot)
+        self.clear()
+        return success
+
+    def wait(self, token):
+        """Attend la confirmation ou l'expiration du délai (processus timer)"""
+        while True:
+            pending = read_pending()
+            if pending is None or pending.get('token') != token:
+                # Confirmé, ou délai relancé par un nouvel apply
+                return True
+            remaining = pending['deadline'] - time.time()
+            if remaining <= 0:
+                break
+            time.sleep(min(remaining, WAIT_INTERVAL))
+
+        if not self._claim(token):
+            return True
+        self.logger.warning(
+            f"Apply non confirmé après {pending['seconds']} s",
+            config_file=pending.get('config_file')
+        )
+        success = self.rollback("délai de confirmation expiré")
+        self.logger.warning(
+            f"La configuration sur disque ({pending.get('config_file')}) contient "
+            "toujours la modification : corrigez-la avant le prochain apply"
+        )
+        return success
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: yarp_rollback.py <command>")
+        print("Commands:")
+        print("  status     - Afficher l'apply en attente de confirmation")
+        print("  confirm    - Confirmer l'apply en attente")
+        print("  rollback   - Revenir immédiatement à l'état d'avant l'apply")
+        sys.exit(1)
+
+    command = sys.argv[1]
+    pending = read_pending()
+    manager = RollbackManager((pending or {}).get('logging'))
+
+    # Cas 1: yarp_rollback.py wait <token> (processus timer lancé par arm())
+    if command == "wait" and len(sys.argv) > 2:
+        sys.exit(0 if manager.wait(sys.argv[2]) else 1)
+
+    # Cas 2: commandes utilisateur
+    if command == "status":
+        if pending is None:
+            print("Aucun apply en attente de confirmation")
+        else:
+            remaining = max(0, int(pending['deadline'] - time.time()))
+            print(f"Apply en attente de confirmation : retour arrière dans {remaining} s")
+    elif command == "confirm":
+        if not manager.confirm():
+            print("Aucun apply en attente de confirmation")
+            sys.exit(1)
+        print("✓ Configuration confirmée")
+    elif command == "rollback":
+        if pending is None or not manager._claim():
+            print("Aucun apply en attente de confirmation")
+            sys.exit(1)
+        success = manager.rollback("demandé par l'utilisateur")
+        print("✓ État précédent restauré" if success else "[ERROR] Restauration incomplète, voir les logs")
+        sys.exit(0 if success else 1)
+    else:
+        print(f"Commande inconnue: {command}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,874 @@
+#!/usr/bin/env python3
+"""
+YARP Config Schema
+Schéma déclaratif de la configuration et diagnostics de validation
+"""
+
+import os
+import re
+import ipaddress
+
+import yaml
+
+from yarp_model import IFNAME_PATTERN, L3_PROTOCOLS, L4_PROTOCOLS, parse_fwmark
+
+# Loader YAML accéléré (libyaml) si disponible
+SafeLoader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+ERROR = 'error'
+WARNING = 'warning'
+
+# Types de routes supportés (ip route add <type> ...)
+ROUTE_TYPES = ('unicast', 'blackhole', 'unreachable', 'prohibit')
+
+# Formats des fichiers de routes externes (routing.static[].file)
+FEED_FORMATS = ('text', 'csv')
+
+# Logiciels supportés pour le forwarder DNS local (dns.forwarder)
+DNS_FORWARDER_BACKENDS = ('dnsmasq', 'unbound')
+
+FIREWALL_ACTIONS = ('accept', 'drop', 'reject', 'mark')
+FIREWALL_CHAINS = ('input', 'forward', 'output', 'prerouting')
+FIREWALL_POLICIES = ('accept', 'drop', 'reject')
+
+DOMAIN_PATTERN = r'^[a-zA-Z0-9]([a-zA-Z0-9\-]*[a-zA-Z0-9])?(\.[a-zA-Z0-9]([a-zA-Z0-9\-]*[a-zA-Z0-9])?)*$'
+TIMEZONE_PATTERN = r'^[a-zA-Z]+(/[a-zA-Z0-9_\-]+)+$'
+TABLE_NAME_PATTERN = r'^[a-zA-Z][a-zA-Z0-9_\-]*$'
+
+# Forme IPv4 usuelle (a.b.c.d[/n]) reconnue sans passer par ipaddress ;
+# les autres formes (IPv6, masque décimal...) sont analysées par ipaddress
+_OCTET = r'(?:25[0-5]|2[0-4][0-9]|1[0-9][0-9]|[1-9]?[0-9])'
+IPV4_ADDRESS = re.compile(rf'{_OCTET}\.{_OCTET}\.{_OCTET}\.{_OCTET}\Z')
+IPV4_NETWORK = re.compile(rf'{_OCTET}\.{_OCTET}\.{_OCTET}\.{_OCTET}(?:/(?:3[0-2]|[12]?[0-9]))?\Z')
+
+SYS_CLASS_NET = "/sys/class/net"
+
+
+def format_path(path):
+    """('firewall', 'rules', 3, 'chain') → firewall.rules[3].chain"""
+    text = ""
+    for part in path:
+        if isinstance(part, int):
+            text += f"[{part}]"
+        else:
+            text += f".{part}" if text else str(part)
+    return text
+
+
+class Diagnostic:
+    """Problème de validation localisé dans la configuration.
+
+    `code` identifie la nature du problème (required, type, enum, range,
+    format, address, conflict, unknown-ref...) ; `line` est renseignée
+    par locate() à partir du fichier YAML, et `file` lorsque la
+    configuration est répartie en plusieurs fragments.
+    """
+
+    __slots__ = ('path', 'code', 'message', 'severity', 'line', 'file')
+
+    def __init__(self, path, code, message, severity=ERROR):
+        self.path = path
+        self.code = code
+        self.message = message
+        self.severity = severity
+        self.line = None
+        self.file = None
+
+    @property
+    def location(self):
+        return format_path(self.path)
+
+    def __str__(self):
+        text = f"{self.location}: {self.message}" if self.path else self.message
+        if self.line:
+            text = f"ligne {self.line}: {text}"
+        if self.file:
+            text = f"{self.file}, {text}"
+        return text
+
+    def to_dict(self):
+        return {
+            'path': self.location,
+            'code': self.code,
+            'message': self.message,
+            'severity': self.severity,
+            'line': self.line,
+            'file': self.file,
+        }
+
+
+class Context:
+    """État partagé d'une validation : diagnostics et index croisés"""
+
+    __slots__ = ('config', 'diagnostics', 'interfaces', 'nexthop_objects', 'routes', '_present')
+
+    def __init__(self, config):
+        self.config = config
+        self.diagnostics = []
+        interfaces = config.get('interfaces') if isinstance(config, dict) else None
+        # dict pour un test d'appartenance rapide, dans l'ordre du fichier
+        self.interfaces = dict.fromkeys(interfaces) if isinstance(interfaces, dict) else {}
+        routing = config.get('routing') if isinstance(config, dict) else None
+        self.nexthop_objects = isinstance(routing, dict) and routing.get('nexthop_objects') is True
+        # (liste de routes, destination, métrique) → chemin de la première route
+        self.routes = {}
+        self._present = {}
+
+    def error(self, path, code, message):
+        self.diagnostics.append(Diagnostic(path, code, message))
+
+    def warning(self, path, code, message):
+        self.diagnostics.append(Diagnostic(path, code, message, WARNING))
+
+    def interface_exists(self, name):
+        """Interface déclarée dans la configuration ou présente sur le système"""
+        if name in self.interfaces:
+            return True
+        present = self._present.get(name)
+        if present is None:
+            present = self._present[name] = os.path.exists(os.path.join(SYS_CLASS_NET, name))
+        return present
+
+
+# ---------------------------------------------------------------------- #
+#  Éléments du schéma                                                      #
+# ---------------------------------------------------------------------- #
+#
+# Chaque élément est compilé une fois en une fonction check(value, path,
+# key, ctx) qui ajoute ses diagnostics au contexte et retourne True si la
+# valeur est valide. La valeur se trouve à path + (key,) : le chemin
+# complet n'est construit que pour les conteneurs et les erreurs.
+
+def _at(path, key):
+    return path if key is None else path + (key,)
+
+
+class Spec:
+    def compile(self):
+        raise NotImplementedError
+
+
+class Anything(Spec):
+    """Valeur libre (contrôlée par une vérification de l'enregistrement)"""
+
+    def compile(self):
+        def check(value, path, key, ctx):
+            return True
+        return check
+
+
+class Bool(Spec):
+    def compile(self):
+        def check(value, path, key, ctx):
+            if isinstance(value, bool):
+                return True
+            ctx.error(_at(path, key), 'type', "doit être true/false")
+            return False
+        return check
+
+
+class Int(Spec):
+    def __init__(self, minimum=None, maximum=None):
+        self.minimum = minimum
+        self.maximum = maximum
+
+    def compile(self):
+        minimum, maximum = self.minimum, self.maximum
+        if maximum is None:
+            bounds = f"minimum {minimum}"
+        else:
+            bounds = f"{minimum}-{maximum}"
+
+        def check(value, path, key, ctx):
+            if not isinstance(value, int) or isinstance(value, bool):
+                ctx.error(_at(path, key), 'type', f"entier attendu, reçu: {value}")
+                return False
+            if (minimum is not None and value < minimum) or (maximum is not None and value > maximum):
+                ctx.error(_at(path, key), 'range', f"hors limites: {value} ({bounds})")
+                return False
+            return True
+        return check
+
+
+class Number(Spec):
+    """Nombre dans ]minimum, maximum]"""
+
+    def __init__(self, minimum, maximum, unit=""):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.unit = unit
+
+    def compile(self):
+        minimum, maximum, unit = self.minimum, self.maximum, self.unit
+
+        def check(value, path, key, ctx):
+            if not isinstance(value, (int, float)) or isinstance(value, bool):
+                ctx.error(_at(path, key), 'type', f"nombre attendu, reçu: {value}")
+                return False
+            if not minimum < value <= maximum:
+                ctx.error(_at(path, key), 'range', f"hors limites: {value} ({unit}{minimum}-{maximum})")
+                return False
+            return True
+        return check
+
+
+class Str(Spec):
+    def __init__(self, pattern=None, hint=""):
+        self.pattern = pattern
+        self.hint = hint
+
+    def compile(self):
+        match = re.compile(self.pattern).match if self.pattern else None
+        hint = f" ({self.hint})" if self.hint else ""
+
+        def check(value, path, key, ctx):
+            if not isinstance(value, str) or not value:
+                ctx.error(_at(path, key), 'type', "doit être une chaîne non vide")
+                return False
+            if match and not match(value):
+                ctx.error(_at(path, key), 'format', f"invalide: {value}{hint}")
+                return False
+            return True
+        return check
+
+
+class Enum(Spec):
+    def __init__(self, values, ignore_case=False):
+        self.values = values
+        self.ignore_case = ignore_case
+
+    def compile(self):
+        allowed = frozenset(self.values)
+        ignore_case = self.ignore_case
+        message = f"(valeurs acceptées: {', '.join(self.values)})"
+
+        def check(value, path, key, ctx):
+            if isinstance(value, str) and (value.lower() if ignore_case else value) in allowed:
+                return True
+            ctx.error(_at(path, key), 'enum', f"valeur invalide: '{value}' {message}")
+            return False
+        return check
+
+
+class Address(Spec):
+    def compile(self):
+        fast = IPV4_ADDRESS.match
+        parse = ipaddress.ip_address
+
+        def check(value, path, key, ctx):
+            if isinstance(value, str) and fast(value):
+                return True
+            try:
+                parse(str(value))
+                return True
+            except ValueError:
+                ctx.error(_at(path, key), 'address', f"adresse IP invalide: {value}")
+                return False
+        return check
+
+
+class Network(Spec):
+    """Réseau (CIDR ou adresse seule), ou l'un des mots-clés acceptés"""
+
+    def __init__(self, keywords=(), ignore_case=False, hint=""):
+        self.keywords = keywords
+        self.ignore_case = ignore_case
+        self.hint = hint
+
+    def compile(self):
+        keywords = frozenset(self.keywords)
+        ignore_case = self.ignore_case
+        hint = f" ({self.hint})" if self.hint else ""
+        fast = IPV4_NETWORK.match
+        parse = ipaddress.ip_network
+
+        def check(value, path, key, ctx):
+            if not isinstance(value, str):
+                ctx.error(_at(path, key), 'type', "doit être une chaîne")
+                return False
+            if fast(value):
+                return True
+            if keywords and (value.lower() if ignore_case else value) in keywords:
+                return True
+            try:
+                parse(value, strict=False)
+                return True
+            except ValueError:
+                ctx.error(_at(path, key), 'address', f"réseau invalide: {value}{hint}")
+                return False
+        return check
+
+
+class ListOf(Spec):
+    def __init__(self, item, nonempty=False):
+        self.item = item
+        self.nonempty = nonempty
+
+    def compile(self):
+        item = self.item.compile()
+        nonempty = self.nonempty
+
+        def check(value, path, key, ctx):
+            path = _at(path, key)
+            if not isinstance(value, list):
+                ctx.error(path, 'type', "doit être une liste")
+                return False
+            if nonempty and not value:
+                ctx.error(path, 'required', "ne peut pas être vide")
+                return False
+            valid = True
+            for index, element in enumerate(value):
+                if not item(element, path, index, ctx):
+                    valid = False
+            return valid
+        return check
+
+
+class MapOf(Spec):
+    """Dictionnaire nom → valeur ; `key` valide les noms"""
+
+    def __init__(self, value, key=None):
+        self.value = value
+        self.key = key
+
+    def compile(self):
+        value_check = self.value.compile()
+        key_check = self.key.compile() if self.key else None
+
+        def check(value, path, key, ctx):
+            path = _at(path, key)
+            if not isinstance(value, dict):
+                ctx.error(path, 'type', "doit être un dictionnaire")
+                return False
+            valid = True
+            for name, element in value.items():
+                if key_check and not key_check(name, path, name, ctx):
+                    valid = False
+                if not value_check(element, path, name, ctx):
+                    valid = False
+            return valid
+        return check
+
+
+class Record(Spec):
+    """Dictionnaire à champs connus.
+
+    `checks` sont des fonctions check(value, path, ctx) appelées après la
+    validation des champs, pour les contraintes entre champs et les
+    références vers d'autres objets.
+    """
+
+    def __init__(self, fields, required=(), checks=()):
+        self.fields = fields
+        self.required = required
+        self.checks = checks
+
+    def compile(self):
+        fields = {name: spec.compile() for name, spec in self.fields.items()}
+        required = tuple(self.required)
+        checks = tuple(self.checks)
+
+        def check(value, path, key, ctx):
+            path = _at(path, key)
+            if not isinstance(value, dict):
+                ctx.error(path, 'type', "doit être un dictionnaire")
+                return False
+            valid = True
+            for name in required:
+                if name not in value:
+                    ctx.error(path + (name,), 'required', f"'{name}' est requis")
+                    valid = False
+            for name, element in value.items():
+                field = fields.get(name)
+                if field is not None and not field(element, path, name, ctx):
+                    valid = False
+            for extra in checks:
+                if extra(value, path, ctx) is False:
+                    valid = False
+            return valid
+        return check
+
+
+class Protocols(Spec):
+    """'any' ou dictionnaire protocole → ports (firewall.rules[].protocols)"""
+
+    def compile(self):
+        l3 = frozenset(L3_PROTOCOLS)
+        l4 = frozenset(L4_PROTOCOLS)
+        supported = ', '.join(L4_PROTOCOLS + L3_PROTOCOLS)
+
+        def port_ok(port):
+            if isinstance(port, bool):
+                return False
+            if isinstance(port, int):
+                return 1 <= port <= 65535
+            return isinstance(port, str) and port.isdigit() and 1 <= int(port) <= 65535
+
+        def port_errors(ports):
+            """Erreurs d'une valeur de ports : [(index dans la liste ou None, code, message)]"""
+            if type(ports) is int and 0 < ports < 65536:
+                return ()
+            if isinstance(ports, list):
+                return [
+                    (index, 'range', f"port invalide: {port} (1-65535)")
+                    for index, port in enumerate(ports) if not port_ok(port)
+                ]
+            if isinstance(ports, str) and ':' in ports:
+                bounds = ports.split(':')
+                if len(bounds) == 2 and all(port_ok(p) for p in bounds):
+                    return ()
+                return [(None, 'format', f"range de ports invalide: '{ports}' (ex: 8000:8100)")]
+            if isinstance(ports, (int, str)) and port_ok(ports):
+                return ()
+            return [(None, 'range', f"ports invalides: {ports} (entier, \"début:fin\" ou liste)")]
+
+        def check(value, path, key, ctx):
+            if isinstance(value, str):
+                if value.lower() == 'any':
+                    return True
+                ctx.error(_at(path, key), 'enum', f"en tant que chaîne doit être 'any', reçu: '{value}'")
+                return False
+            if not isinstance(value, dict):
+                ctx.error(_at(path, key), 'type', f"doit être 'any' ou un dict, reçu: {type(value).__name__}")
+                return False
+            valid = True
+            for proto, ports in value.items():
+                name = str(proto).lower()
+                if name in l4:
+                    for index, code, message in port_errors(ports):
+                        proto_path = _at(path, key) + (proto,)
+                        ctx.error(proto_path if index is None else proto_path + (index,), code, message)
+                        valid = False
+                elif name not in l3:
+                    ctx.error(
+                        _at(path, key) + (proto,), 'enum',
+                        f"protocole non supporté: '{proto}' (supportés: {supported})"
+                    )
+                    valid = False
+            return valid
+        return check
+
+
+# ---------------------------------------------------------------------- #
+#  Contraintes entre champs et références croisées                         #
+# ---------------------------------------------------------------------- #
+
+def _check_interface_ref(name, path, ctx):
+    """Une interface référencée doit être déclarée ou exister sur le système"""
+    if isinstance(name, str) and name and not ctx.interface_exists(name):
+        ctx.error(
+            path, 'unknown-ref',
+            f"interface inexistante: '{name}' (ni déclarée dans interfaces, ni présente sur le système)"
+        )
+        return False
+    return True
+
+
+def _check_masquerading(iface, path, ctx):
+    if iface.get('masquerading') is True and 'masquerade_sources' not in iface:
+        ctx.error(path + ('masquerade_sources',), 'required', "masquerading activé mais aucune source spécifiée")
+        return False
+    return True
+
+
+def _check_route(route, path, ctx):
+    """Contraintes d'une route (routing.static ou routing.tables.<nom>.routes)"""
+    valid = True
+    route_type = route.get('type', 'unicast')
+
+    # Route importée d'un fichier externe : une destination par ligne,
+    # les autres champs servent de valeurs par défaut
+    feed_format = None
+    if 'file' in route:
+        if 'to' in route:
+            ctx.error(path + ('file',), 'conflict', "'file' incompatible avec 'to'")
+            valid = False
+        if isinstance(route['file'], str) and not os.access(route['file'], os.R_OK):
+            ctx.error(path + ('file',), 'unknown-ref', f"fichier {route['file']} introuvable ou illisible")
+            valid = False
+        feed_format = route.get('format', 'text')
+    elif 'to' not in route:
+        ctx.error(path + ('to',), 'required', "destination 'to' manquante")
+        valid = False
+    elif 'format' in route:
+        ctx.error(path + ('format',), 'conflict', "'format' requiert 'file'")
+        valid = False
+    elif isinstance(route['to'], str) and isinstance(route.get('metric'), (int, str, type(None))):
+        # Même destination et métrique dans une même table : une seule
+        # route existe dans le noyau, la dernière l'emporte (une liste ou
+        # un dictionnaire est signalé par la vérification des champs)
+        key = (path[:-1], route['to'], route.get('metric'))
+        first = ctx.routes.setdefault(key, path)
+        if first is not path:
+            ctx.warning(path + ('to',), 'duplicate', f"route en double (déjà définie en {format_path(first)})")
+
+    if route_type != 'unicast':
+        if 'via' in route or 'interface' in route or 'nexthops' in route:
+            ctx.error(path, 'conflict', f"une route {route_type} n'a pas de next-hop")
+            valid = False
+        return valid
+
+    nexthops = route.get('nexthops')
+    if 'nexthops' in route:
+        if 'via' in route or 'interface' in route:
+            ctx.error(path + ('nexthops',), 'conflict', "'nexthops' incompatible avec 'via'/'interface'")
+            valid = False
+    elif 'via' not in route and 'interface' not in route and feed_format != 'csv':
+        ctx.error(path, 'required', "'via', 'interface' ou 'nexthops' requis")
+        valid = False
+
+    hops = [route]
+    if isinstance(nexthops, list):
+        hops = nexthops
+        for index, hop in enumerate(nexthops):
+            if isinstance(hop, dict) and 'via' not in hop and 'interface' not in hop:
+                ctx.error(path + ('nexthops', index), 'required', "'via' ou 'interface' requis")
+                valid = False
+
+    for index, hop in enumerate(hops):
+        if not isinstance(hop, dict):
+            continue
+        hop_path = path if hop is route else path + ('nexthops', index)
+        if 'interface' in hop:
+            valid = _check_interface_ref(hop['interface'], hop_path + ('interface',), ctx) and valid
+        # Les objets nexthop du noyau exigent une interface (pour un flux
+        # CSV, elle peut venir de chaque ligne)
+        elif ctx.nexthop_objects and feed_format != 'csv':
+            ctx.error(
+                hop_path, 'required',
+                "'interface' requise pour chaque next-hop avec routing.nexthop_objects"
+            )
+            valid = False
+    return valid
+
+
+def _check_routing_rule(rule, path, ctx):
+    valid = True
+    if not any(k in rule for k in ('from', 'to', 'fwmark', 'iif')):
+        ctx.error(path, 'required', "au moins un critère requis (from, to, fwmark, iif)")
+        valid = False
+
+    versions = set()
+    for field in ('from', 'to'):
+        if isinstance(rule.get(field), str):
+            try:
+                versions.add(ipaddress.ip_network(rule[field], strict=False).version)
+            except ValueError:
+                pass
+    if len(versions) > 1:
+        ctx.error(path + ('to',), 'conflict', "'from' et 'to' doivent être de la même famille")
+        valid = False
+
+    if 'fwmark' in rule and parse_fwmark(rule['fwmark']) is None:
+        ctx.error(
+            path + ('fwmark',), 'format',
+            f"fwmark invalide: '{rule['fwmark']}' (attendu: entier, ex: 2, 0x2 ou \"0x2/0xff\")"
+        )
+        valid = False
+
+    if 'iif' in rule:
+        valid = _check_interface_ref(rule['iif'], path + ('iif',), ctx) and valid
+    return valid
+
+
+def _check_routing(routing, path, ctx):
+    """Tables additionnelles (noms, identifiants) et références des règles"""
+    valid = True
+    table_ids = {'main': 254}
+
+    tables = routing.get('tables')
+    if isinstance(tables, dict):
+        for name, table in tables.items():
+            table_path = path + ('tables', name)
+            if name in ('main', 'local', 'default'):
+                ctx.error(table_path, 'format', "nom de table réservé")
+                valid = False
+            if not isinstance(table, dict):
+                continue
+            table_id = table.get('id')
+            if not isinstance(table_id, int) or isinstance(table_id, bool) or not 1 <= table_id <= 252:
+                continue
+            if table_id in table_ids.values():
+                ctx.error(table_path + ('id',), 'conflict', f"id {table_id} déjà utilisé")
+                valid = False
+            else:
+                table_ids[name] = table_id
+
+    rules = routing.get('rules')
+    if isinstance(rules, list):
+        for index, rule in enumerate(rules):
+            if not isinstance(rule, dict):
+                continue
+            table = rule.get('table')
+            table_path = path + ('rules', index, 'table')
+            if 'table' not in rule:
+                ctx.error(table_path, 'required', f"table requise (tables disponibles: {', '.join(table_ids)})")
+                valid = False
+            elif not isinstance(table, str):
+                # Une liste ou un dictionnaire ne peut servir de clé
+                ctx.error(table_path, 'type', f"nom de table attendu, reçu: {table}")
+                valid = False
+            elif table not in table_ids:
+                ctx.error(
+                    table_path, 'unknown-ref',
+                    f"table inconnue: '{table}' (tables disponibles: {', '.join(table_ids)})"
+                )
+                valid = False
+            # La position dans la liste ne donne pas de priorité stable :
+            # insérer une règle renumérotait toutes les suivantes
+            if len(rules) > 1 and 'priority' not in rule:
+                ctx.error(
+                    path + ('rules', index, 'priority'), 'required',
+                    "priority requise lorsque plusieurs règles sont définies"
+                )
+                valid = False
+    return valid
+
+
+FIREWALL_MATCH_FIELDS = frozenset(('source', 'destination', 'in_interface', 'out_interface'))
+
+
+def _check_firewall_rule(rule, path, ctx):
+    valid = True
+    chain = rule.get('chain')
+    chain = chain.lower() if isinstance(chain, str) else None
+    action = rule.get('action')
+
+    # Marquage (policy routing) : table mangle, avant la décision de routage
+    if isinstance(action, str) and action.lower() == 'mark':
+        if 'mark' not in rule:
+            ctx.error(path + ('mark',), 'required', "'mark' est requis avec action: mark")
+            valid = False
+        elif parse_fwmark(rule['mark']) is None:
+            ctx.error(
+                path + ('mark',), 'format',
+                f"mark invalide: '{rule['mark']}' (attendu: entier, ex: 2, 0x2 ou \"0x2/0xff\")"
+            )
+            valid = False
+        if chain != 'prerouting' and chain != 'output':
+            ctx.error(
+                path + ('chain',), 'conflict',
+                "action: mark requiert chain: prerouting ou output "
+                "(le marquage doit précéder la décision de routage)"
+            )
+            valid = False
+    elif chain == 'prerouting':
+        ctx.error(path + ('chain',), 'conflict', "chain: prerouting est réservée à action: mark")
+        valid = False
+
+    if FIREWALL_MATCH_FIELDS.isdisjoint(rule):
+        ctx.error(
+            path, 'required',
+            "au moins un critère de matching requis (source, destination, in_interface, out_interface)"
+        )
+        return False
+
+    # Cohérence interface / chaîne ; les règles firewall ne portent que
+    # sur les interfaces gérées par YARP
+    for field, excluded in (('in_interface', ('output',)), ('out_interface', ('input', 'prerouting'))):
+        if field not in rule:
+            continue
+        if chain in excluded:
+            ctx.error(
+                path + (field,), 'conflict',
+                f"incompatible avec chain: {chain} (le trafic {chain.upper()} n'a pas de {field})"
+            )
+            valid = False
+        name = rule[field]
+        if isinstance(name, str) and name not in ctx.interfaces:
+            ctx.error(
+                path + (field,), 'unknown-ref',
+                f"interface inconnue: '{name}' (interfaces disponibles: {', '.join(ctx.interfaces)})"
+            )
+            valid = False
+    return valid
+
+
+def _check_forwarder(forwarder, path, ctx):
+    valid = True
+    min_ttl, max_ttl = forwarder.get('min_ttl', 0), forwarder.get('max_ttl')
+    if isinstance(min_ttl, int) and isinstance(max_ttl, int) and max_ttl and min_ttl > max_ttl:
+        ctx.error(path + ('min_ttl',), 'range', f"supérieur à max_ttl ({min_ttl} > {max_ttl})")
+        valid = False
+    # dnsmasq plafonne min-cache-ttl à une heure
+    if forwarder.get('backend', 'dnsmasq') == 'dnsmasq' and isinstance(min_ttl, int) and min_ttl > 3600:
+        ctx.error(path + ('min_ttl',), 'range', "limité à 3600 avec dnsmasq")
+        valid = False
+
+    system = ctx.config.get('system')
+    if forwarder.get('enabled') is True and not (isinstance(system, dict) and system.get('dns_servers')):
+        ctx.error(path + ('enabled',), 'required', "le forwarder requiert system.dns_servers (serveurs amont)")
+        valid = False
+
+    interfaces = forwarder.get('interfaces')
+    if isinstance(interfaces, list):
+        for index, name in enumerate(interfaces):
+            valid = _check_interface_ref(name, path + ('interfaces', index), ctx) and valid
+    return valid
+
+
+# ---------------------------------------------------------------------- #
+#  Schéma                                                                  #
+# ---------------------------------------------------------------------- #
+
+IFNAME = Str(IFNAME_PATTERN.pattern, "nom d'interface Linux")
+
+ROUTE = Record(
+    {
+        'to': Network(),
+        'via': Address(),
+        'interface': IFNAME,
+        'metric': Int(0, 0xFFFFFFFF),
+        'type': Enum(ROUTE_TYPES),
+        'file': Str(),
+        'format': Enum(FEED_FORMATS),
+        'nexthops': ListOf(Record({
+            'via': Address(),
+            'interface': IFNAME,
+            'weight': Int(1, 256),
+        }), nonempty=True),
+    },
+    checks=(_check_route,),
+)
+
+ROUTING_RULE = Record(
+    {
+        'from': Network(),
+        'to': Network(),
+        'fwmark': Anything(),
+        'iif': Str(),
+        'priority': Int(1, 32765),
+        'table': Anything(),
+    },
+    checks=(_check_routing_rule,),
+)
+
+FIREWALL_RULE = Record(
+    {
+        'name': Anything(),
+        'action': Enum(FIREWALL_ACTIONS, ignore_case=True),
+        'chain': Enum(FIREWALL_CHAINS, ignore_case=True),
+        'source': Network(('any',), ignore_case=True, hint="attendu: IP, CIDR ou 'any'"),
+        'destination': Network(('any',), ignore_case=True, hint="attendu: IP, CIDR ou 'any'"),
+        'in_interface': Str(),
+        'out_interface': Str(),
+        'mark': Anything(),
+        'protocols': Protocols(),
+    },
+    required=('name', 'action', 'chain'),
+    checks=(_check_firewall_rule,),
+)
+
+CONFIG = Record({
+    'system': Record(
+        {
+            'hostname': Str(),
+            'domain': Str(DOMAIN_PATTERN, "format attendu: ex. lab.local, example.com"),
+            'timezone': Str(TIMEZONE_PATTERN, "format attendu: ex. Europe/Paris, America/New_York"),
+            'dns_servers': ListOf(Address(), nonempty=True),
+        },
+        required=('hostname',),
+    ),
+    'interfaces': MapOf(
+        Record(
+            {
+                'ipv4': Network(('dhcp',)),
+                'ipv6': Network(('auto',)),
+                'masquerading': Bool(),
+                'masquerade_sources': ListOf(Network()),
+            },
+            checks=(_check_masquerading,),
+        ),
+        key=IFNAME,
+    ),
+    'routing': Record(
+        {
+            'aggregate': Bool(),
+            'nexthop_objects': Bool(),
+            'static': ListOf(ROUTE),
+            'tables': MapOf(
+                Record({'id': Int(1, 252), 'routes': ListOf(ROUTE)}, required=('id',)),
+                key=Str(TABLE_NAME_PATTERN, "nom de table"),
+            ),
+            'rules': ListOf(ROUTING_RULE),
+        },
+        checks=(_check_routing,),
+    ),
+    'firewall': Record({
+        'default': Record({
+            chain: Enum(FIREWALL_POLICIES, ignore_case=True)
+            for chain in ('input', 'forward', 'output')
+        }),
+        'stateful': Bool(),
+        'rules': ListOf(FIREWALL_RULE),
+    }),
+    'dns': Record({
+        'forwarder': Record(
+            {
+                'enabled': Bool(),
+                'prefetch': Bool(),
+                'backend': Enum(DNS_FORWARDER_BACKENDS),
+                'interfaces': ListOf(Str()),
+                'cache_size': Int(0),
+                'min_ttl': Int(0),
+                'max_ttl': Int(0),
+            },
+            checks=(_check_forwarder,),
+        ),
+        'probe': Record({
+            'port': Int(1, 65535),
+            'queries': Int(1, 20),
+            'timeout': Number(0, 10, "secondes, "),
+        }),
+    }),
+})
+
+# Compilé une seule fois, à l'import
+_check_config = CONFIG.compile()
+
+
+def validate(config):
+    """Valide une configuration ; retourne la liste des diagnostics"""
+    ctx = Context(config)
+    _check_config(config, (), None, ctx)
+    return ctx.diagnostics
+
+
+def has_errors(diagnostics):
+    return any(d.severity == ERROR for d in diagnostics)
+
+
+def locate(diagnostics, source, paths=None):
+    """Renseigne le numéro de ligne des diagnostics à partir du YAML source.
+
+    Le document n'est composé (sans construction des objets Python) que
+    lorsqu'il y a des diagnostics à localiser. Un chemin absent du
+    fichier (champ requis manquant) pointe vers son parent. `paths`
+    donne, pour chaque diagnostic, son chemin dans ce fichier s'il
+    diffère du chemin dans la configuration fusionnée (fragments).
+    """
+    if not diagnostics:
+        return
+    try:
+        root = yaml.compose(source, Loader=SafeLoader)
+    except yaml.YAMLError:
+        return
+    if root is None:
+        return
+
+    for index, diagnostic in enumerate(diagnostics):
+        node, line = root, root.start_mark.line + 1
+        for part in (paths[index] if paths else diagnostic.path):
+            child = None
+            if isinstance(node, yaml.MappingNode):
+                for key, value in node.value:
+                    if key.value == str(part):
+                        child, line = value, key.start_mark.line + 1
+                        break
+            elif isinstance(node, yaml.SequenceNode) and isinstance(part, int) and part < len(node.value):
+                child = node.value[part]
+                line = child.start_mark.line + 1
+            if child is None:
+                break
+            node = child
+        diagnostic.line = line
@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+"""
+YARP Stats
+Collecte des compteurs de trafic des interfaces (octets, paquets,
+erreurs, pertes) dans un tampon circulaire de taille fixe par interface,
+débits publiés dans /var/run/yarp/stats.json et affichés par yarp stats
+"""
+
+import json
+import os
+import signal
+import sys
+import time
+from array import array
+
+STATS_DIR = "/var/run/yarp"
+STATS_FILE = os.path.join(STATS_DIR, "stats.json")
+# Compteurs de toutes les interfaces en une lecture (les mêmes que
+# /sys/class/net/*/statistics, qui demanderait un fichier par compteur)
+PROC_NET_DEV = "/proc/net/dev"
+
+DEFAULT_INTERVAL = 5
+# 120 échantillons à 5 s : 10 minutes d'historique par interface
+DEFAULT_SAMPLES = 120
+# Durée de la mesure ponctuelle de yarp stats quand le collecteur est arrêté
+ONE_SHOT_DELAY = 1
+
+# Compteurs relevés et leurs colonnes dans /proc/net/dev (8 colonnes de
+# réception puis 8 d'émission)
+COUNTERS = ('rx_bytes', 'rx_packets', 'rx_errors', 'rx_dropped',
+            'tx_bytes', 'tx_packets', 'tx_errors', 'tx_dropped')
+COLUMNS = (0, 1, 2, 3, 8, 9, 10, 11)
+# Débits dérivés (par seconde) : octets convertis en bits
+RATES = ('rx_bps', 'rx_pps', 'rx_errors', 'rx_dropped',
+         'tx_bps', 'tx_pps', 'tx_errors', 'tx_dropped')
+RATE_SCALE = (8, 1, 1, 1, 8, 1, 1, 1)
+
+IGNORED_INTERFACES = ('lo',)
+
+
+def read_counters(path=PROC_NET_DEV):
+    """Compteurs de chaque interface : {nom: (rx_bytes, ..., tx_dropped)}"""
+    counters = {}
+    with open(path) as f:
+        # Deux lignes d'en-tête
+        for line in f.readlines()[2:]:
+            name, _, values = line.partition(':')
+            name = name.strip()
+            if name in IGNORED_INTERFACES:
+                continue
+            fields = values.split()
+            counters[name] = tuple(int(fields[column]) for column in COLUMNS)
+    return counters
+
+
+class CounterRing:
+    """Derniers échantillons d'une interface.
+
+    Les compteurs sont rangés à plat dans un array('Q') préalloué
+    (échantillon i : cases i*8 à i*8+7) et les instants dans un
+    array('d') : la mémoire ne dépend que du nombre d'échantillons.
+    """
+
+    __slots__ = ('size', 'times', 'values', 'head', 'count')
+
+    def __init__(self, size):
+        self.size = size
+        self.times = array('d', [0.0]) * size
+        self.values = array('Q', [0]) * (size * len(COUNTERS))
+        self.head = 0
+        self.count = 0
+
+    def append(self, timestamp, counters):
+        offset = self.head * len(COUNTERS)
+        for index, value in enumerate(counters):
+            self.values[offset + index] = value
+        self.times[self.head] = timestamp
+        self.head = (self.head + 1) % self.size
+        self.count = min(self.count + 1, self.size)
+
+    def _slot(self, age):
+        """Position de l'échantillon d'âge `age` (0 : le plus récent)"""
+        return (self.head - 1 - age) % self.size
+
+    def counters(self, age=0):
+        offset = self._slot(age) * len(COUNTERS)
+        return self.values[offset:offset + len(COUNTERS)]
+
+    def rates(self, newer, older):
+        """Débits par seconde entre deux échantillons (par âge).
+
+        Un compteur qui diminue (interface recréée, remise à zéro) ne
+        compte pas pour l'intervalle.
+        """
+        elapsed = self.times[self._slot(newer)] - self.times[self._slot(older)]
+        if elapsed <= 0:
+            return None
+        new, old = self.counters(newer), self.counters(older)
+        return tuple(
+            (n - o) * scale / elapsed if n >= o else 0.0
+            for n, o, scale in zip(new, old, RATE_SCALE)
+        )
+
+    def summary(self):
+        """Compteurs actuels, débits du dernier intervalle, moyens et de
+        pointe sur la fenêtre"""
+        summary = {'counters': dict(zip(COUNTERS, self.counters()))}
+        if self.count < 2:
+            return summary
+        peak = [0.0] * len(RATES)
+        for age in range(self.count - 1):
+            rates = self.rates(age, age + 1)
+            if rates is None:
+                continue
+            if age == 0:
+                summary['last'] = _rates_dict(rates)
+            peak = [max(value, rate) for value, rate in zip(peak, rates)]
+        average = self.rates(0, self.count - 1)
+        if average is not None:
+            summary['average'] = _rates_dict(average)
+        summary['peak'] = _rates_dict(peak)
+        summary['window_s'] = round(self.times[self._slot(0)] - self.times[self._slot(self.count - 1)], 1)
+        return summary
+
+
+def _rates_dict(rates):
+    return {name: round(value, 1) for name, value in zip(RATES, rates)}
+
+
+class StatsCollector:
+    """Échantillonne les compteurs à intervalle fixe.
+
+    Une interface apparue reçoit son tampon au premier échantillon ; une
+    interface disparue perd le sien.
+    """
+
+    def __init__(self, interval=DEFAULT_INTERVAL, samples=DEFAULT_SAMPLES, source=PROC_NET_DEV):
+        self.interval = interval
+        self.samples = samples
+        self.source = source
+        self.rings = {}
+
+    def sample(self):
+        timestamp = time.monotonic()
+        counters = read_counters(self.source)
+        for name, values in counters.items():
+            ring = self.rings.get(name)
+            if ring is None:
+                ring = self.rings[name] = CounterRing(self.samples)
+            ring.append(timestamp, values)
+        for name in [name for name in self.rings if name not in counters]:
+            del self.rings[name]
+
+    def summary(self):
+        return {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'updated': time.time(),
+            'interval': self.interval,
+            'samples': self.samples,
+            'interfaces': {name: ring.summary() for name, ring in sorted(self.rings.items())},
+        }
+
+    def write(self, path=STATS_FILE):
+        """Publication atomique du résumé (lecteurs : yarp stats, supervision)"""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.summary(), f, separators=(',', ':'))
+        os.replace(tmp_path, path)
+
+    def run(self, path=STATS_FILE):
+        """Boucle de collecte ; les échéances sont fixes (pas de dérive
+        quand un échantillon prend du retard)"""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        deadline = time.monotonic()
+        while True:
+            self.sample()
+            self.write(path)
+            deadline += self.interval
+            delay = deadline - time.monotonic()
+            if delay < 0:
+                # Machine suspendue ou surchargée : repartir de maintenant
+                deadline, delay = time.monotonic(), 0
+            time.sleep(delay)
+
+
+def read_stats(path=STATS_FILE):
+    """Résumé publié par le collecteur, None s'il est absent ou périmé"""
+    try:
+        with open(path) as f:
+            stats = json.load(f)
+    except (OSError, ValueError):
+        return None
+    # Trois intervalles sans mise à jour : collecteur arrêté
+    if time.time() - stats.get('updated', 0) > 3 * stats.get('interval', DEFAULT_INTERVAL):
+        return None
+    return stats
+
+
+def measure(delay=ONE_SHOT_DELAY):
+    """Mesure ponctuelle : deux échantillons à `delay` secondes d'écart"""
+    collector = StatsCollector(interval=delay, samples=2)
+    collector.sample()
+    time.sleep(delay)
+    collector.sample()
+    return collector.summary()
+
+
+def _format_bps(value):
+    for unit, scale in (("Gbit/s", 1e9), ("Mbit/s", 1e6), ("kbit/s", 1e3)):
+        if value >= scale:
+            return f"{value / scale:.1f} {unit}"
+    return f"{value:.0f} bit/s"
+
+
+def _format_pps(value):
+    return f"{value / 1000:.1f}k" if value >= 10000 else f"{value:.0f}"
+
+
+def print_stats(stats):
+    """Débits du dernier intervalle, puis moyenne et pointe sur la fenêtre"""
+    print(f"{'interface':<12} {'réception':>13} {'émission':>13} {'rx pps':>8} {'tx pps':>8} "
+          f"{'erreurs/s':>9} {'pertes/s':>9}")
+    for name, iface in stats['interfaces'].items():
+        last = iface.get('last')
+        if last is None:
+            print(f"{name:<12} {'-':>13}")
+            continue
+        print(f"{name:<12} {_format_bps(last['rx_bps']):>13} {_format_bps(last['tx_bps']):>13} "
+              f"{_format_pps(last['rx_pps']):>8} {_format_pps(last['tx_pps']):>8} "
+              f"{last['rx_errors'] + last['tx_errors']:>9.1f} {last['rx_dropped'] + last['tx_dropped']:>9.1f}")
+
+    windows = [iface for iface in stats['interfaces'].values() if 'peak' in iface and iface['window_s'] > stats['interval']]
+    if not windows:
+        return
+    window = max(iface['window_s'] for iface in windows)
+    period = f"{window / 60:.0f} dernières minutes" if window >= 120 else f"{window:.0f} dernières secondes"
+    print(f"\nSur les {period} :")
+    print(f"{'interface':<12} {'rx moyen':>13} {'rx pointe':>13} {'tx moyen':>13} {'tx pointe':>13}")
+    for name, iface in stats['interfaces'].items():
+        if 'average' not in iface:
+            continue
+        average, peak = iface['average'], iface['peak']
+        print(f"{name:<12} {_format_bps(average['rx_bps']):>13} {_format_bps(peak['rx_bps']):>13} "
+              f"{_format_bps(average['tx_bps']):>13} {_format_bps(peak['tx_bps']):>13}")
+
+
+def _int_option(args, name, default):
+    if name not in args:
+        return default
+    index = args.index(name)
+    value = args[index + 1] if index + 1 < len(args) else ""
+    if not value.isdigit() or int(value) < 1:
+        print(f"{name}: entier positif attendu", file=sys.stderr)
+        sys.exit(1)
+    return int(value)
+
+
+def main():
+    # Gestion des arguments : yarp_stats.py [show|collect] [options]
+    args = sys.argv[1:]
+    command = args[0] if args and not args[0].startswith("--") else "show"
+
+    # Cas 1: collecteur (service yarp-stats)
+    if command == "collect":
+        collector = StatsCollector(
+            interval=_int_option(args, "--interval", DEFAULT_INTERVAL),
+            samples=max(2, _int_option(args, "--samples", DEFAULT_SAMPLES)),
+        )
+        signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+        print(f"Collecte des compteurs toutes les {collector.interval} s "
+              f"({collector.samples} échantillons par interface)")
+        try:
+            collector.run()
+        except KeyboardInterrupt:
+            pass
+    # Cas 2: yarp stats [--json]
+    elif command == "show":
+        stats = read_stats()
+        if stats is None:
+            print(f"Collecteur arrêté (rc-service yarp-stats start) : mesure sur {ONE_SHOT_DELAY} s",
+                  file=sys.stderr)
+            stats = measure()
+        if "--json" in args:
+            print(json.dumps(stats, indent=2, ensure_ascii=False))
+        else:
+            print_stats(stats)
+    else:
+        print(f"Commande inconnue: {command}")
+        print("Usage: yarp_stats.py [show [--json] | collect [--interval s] [--samples n]]")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
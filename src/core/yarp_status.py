@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+"""
+YARP Status
+État du routeur (liens, adresses, routes, NAT, firewall) relevé en une
+passe et mis en cache quelques secondes : yarp status, --json et MOTD
+"""
+
+import json
+import os
+import shlex
+import socket
+import sys
+import time
+
+YARP_DIR = "/opt/yarp"
+sys.path.insert(0, os.path.join(YARP_DIR, 'core'))
+
+from yarp_exec import executor
+
+STATUS_DIR = "/var/run/yarp"
+STATUS_FILE = os.path.join(STATUS_DIR, "status.json")
+# Âge maximal (s) d'un état en cache : MOTD et supervision peuvent
+# appeler yarp status à chaque connexion ou interrogation
+CACHE_TTL = 5
+LAST_APPLY_FILE = "/var/lib/yarp/metrics/last-apply.json"
+
+# Tables et types de routes du noyau, omis de l'état
+HIDDEN_TABLES = ('local',)
+HIDDEN_ROUTE_TYPES = ('local', 'broadcast', 'anycast', 'multicast')
+
+# Préfixes des commentaires posés par les modules nat et firewall
+NAT_COMMENT = "YARP-NAT"
+FIREWALL_COMMENT = "YARP-FW"
+
+
+def _parse_json_stream(text):
+    """Documents JSON successifs d'un ip -j -batch"""
+    decoder = json.JSONDecoder()
+    documents, index = [], 0
+    while True:
+        while index < len(text) and text[index].isspace():
+            index += 1
+        if index >= len(text):
+            return documents
+        try:
+            document, index = decoder.raw_decode(text, index)
+        except ValueError:
+            return documents
+        documents.append(document)
+
+
+def _option(args, *names):
+    """Valeur d'une option d'une règle iptables-save (-s, --comment...)"""
+    for index, arg in enumerate(args[:-1]):
+        if arg in names:
+            return args[index + 1]
+    return None
+
+
+class StatusCollector:
+    """Relevé de l'état courant : un ip -batch (liens, adresses, routes
+    des deux familles) et un iptables-save -c (NAT et firewall avec
+    compteurs). Aucune commande par interface ni par chaîne."""
+
+    def _run(self, cmd, input=None):
+        return executor.run(cmd, input=input)
+
+    def _links_and_routes(self):
+        # Sans -4/-6, route show liste les deux familles
+        _, stdout, _ = self._run(["ip", "-j", "-force", "-batch", "-"],
+                                 input="addr show\nroute show table all\n")
+        documents = _parse_json_stream(stdout) if stdout else []
+        links = documents[0] if len(documents) > 0 else []
+        routes = documents[1] if len(documents) > 1 else []
+        routes4, routes6 = [], []
+        for entry in routes:
+            # Les routes IPv6 ont un champ pref ; sinon la famille se lit
+            # dans les adresses
+            ipv6 = 'pref' in entry or ':' in entry.get('dst', '') or ':' in entry.get('gateway', '')
+            (routes6 if ipv6 else routes4).append(entry)
+        return links, routes4, routes6
+
+    def _interfaces(self, links):
+        interfaces = []
+        for link in links:
+            name = link.get('ifname')
+            if not name or name == 'lo':
+                continue
+            addresses = {'ipv4': [], 'ipv6': []}
+            for info in link.get('addr_info') or ():
+                if not info.get('local'):
+                    continue
+                family = 'ipv4' if info.get('family') == 'inet' else 'ipv6'
+                if family == 'ipv6' and info.get('scope') == 'link':
+                    continue
+                addresses[family].append(f"{info['local']}/{info.get('prefixlen')}")
+            interfaces.append({
+                'name': name,
+                'state': link.get('operstate', 'UNKNOWN'),
+                'up': 'UP' in (link.get('flags') or ()),
+                'mtu': link.get('mtu'),
+                'mac': link.get('address'),
+                **addresses,
+            })
+        return interfaces
+
+    def _routes(self, entries):
+        routes = []
+        for entry in entries:
+            if entry.get('table') in HIDDEN_TABLES or entry.get('type') in HIDDEN_ROUTE_TYPES:
+                continue
+            route = {'dst': entry.get('dst', 'default')}
+            for key in ('type', 'gateway', 'dev', 'protocol', 'metric', 'table'):
+                if entry.get(key) is not None:
+                    route[key] = entry[key]
+            if entry.get('nexthops'):
+                route['nexthops'] = [
+                    {key: hop[key] for key in ('gateway', 'dev', 'weight') if key in hop}
+                    for hop in entry['nexthops']
+                ]
+            routes.append(route)
+        return routes
+
+    def _ruleset(self):
+        """NAT et firewall depuis un seul iptables-save -c (None : iptables
+        indisponible ou droits insuffisants)"""
+        success, stdout, _ = self._run(["iptables-save", "-c"])
+        if not success:
+            return None, None
+
+        policies, nat_rules, firewall_rules = {}, [], []
+        table = None
+        for line in stdout.splitlines():
+            if line.startswith('*'):
+                table = line[1:]
+            elif line.startswith(':') and table == 'filter':
+                chain, policy = line[1:].split()[:2]
+                if policy != '-':
+                    policies[chain] = policy
+            elif line.startswith('['):
+                counters, _, rule = line.partition(' ')
+                args = shlex.split(rule)
+                comment = _option(args, '--comment') or ""
+                if not comment.startswith("YARP-") or len(args) < 2:
+                    continue
+                packets, octets = (int(value) for value in counters.strip('[]').split(':'))
+                entry = {
+                    'table': table,
+                    'chain': args[1],
+                    'name': comment,
+                    'target': _option(args, '-j'),
+                    'packets': packets,
+                    'bytes': octets,
+                }
+                if comment.startswith(NAT_COMMENT):
+                    entry['source'] = _option(args, '-s')
+                    entry['interface'] = _option(args, '-o')
+                    nat_rules.append(entry)
+                elif comment.startswith(FIREWALL_COMMENT):
+                    firewall_rules.append(entry)
+
+        return nat_rules, {'policies': policies, 'rules': firewall_rules}
+
+    def _ip_forward(self):
+        try:
+            with open("/proc/sys/net/ipv4/ip_forward") as f:
+                return f.read().strip() == "1"
+        except OSError:
+            return None
+
+    def _last_apply(self):
+        try:
+            with open(LAST_APPLY_FILE) as f:
+                summary = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return {key: summary.get(key) for key in ('timestamp', 'success', 'version', 'duration_ms')}
+
+    def collect(self):
+        """État courant (dictionnaire sérialisable en JSON)"""
+        links, routes, routes6 = self._links_and_routes()
+        nat_rules, firewall = self._ruleset()
+        return {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'collected': time.time(),
+            'hostname': socket.gethostname(),
+            'interfaces': self._interfaces(links),
+            'routes': {'ipv4': self._routes(routes), 'ipv6': self._routes(routes6)},
+            'nat': {'ip_forward': self._ip_forward(), 'masquerade': nat_rules},
+            'firewall': firewall,
+            'last_apply': self._last_apply(),
+        }
+
+
+def read_cache(max_age):
+    """État en cache s'il a moins de `max_age` secondes, sinon None"""
+    try:
+        with open(STATUS_FILE) as f:
+            status = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if time.time() - status.get('collected', 0) > max_age:
+        return None
+    return status
+
+
+def write_cache(status):
+    """Enregistre l'état (ignoré sans droits d'écriture, ex: MOTD d'un
+    utilisateur)"""
+    tmp_path = f"{STATUS_FILE}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(STATUS_DIR, exist_ok=True)
+        with open(tmp_path, 'w') as f:
+            json.dump(status, f, ensure_ascii=False)
+        os.replace(tmp_path, STATUS_FILE)
+    except OSError:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+
+
+def invalidate_cache():
+    """Écarte l'état en cache (après un apply ou une restauration)"""
+    try:
+        os.remove(STATUS_FILE)
+    except OSError:
+        pass
+
+
+def get_status(max_age=CACHE_TTL):
+    """État en cache ou relevé à nouveau (max_age 0 : toujours relevé)"""
+    status = read_cache(max_age) if max_age > 0 else None
+    if status is None:
+        status = StatusCollector().collect()
+        write_cache(status)
+    return status
+
+
+def _format_route(route):
+    parts = [route['dst']] if route.get('type', 'unicast') == 'unicast' else [route['type'], route['dst']]
+    for key, label in (('gateway', 'via'), ('dev', 'dev'), ('protocol', 'proto'), ('metric', 'metric'), ('table', 'table')):
+        if key in route:
+            parts += [label, str(route[key])]
+    for hop in route.get('nexthops', ()):
+        parts += ["nexthop"] + [f"{label} {hop[key]}" for key, label in
+                                (('gateway', 'via'), ('dev', 'dev'), ('weight', 'weight')) if key in hop]
+    return " ".join(parts)
+
+
+def print_status(status):
+    """Affichage lisible du même état que --json"""
+    print("=== État des Interfaces ===")
+    for iface in status['interfaces']:
+        addresses = " ".join(iface['ipv4'] + iface['ipv6']) or "-"
+        print(f"{iface['name']:<16} {iface['state']:<8} {addresses}")
+
+    for family, title in (('ipv4', "Routes IPv4"), ('ipv6', "Routes IPv6")):
+        print(f"\n=== {title} ===")
+        for route in status['routes'][family]:
+            print(_format_route(route))
+
+    nat = status['nat']
+    print("\n=== NAT ===")
+    forwarding = {True: "ACTIVÉ", False: "DÉSACTIVÉ"}.get(nat['ip_forward'], "inconnu")
+    print(f"Forwarding IPv4: {forwarding}")
+    if nat['masquerade'] is None:
+        print("Règles MASQUERADE: indisponibles (iptables-save)")
+    elif not nat['masquerade']:
+        print("Aucune règle YARP-NAT")
+    for rule in nat['masquerade'] or ():
+        print(f"  {rule['source'] or 'any'} -> {rule['interface']}  ({rule['packets']} paquets, {rule['bytes']} octets)")
+
+    firewall = status['firewall']
+    print("\n=== Firewall ===")
+    if firewall is None:
+        print("État indisponible (iptables-save)")
+    else:
+        print("Politiques: " + ", ".join(f"{chain} {policy}" for chain, policy in firewall['policies'].items()))
+        chains = {}
+        for rule in firewall['rules']:
+            chains[rule['chain']] = chains.get(rule['chain'], 0) + 1
+        detail = ", ".join(f"{count} {chain}" for chain, count in chains.items())
+        print(f"Règles YARP: {len(firewall['rules'])}" + (f" ({detail})" if detail else ""))
+
+    last_apply = status.get('last_apply')
+    if last_apply:
+        result = "succès" if last_apply.get('success') else "échec"
+        print(f"\nDernier apply: {last_apply.get('timestamp')} ({result})")
+
+
+def print_motd(status):
+    """Résumé des interfaces affiché à la connexion"""
+    for iface in status['interfaces']:
+        ipv4 = iface['ipv4'][0] if iface['ipv4'] else "none"
+        ipv6 = iface['ipv6'][0] if iface['ipv6'] else "none"
+        print(f" {iface['name']:<8} | IPv4: {ipv4:<18} | IPv6: {ipv6:<22}")
+
+
+def main():
+    # Gestion des arguments : yarp_status.py [show|motd] [--json] [--max-age N]
+    args = sys.argv[1:]
+    max_age = CACHE_TTL
+    if "--max-age" in args:
+        index = args.index("--max-age")
+        value = args[index + 1] if index + 1 < len(args) else ""
+        if not value.isdigit():
+            print("Usage: yarp status [--json] [--max-age <secondes>]", file=sys.stderr)
+            sys.exit(1)
+        max_age = int(value)
+        del args[index:index + 2]
+    command = args[0] if args and not args[0].startswith("--") else "show"
+
+    status = get_status(max_age)
+
+    # Cas 1: résumé pour le MOTD
+    if command == "motd":
+        print_motd(status)
+    # Cas 2: yarp status [--json]
+    elif command == "show":
+        if "--json" in args:
+            print(json.dumps(status, indent=2, ensure_ascii=False))
+        else:
+            print_status(status)
+    else:
+        print(f"Commande inconnue: {command}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+YARP Trace
+Spans imbriqués d'un apply (apply → phase → objet → commande) et export
+au format Chrome trace-event (yarp apply --trace fichier.json)
+"""
+
+import json
+import os
+import threading
+import time
+
+
+class Span:
+    """Intervalle mesuré sur l'horloge monotone (perf_counter_ns)"""
+
+    __slots__ = ('tracer', 'name', 'category', 'args', 'start')
+
+    def __init__(self, tracer, name, category, args):
+        self.tracer = tracer
+        self.name = name
+        self.category = category
+        self.args = args
+        self.start = None
+
+    def set(self, **args):
+        """Ajoute des attributs au span (affichés par le visualiseur)"""
+        self.args.update(args)
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.perf_counter_ns()
+        if exc_type is not None:
+            self.args['exception'] = exc_type.__name__
+        self.tracer._record(self, end)
+        return False
+
+
+class _NullSpan:
+    """Span d'un traceur inactif : aucune mesure, aucune allocation"""
+
+    __slots__ = ()
+
+    def set(self, **args):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Tracer:
+    """Collecte des spans du processus.
+
+    Inactif par défaut : span() retourne alors un span vide partagé, et
+    le coût se limite à un test d'attribut. Les spans de chaque thread
+    (apply, écriture des logs) forment une piste distincte.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.events = []
+        self.origin = 0
+        self.threads = {}
+
+    def enable(self):
+        self.enabled = True
+        self.events = []
+        self.origin = time.perf_counter_ns()
+
+    def disable(self):
+        self.enabled = False
+
+    def span(self, name, category="yarp", **args):
+        if not self.enabled:
+            return _NULL_SPAN
+        return Span(self, name, category, args)
+
+    def _record(self, span, end):
+        thread = threading.current_thread()
+        self.threads.setdefault(thread.ident, thread.name)
+        self.events.append((span.name, span.category, span.start, end, thread.ident, span.args))
+
+    def to_chrome(self):
+        """Événements au format Chrome trace-event (spans complets "X",
+        temps en microsecondes depuis l'activation)"""
+        pid = os.getpid()
+        events = [
+            {'name': 'process_name', 'ph': 'M', 'pid': pid, 'tid': 0, 'args': {'name': 'yarp'}},
+        ]
+        for tid, name in self.threads.items():
+            events.append({'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid, 'args': {'name': name}})
+        for name, category, start, end, tid, args in self.events:
+            event = {
+                'name': name,
+                'cat': category,
+                'ph': 'X',
+                'ts': (start - self.origin) / 1000,
+                'dur': (end - start) / 1000,
+                'pid': pid,
+                'tid': tid,
+            }
+            if args:
+                event['args'] = args
+            events.append(event)
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def export(self, path):
+        """Écrit la trace (chrome://tracing, ui.perfetto.dev)"""
+        with open(path, 'w') as f:
+            json.dump(self.to_chrome(), f, ensure_ascii=False, default=str)
+
+
+# Traceur du processus
+tracer = Tracer()
+
@@ -41,16 +41,20 @@ echo "
 "
 
 
-for IFACE in $(ls /sys/class/net | grep -v lo); do
-    IPV4=$(get_ip $IFACE)
-    IPV6=$(get_ipv6 $IFACE)
-
-
-    printf " %-8s | IPv4: %-18s | IPv6: %-22s\n" \
-        "$IFACE" \
-        "${IPV4:-none}" \
-        "${IPV6:-none}"
-done
+# État en cache de yarp status (un relevé toutes les 5 s au plus) ;
+# à défaut, une lecture par interface
+if ! python3 /opt/yarp/core/yarp_status.py motd 2>/dev/null; then
+    for IFACE in $(ls /sys/class/net | grep -v lo); do
+        IPV4=$(get_ip $IFACE)
+        IPV6=$(get_ipv6 $IFACE)
+
+
+        printf " %-8s | IPv4: %-18s | IPv6: %-22s\n" \
+            "$IFACE" \
+            "${IPV4:-none}" \
+            "${IPV6:-none}"
+    done
+fi
 
 
 echo "
@@ -1,14 +1,17 @@
 #!/usr/bin/env python3
 """
 YARP DNS Module
-Gestion de la résolution DNS (/etc/resolv.conf)
+Gestion de la résolution DNS (/etc/resolv.conf) et du forwarder DNS local
 """
 
-import subprocess
 import sys
 import os
+import json
+import random
+import signal
+import struct
+import asyncio
 import time
-import ipaddress
 import shutil
 
 YARP_DIR = "/opt/yarp"
@@ -16,30 +19,525 @@ sys.path.insert(0, os.path.join(YARP_DIR, 'core'))
 
 from yarp_config import YARPConfig
 from yarp_logger import get_logger
+from yarp_plan import is_read_only
+from yarp_trace import tracer
+from yarp_exec import executor, command_line
 
 RESOLV_CONF = "/etc/resolv.conf"
 RESOLV_BACKUP = "/etc/resolv.conf.yarp-backup"
 
+# Forwarder DNS local (dns.forwarder) : configuration générée par YARP et
+# fichier PID du processus supervisé
+FORWARDER_CONF = {
+    'dnsmasq': "/etc/yarp/dnsmasq.conf",
+    'unbound': "/etc/yarp/unbound.conf",
+}
+RUN_DIR = "/var/run/yarp"
+FORWARDER_ADDRESS = "127.0.0.1"
+FORWARDER_DEFAULTS = {
+    'enabled': False,
+    'backend': 'dnsmasq',
+    'interfaces': [],
+    'cache_size': 10000,
+    'min_ttl': 0,
+    'max_ttl': 86400,
+    'prefetch': False,
+}
+
+# unbound dimensionne son cache en octets : taille moyenne retenue pour
+# convertir cache_size (nombre d'entrées, sémantique dnsmasq)
+UNBOUND_BYTES_PER_ENTRY = 1024
+
+# Délai d'attente du démarrage / de l'arrêt du forwarder
+FORWARDER_TIMEOUT = 5
+
+# Mesure des serveurs amont (dns.py probe) : état persistant (scores et
+# ordre retenu) et paramètres par défaut de dns.probe
+PROBE_STATE = "/var/lib/yarp/dns-probe.json"
+PROBE_DEFAULTS = {
+    'port': 53,
+    'queries': 3,
+    'timeout': 1.0,
+}
+# Poids d'une nouvelle mesure dans le score glissant (EWMA)
+PROBE_EWMA_ALPHA = 0.3
+# Gain minimal (relatif) pour changer l'ordre des serveurs : évite de
+# réécrire resolv.conf pour du bruit
+PROBE_REORDER_GAIN = 0.10
+
+
+def build_probe_query(qid):
+    """Construit une requête DNS (NS de la racine, récursion demandée)"""
+    header = struct.pack('!HHHHHH', qid, 0x0100, 1, 0, 0, 0)
+    # QNAME "." (label vide), QTYPE NS (2), QCLASS IN (1)
+    return header + b'\x00' + struct.pack('!HH', 2, 1)
+
+
+class _ProbeProtocol(asyncio.DatagramProtocol):
+    """Associe les réponses UDP reçues aux requêtes en attente (par ID)"""
+
+    def __init__(self):
+        self.pending = {}
+
+    def datagram_received(self, data, addr):
+        if len(data) < 12:
+            return
+        qid, flags = struct.unpack('!HH', data[:4])
+        future = self.pending.pop(qid, None)
+        if future is not None and not future.done() and flags & 0x8000:
+            future.set_result(flags & 0x000F)
+
+    def error_received(self, exc):
+        # ICMP port unreachable : toutes les requêtes en cours sont perdues
+        for future in self.pending.values():
+            if not future.done():
+                future.set_exception(exc)
+        self.pending.clear()
+
 
 class DNSManager:
     def __init__(self, config):
         self.config = config
         self.system = config.get_system()
 
+        self.interfaces = config.get_model().interfaces
+        self.forwarder = dict(FORWARDER_DEFAULTS, **config.get_dns_forwarder())
+        self.probe_config = dict(PROBE_DEFAULTS, **config.get_dns_probe())
+
         # Initialiser le logger
         logging_config = config.get_logging()
         self.logger = get_logger("dns", {'logging': logging_config})
 
+        # yarp plan : écritures, commandes et signaux enregistrés (voir yarp_plan)
+        self.plan = None
+
+    def _run_command(self, cmd):
+        """Exécute une commande système avec logging (voir yarp_exec)"""
+        if self.plan is not None and not is_read_only(command_line(cmd)):
+            return self.plan.command(command_line(cmd))
+        return executor.run(cmd, logger=self.logger)
+
     def _backup_resolv_conf(self):
         """Sauvegarde /etc/resolv.conf si pas déjà fait"""
         if not os.path.exists(RESOLV_BACKUP) and os.path.exists(RESOLV_CONF):
+            if self.plan is not None:
+                self.plan.write(RESOLV_BACKUP)
+                return
             shutil.copy2(RESOLV_CONF, RESOLV_BACKUP)
             self.logger.info(f"Backup de {RESOLV_CONF} vers {RESOLV_BACKUP}")
 
+    # ------------------------------------------------------------------ #
+    #  Forwarder DNS local (dnsmasq / unbound)                             #
+    # ------------------------------------------------------------------ #
+
+    def _forwarder_pidfile(self, backend):
+        return os.path.join(RUN_DIR, f"{backend}.pid")
+
+    def _render_dnsmasq(self):
+        """Génère la configuration dnsmasq du forwarder"""
+        fwd = self.forwarder
+        lines = [
+            "# Généré par YARP - ne pas modifier manuellement",
+            "no-resolv",
+            "no-poll",
+        ]
+        for server in self._configured_servers():
+            lines.append(f"server={server}")
+
+        # lo pour les requêtes du routeur lui-même (127.0.0.1)
+        for iface in ['lo'] + [i for i in fwd['interfaces'] if i != 'lo']:
+            lines.append(f"interface={iface}")
+        lines.append("bind-dynamic")
+
+        lines.append(f"cache-size={fwd['cache_size']}")
+        if fwd['min_ttl']:
+            lines.append(f"min-cache-ttl={fwd['min_ttl']}")
+        if fwd['max_ttl']:
+            lines.append(f"max-cache-ttl={fwd['max_ttl']}")
+        if fwd['prefetch']:
+            self.logger.warning("dns.forwarder.prefetch non supporté par dnsmasq, ignoré")
+
+        lines.append(f"pid-file={self._forwarder_pidfile('dnsmasq')}")
+        return "\n".join(lines) + "\n"
+
+    def _lan_addresses(self):
+        """Retourne les couples (adresse, réseau) des interfaces servies.
+
+        unbound écoute sur des adresses : seules les adresses statiques de
+        la configuration YARP peuvent être utilisées.
+        """
+        addresses = []
+        for iface in self.forwarder['interfaces']:
+            interface = self.interfaces.get(iface)
+            static = [a for a in (interface.ipv4, interface.ipv6) if a] if interface else []
+            for address in static:
+                addresses.append((str(address.ip), address.network.with_prefixlen))
+            if not static:
+                self.logger.warning(
+                    f"Interface {iface} sans adresse statique, non servie par unbound"
+                )
+        return addresses
+
+    def _render_unbound(self):
+        """Génère la configuration unbound du forwarder"""
+        fwd = self.forwarder
+        lines = [
+            "# Généré par YARP - ne pas modifier manuellement",
+            "server:",
+            f"    interface: {FORWARDER_ADDRESS}",
+            "    access-control: 127.0.0.0/8 allow",
+        ]
+        for address, network in self._lan_addresses():
+            lines.append(f"    interface: {address}")
+            lines.append(f"    access-control: {network} allow")
+
+        rrset_cache = max(fwd['cache_size'] * UNBOUND_BYTES_PER_ENTRY, 1024 * 1024)
+        lines.append(f"    rrset-cache-size: {rrset_cache}")
+        lines.append(f"    msg-cache-size: {rrset_cache // 2}")
+        lines.append(f"    cache-min-ttl: {fwd['min_ttl']}")
+        if fwd['max_ttl']:
+            lines.append(f"    cache-max-ttl: {fwd['max_ttl']}")
+        lines.append(f"    prefetch: {'yes' if fwd['prefetch'] else 'no'}")
+
+        # Configuration hors de /etc/unbound : pas de chroot. Autoriser un
+        # amont local (résolveur de test ou cache sur 127.0.0.x)
+        lines.append('    chroot: ""')
+        lines.append(f'    pidfile: "{self._forwarder_pidfile("unbound")}"')
+        lines.append("    do-not-query-localhost: no")
+
+        lines.append("forward-zone:")
+        lines.append('    name: "."')
+        for server in self._configured_servers():
+            lines.append(f"    forward-addr: {server}")
+        return "\n".join(lines) + "\n"
+
+    def _write_if_changed(self, path, content):
+        """Écrit un fichier s'il diffère du contenu voulu.
+
+        L'écriture est atomique (fichier temporaire dans le même
+        répertoire puis os.replace) : un lecteur ne voit jamais un
+        fichier partiel. Retourne (succès, modifié).
+        """
+        try:
+            with open(path, 'r') as f:
+                if f.read() == content:
+                    return True, False
+        except IOError:
+            pass
+
+        if self.plan is not None:
+            self.plan.write(path)
+            return True, True
+
+        tmp_path = f"{path}.yarp-tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp_path, 'w') as f:
+                f.write(content)
+                f.flush()
+                os.fsync(f.fileno())
+            if os.path.exists(path):
+                shutil.copymode(path, tmp_path)
+            os.replace(tmp_path, path)
+            return True, True
+        except (IOError, OSError) as e:
+            self.logger.error(f"Impossible d'écrire {path}: {e}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return False, False
+
+    def _process_running(self, pid, name):
+        """Indique si le processus pid existe, s'appelle name et n'est pas zombie"""
+        try:
+            # /proc/<pid>/stat : "pid (comm) état ..."
+            with open(f"/proc/{pid}/stat", 'r') as f:
+                comm, _, rest = f.read().partition('(')[2].rpartition(')')
+        except IOError:
+            return False
+        return comm == name and rest.split()[0] != 'Z'
+
+    def _forwarder_pid(self, backend):
+        """Retourne le PID du forwarder s'il tourne, sinon None"""
+        try:
+            with open(self._forwarder_pidfile(backend), 'r') as f:
+                pid = int(f.read().strip())
+        except (IOError, ValueError):
+            return None
+        return pid if self._process_running(pid, backend) else None
+
+    def _start_forwarder(self, backend):
+        """Vérifie la configuration puis lance le forwarder (démon)"""
+        if not shutil.which(backend):
+            self.logger.error(f"{backend} introuvable (apk add {backend})")
+            return False
+
+        conf = FORWARDER_CONF[backend]
+        if backend == 'dnsmasq':
+            check_cmd, start_cmd = f"dnsmasq --test -C {conf}", f"dnsmasq -C {conf}"
+        else:
+            check_cmd, start_cmd = f"unbound-checkconf {conf}", f"unbound -c {conf}"
+
+        if self.plan is not None:
+            # La configuration n'a pas été écrite : rien à vérifier
+            self.plan.command(check_cmd)
+            self.plan.command(start_cmd)
+            return True
+
+        success, _, stderr = self._run_command(check_cmd)
+        if not success:
+            self.logger.error(f"Configuration {backend} invalide: {stderr.strip()}")
+            return False
+
+        os.makedirs(RUN_DIR, exist_ok=True)
+        success, _, stderr = self._run_command(start_cmd)
+        if not success:
+            self.logger.error(f"Démarrage de {backend} impossible: {stderr.strip()}")
+            return False
+
+        deadline = time.monotonic() + FORWARDER_TIMEOUT
+        while time.monotonic() < deadline:
+            if self._forwarder_pid(backend):
+                self.logger.info(f"Forwarder DNS {backend} démarré")
+                return True
+            time.sleep(0.1)
+        self.logger.error(f"{backend} ne s'est pas lancé (pas de {self._forwarder_pidfile(backend)})")
+        return False
+
+    def _stop_forwarder(self, backend):
+        """Arrête le forwarder s'il tourne"""
+        pid = self._forwarder_pid(backend)
+        if pid is None:
+            return
+        if self.plan is not None:
+            self.plan.process(f"arrêt de {backend} (SIGTERM {pid})")
+            return
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+
+        deadline = time.monotonic() + FORWARDER_TIMEOUT
+        while time.monotonic() < deadline and self._process_running(pid, backend):
+            time.sleep(0.1)
+        try:
+            os.remove(self._forwarder_pidfile(backend))
+        except OSError:
+            pass
+        self.logger.info(f"Forwarder DNS {backend} arrêté")
+
+    def apply_forwarder(self):
+        """Génère la configuration du forwarder et le (re)démarre si besoin.
+
+        Le forwarder n'est redémarré que si sa configuration a changé ou
+        s'il ne tourne plus. S'il est désactivé, un forwarder lancé
+        précédemment par YARP est arrêté.
+        """
+        backend = self.forwarder['backend']
+        for other in FORWARDER_CONF:
+            if other != backend or not self.forwarder['enabled']:
+                self._stop_forwarder(other)
+
+        if not self.forwarder['enabled']:
+            return True
+
+        content = self._render_dnsmasq() if backend == 'dnsmasq' else self._render_unbound()
+        success, changed = self._write_if_changed(FORWARDER_CONF[backend], content)
+        if not success:
+            return False
+
+        running = self._forwarder_pid(backend) is not None
+        if running and not changed:
+            self.logger.info(f"Forwarder DNS {backend} inchangé")
+            return True
+        if running:
+            self.logger.info(f"Configuration {backend} modifiée, redémarrage")
+            self._stop_forwarder(backend)
+        return self._start_forwarder(backend)
+
+    def supervise(self):
+        """Relance le forwarder s'il s'est arrêté (à appeler périodiquement)"""
+        if not self.forwarder['enabled']:
+            return True
+
+        backend = self.forwarder['backend']
+        if self._forwarder_pid(backend) is not None:
+            return True
+
+        self.logger.warning(f"Forwarder DNS {backend} arrêté, redémarrage")
+        return self._start_forwarder(backend)
+
+    # ------------------------------------------------------------------ #
+    #  Mesure et classement des serveurs amont                             #
+    # ------------------------------------------------------------------ #
+
+    def _load_probe_state(self):
+        """Charge l'état des mesures (scores par serveur, ordre retenu)"""
+        try:
+            with open(PROBE_STATE, 'r') as f:
+                state = json.load(f)
+            if isinstance(state, dict):
+                state.setdefault('servers', {})
+                state.setdefault('order', [])
+                return state
+        except (IOError, ValueError):
+            pass
+        return {'servers': {}, 'order': []}
+
+    def _configured_servers(self):
+        """Retourne system.dns_servers dans l'ordre du YAML.
+
+        Le forwarder local reçoit cet ordre : dnsmasq et unbound
+        choisissent eux-mêmes leur serveur amont (réponse la plus rapide,
+        RTT), l'ordre de `probe` n'y changerait rien et le réécrire
+        redémarrerait le forwarder, vidant son cache.
+        """
+        return [str(server) for server in self.system.get('dns_servers', [])]
+
+    def _upstream_servers(self, state=None):
+        """Retourne system.dns_servers dans l'ordre retenu par `probe`.
+
+        Les serveurs jamais classés suivent, dans l'ordre du YAML.
+        """
+        configured = self._configured_servers()
+        if state is None:
+            state = self._load_probe_state()
+        ranked = [server for server in state['order'] if server in configured]
+        return ranked + [server for server in configured if server not in ranked]
+
+    async def _probe_server(self, server):
+        """Envoie `queries` requêtes successives à un serveur.
+
+        Retourne (serveur, latences en ms des réponses, requêtes perdues).
+        Une réponse SERVFAIL/REFUSED compte comme une perte.
+        """
+        loop = asyncio.get_running_loop()
+        timeout = self.probe_config['timeout']
+        latencies = []
+        lost = 0
+        try:
+            transport, protocol = await loop.create_datagram_endpoint(
+                _ProbeProtocol, remote_addr=(server, self.probe_config['port'])
+            )
+        except OSError as e:
+            self.logger.warning(f"Sonde DNS {server}: {e}")
+            return server, latencies, self.probe_config['queries']
+
+        try:
+            for _ in range(self.probe_config['queries']):
+                qid = random.getrandbits(16)
+                future = loop.create_future()
+                protocol.pending[qid] = future
+                start = time.monotonic()
+                transport.sendto(build_probe_query(qid))
+                try:
+                    rcode = await asyncio.wait_for(future, timeout)
+                except (asyncio.TimeoutError, OSError):
+                    protocol.pending.pop(qid, None)
+                    lost += 1
+                    continue
+                # NOERROR ou NXDOMAIN : le serveur répond normalement
+                if rcode in (0, 3):
+                    latencies.append((time.monotonic() - start) * 1000)
+                else:
+                    lost += 1
+        finally:
+            transport.close()
+        return server, latencies, lost
+
+    async def _probe_all(self, servers):
+        """Mesure tous les serveurs en parallèle"""
+        return await asyncio.gather(*(self._probe_server(server) for server in servers))
+
+    def _order_cost(self, order, scores):
+        """Coût d'un ordre : scores pondérés par position (1, 1/2, 1/4...)"""
+        return sum(scores[server] / (2 ** position) for position, server in enumerate(order))
+
+    def probe(self):
+        """Mesure latence et pertes des serveurs amont et ajuste leur ordre.
+
+        Chaque requête perdue compte pour `timeout` dans la latence
+        moyenne de la mesure ; le score est une moyenne glissante (EWMA)
+        de ces mesures. L'ordre n'est changé que s'il réduit le coût de
+        plus de PROBE_REORDER_GAIN ; resolv.conf n'est alors réécrit que
+        si son contenu change. Avec le forwarder local, resolv.conf pointe
+        sur 127.0.0.1 et la configuration du forwarder ne dépend pas de
+        l'ordre : rien n'est réécrit ni redémarré.
+        """
+        servers = [str(server) for server in self.system.get('dns_servers', [])]
+        if not servers:
+            self.logger.info("Aucun serveur DNS configuré, rien à mesurer")
+            return True
+
+        state = self._load_probe_state()
+        timeout_ms = self.probe_config['timeout'] * 1000
+        queries = self.probe_config['queries']
+
+        results = asyncio.run(self._probe_all(servers))
+
+        scores = {}
+        now = int(time.time())
+        for server, latencies, lost in results:
+            sample = (sum(latencies) + lost * timeout_ms) / queries
+            previous = state['servers'].get(server, {}).get('score')
+            score = sample if previous is None else (
+                PROBE_EWMA_ALPHA * sample + (1 - PROBE_EWMA_ALPHA) * previous
+            )
+            scores[server] = score
+            state['servers'][server] = {
+                'score': round(score, 2),
+                'latency_ms': round(sum(latencies) / len(latencies), 2) if latencies else None,
+                'loss': round(lost / queries, 2),
+                'updated': now,
+            }
+            self.logger.info(
+                f"Sonde DNS {server}: {len(latencies)}/{queries} réponses, score {score:.1f} ms",
+                server=server, answered=len(latencies), score=round(score, 2)
+            )
+
+        # Oublier les serveurs retirés de la configuration
+        state['servers'] = {s: v for s, v in state['servers'].items() if s in servers}
+
+        current = self._upstream_servers(state)
+        best = sorted(servers, key=lambda server: scores[server])
+        reordered = best != current and (
+            self._order_cost(best, scores) < self._order_cost(current, scores) * (1 - PROBE_REORDER_GAIN)
+        )
+        state['order'] = best if reordered else current
+
+        success, _ = self._write_if_changed(PROBE_STATE, json.dumps(state, indent=2) + "\n")
+
+        if reordered:
+            self.logger.info(f"Nouvel ordre des serveurs DNS: {', '.join(best)}")
+            if not self.forwarder['enabled']:
+                success = self.apply() and success
+
+        print(f"{'Serveur':<40} {'Latence':>10} {'Perte':>6} {'Score':>10}")
+        for server in state['order']:
+            entry = state['servers'][server]
+            latency = f"{entry['latency_ms']:.1f} ms" if entry['latency_ms'] is not None else "-"
+            print(f"{server:<40} {latency:>10} {entry['loss'] * 100:>5.0f}% {entry['score']:>7.1f} ms")
+        return success
+
+    # ------------------------------------------------------------------ #
+    #  /etc/resolv.conf                                                    #
+    # ------------------------------------------------------------------ #
+
     def apply(self):
-        """Génère et écrit /etc/resolv.conf depuis la configuration YARP"""
+        """Génère et écrit /etc/resolv.conf depuis la configuration YARP.
+
+        Avec un forwarder local actif, resolv.conf pointe sur 127.0.0.1 ;
+        si le forwarder ne démarre pas, les serveurs amont sont utilisés
+        directement.
+        """
         domain = self.system.get('domain', '')
-        dns_servers = self.system.get('dns_servers', [])
+        dns_servers = self._upstream_servers()
+
+        with tracer.span("forwarder", "dns"):
+            forwarder_ok = self.apply_forwarder()
+        if self.forwarder['enabled'] and forwarder_ok:
+            dns_servers = [FORWARDER_ADDRESS]
 
         # Rien à faire si ni domain ni dns_servers ne sont définis
         if not domain and not dns_servers:
@@ -66,14 +564,14 @@ class DNSManager:
         # Écriture du fichier
         content = "\n".join(lines) + "\n"
 
-        try:
-            with open(RESOLV_CONF, 'w') as f:
-                f.write(content)
-            self.logger.info(f"{RESOLV_CONF} écrit avec succès")
-            return True
-        except IOError as e:
-            self.logger.error(f"Impossible d'écrire {RESOLV_CONF}: {e}")
+        success, changed = self._write_if_changed(RESOLV_CONF, content)
+        if not success:
             return False
+        if changed:
+            self.logger.info(f"{RESOLV_CONF} écrit avec succès")
+        else:
+            self.logger.info(f"{RESOLV_CONF} inchangé")
+        return forwarder_ok
 
     def show(self):
         """Affiche la configuration DNS actuelle"""
@@ -87,8 +585,17 @@ class DNSManager:
             print(f"Domain: {domain}")
         if dns_servers:
             print("Serveurs DNS:")
-            for server in dns_servers:
-                print(f"  - {server}")
+            state = self._load_probe_state()
+            for server in self._upstream_servers(state):
+                score = state['servers'].get(server, {}).get('score')
+                print(f"  - {server}" + (f" (score {score:.1f} ms)" if score is not None else ""))
+
+        if self.forwarder['enabled']:
+            backend = self.forwarder['backend']
+            pid = self._forwarder_pid(backend)
+            state = f"actif (PID {pid})" if pid else "arrêté"
+            print(f"Forwarder local: {backend} {state}, "
+                  f"interfaces: {', '.join(self.forwarder['interfaces']) or 'lo'}")
 
         # Depuis le système
         print(f"\n=== {RESOLV_CONF} actuel ===")
@@ -102,10 +609,10 @@ class DNSManager:
 def main():
     # Gestion des arguments
     if len(sys.argv) < 2:
-        print("Usage: dns.py <config_file|apply|show>")
+        print("Usage: dns.py <config_file|apply|show|supervise|probe>")
         sys.exit(1)
 
-    if sys.argv[1] in ("apply", "show"):
+    if sys.argv[1] in ("apply", "show", "supervise", "probe"):
         config_file = "/etc/yarp/config.yaml"
         mode = sys.argv[1]
     else:
@@ -125,6 +632,10 @@ def main():
             sys.exit(1)
     elif mode == "show":
         manager.show()
+    elif mode == "supervise":
+        sys.exit(0 if manager.supervise() else 1)
+    elif mode == "probe":
+        sys.exit(0 if manager.probe() else 1)
     else:
         print(f"Mode inconnu: {mode}")
         sys.exit(1)
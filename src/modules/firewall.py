@@ -4,17 +4,24 @@ YARP Firewall Module
 Gestion des règles de filtrage iptables
 """
 
-import subprocess
 import sys
 import os
 import time
-import ipaddress
 
 YARP_DIR = "/opt/yarp"
 sys.path.insert(0, os.path.join(YARP_DIR, 'core'))
 
 from yarp_config import YARPConfig
+from yarp_model import L3_PROTOCOLS, L4_PROTOCOLS
 from yarp_logger import get_logger
+from yarp_plan import is_read_only
+from yarp_trace import tracer
+from yarp_exec import executor, command_line
+
+# Chaînes YARP de la table mangle (règles action: mark), appelées depuis
+# PREROUTING et OUTPUT : seules elles sont vidées à chaque apply, les
+# autres règles mangle (TCPMSS, DSCP, marques d'autres outils) restent
+MARK_CHAINS = {'PREROUTING': 'YARP-MARK-PREROUTING', 'OUTPUT': 'YARP-MARK-OUTPUT'}
 
 
 class FirewallManager:
@@ -27,78 +34,36 @@ class FirewallManager:
         logging_config = config.get_logging()
         self.logger = get_logger("firewall", {'logging': logging_config})
 
-    def _run_command(self, cmd, check=True):
-        """Exécute une commande système avec logging"""
-        start_time = time.time()
-        try:
-            result = subprocess.run(
-                cmd,
-                shell=True,
-                capture_output=True,
-                text=True,
-                check=check
-            )
-            duration_ms = int((time.time() - start_time) * 1000)
+        # yarp_plan.Plan en mode plan (commandes iptables enregistrées, non exécutées)
+        self.plan = None
 
-            # Logger l'exécution commande
-            self.logger.command_execution(cmd, result.returncode, duration_ms)
-
-            return result.returncode == 0, result.stdout, result.stderr
-        except subprocess.CalledProcessError as e:
-            duration_ms = int((time.time() - start_time) * 1000)
-            self.logger.command_execution(cmd, e.returncode, duration_ms)
-            return False, e.stdout, e.stderr
+    def _run_command(self, cmd, check=True):
+        """Exécute une commande système avec logging (voir yarp_exec)"""
+        if self.plan is not None and not is_read_only(command_line(cmd)):
+            return self.plan.command(command_line(cmd))
+        return executor.run(cmd, logger=self.logger)
 
     def _run_command_silent(self, cmd):
         """Exécute une commande silencieuse (pour nettoyage, sans logging d'erreur)"""
-        try:
-            result = subprocess.run(
-                cmd,
-                shell=True,
-                capture_output=True,
-                text=True,
-                check=False
-            )
-            return result.returncode == 0, result.stdout, result.stderr
-        except Exception:
-            return False, "", ""
+        if self.plan is not None and not is_read_only(command_line(cmd)):
+            return self.plan.command(command_line(cmd))
+        return executor.run(cmd)
 
     # ------------------------------------------------------------------ #
     #  Résolution des ports                                                #
     # ------------------------------------------------------------------ #
 
-    def _normalize_ports(self, value):
-        """Normalise une valeur de ports en liste de chaînes iptables.
-
-        Entrées acceptées :
-          - int ou str  : port unique           → ["80"]
-          - list         : liste de ports        → ["80", "443"]
-          - str range    : "8000:8100"           → ["8000:8100"]
-        Retourne une liste de chaînes utilisables avec --dport / --match multiport.
-        """
-        if isinstance(value, int):
-            return [str(value)]
-
-        if isinstance(value, str):
-            # Range "8000:8100" ou port unique en str
-            return [value]
-
-        if isinstance(value, list):
-            return [str(p) for p in value]
-
-        return []
-
     def _build_port_args(self, ports):
-        """Construit le fragment iptables pour les ports.
+        """Construit les arguments iptables pour les ports.
 
         - 1 port   → --dport 80
         - N ports  → -m multiport --dports 80,443
         - range    → --dport 8000:8100
         """
         if len(ports) == 1:
-            return f"--dport {ports[0]}"
+            return ["--dport", str(ports[0])]
         else:
-            return f"-m multiport --dports {','.join(ports)}"
+            return ["-m", "multiport", "--dports", ",".join(ports)]
 
     # ------------------------------------------------------------------ #
     #  Politiques par défaut                                               #
@@ -133,7 +98,7 @@ class FirewallManager:
                 iptables_policy = 'DROP'
 
             success, _, stderr = self._run_command(
-                f"iptables -P {chain} {iptables_policy}", check=False
+                ["iptables", "-P", chain, iptables_policy], check=False
             )
             if success:
                 self.logger.info(f"Policy {chain} → {iptables_policy}")
@@ -157,13 +122,13 @@ class FirewallManager:
 
         stateful_cmds = [
             # Accepter les connexions déjà établies / liées sur INPUT et FORWARD
-            ("iptables -A INPUT -m state --state ESTABLISHED,RELATED "
-             "-m comment --comment 'YARP-FW-STATEFUL-INPUT' -j ACCEPT"),
-            ("iptables -A FORWARD -m state --state ESTABLISHED,RELATED "
-             "-m comment --comment 'YARP-FW-STATEFUL-FORWARD' -j ACCEPT"),
+            ["iptables", "-A", "INPUT", "-m", "state", "--state", "ESTABLISHED,RELATED",
+             "-m", "comment", "--comment", "YARP-FW-STATEFUL-INPUT", "-j", "ACCEPT"],
+            ["iptables", "-A", "FORWARD", "-m", "state", "--state", "ESTABLISHED,RELATED",
+             "-m", "comment", "--comment", "YARP-FW-STATEFUL-FORWARD", "-j", "ACCEPT"],
             # Accepter le loopback
-            ("iptables -A INPUT -i lo "
-             "-m comment --comment 'YARP-FW-LOOPBACK' -j ACCEPT"),
+            ["iptables", "-A", "INPUT", "-i", "lo",
+             "-m", "comment", "--comment", "YARP-FW-LOOPBACK", "-j", "ACCEPT"],
         ]
 
         for cmd in stateful_cmds:
@@ -190,15 +155,38 @@ class FirewallManager:
 
         for chain in ['INPUT', 'FORWARD', 'OUTPUT']:
             success, _, stderr = self._run_command(
-                f"iptables -F {chain}", check=False
+                ["iptables", "-F", chain], check=False
             )
             if success:
                 self.logger.debug(f"Chaîne {chain} vidée")
             else:
                 self.logger.error(f"Erreur flush {chain}: {stderr}")
 
+        # Règles de marquage (policy routing) : chaînes YARP de la table
+        # mangle, absentes tant qu'aucune règle mark n'a été installée
+        for yarp_chain in MARK_CHAINS.values():
+            self._run_command_silent(["iptables", "-t", "mangle", "-F", yarp_chain])
+
         self.logger.info("Chaînes iptables vidées")
 
+    def setup_mark_chains(self):
+        """Crée les chaînes YARP-MARK-* et leur saut depuis PREROUTING et
+        OUTPUT (table mangle), seulement s'il y a des règles action: mark"""
+        for chain, yarp_chain in MARK_CHAINS.items():
+            # -N échoue si la chaîne existe déjà (apply précédent)
+            self._run_command_silent(["iptables", "-t", "mangle", "-N", yarp_chain])
+            jump = ["-m", "comment", "--comment", "YARP-FW-MARK", "-j", yarp_chain]
+            exists, _, _ = self._run_command_silent(["iptables", "-t", "mangle", "-C", chain, *jump])
+            if exists:
+                continue
+            success, _, stderr = self._run_command(
+                ["iptables", "-t", "mangle", "-A", chain, *jump], check=False
+            )
+            if not success:
+                self.logger.error(f"Erreur saut mangle {chain} → {yarp_chain}: {stderr}")
+                return False
+        return True
+
     # ------------------------------------------------------------------ #
     #  Application d'une règle utilisateur                                 #
     # ------------------------------------------------------------------ #
@@ -206,77 +194,87 @@ class FirewallManager:
     def _build_match_args(self, rule):
         """Construit les arguments iptables de matching (source, destination, interfaces).
 
+        Retourne une liste d'arguments : les valeurs issues du YAML ne
+        sont jamais réinterprétées comme une ligne de commande.
+
         Champs supportés :
-          - source         : IP, CIDR ou réseau source        → -s <value>
-          - destination    : IP, CIDR ou réseau destination   → -d <value>
+          - source         : réseau source                    → -s <value>
+          - destination    : réseau destination               → -d <value>
           - in_interface   : interface d'entrée               → -i <value>
           - out_interface  : interface de sortie              → -o <value>
 
         Tous les champs sont facultatifs. Au moins un doit être présent.
         """
-        parts = []
+        args = []
 
-        if rule.get('in_interface'):
-            parts.append(f"-i {rule['in_interface']}")
+        if rule.in_interface:
+            args += ["-i", rule.in_interface]
 
-        if rule.get('out_interface'):
-            parts.append(f"-o {rule['out_interface']}")
+        if rule.out_interface:
+            args += ["-o", rule.out_interface]
 
-        if rule.get('source') and rule['source'].lower() != 'any':
-            parts.append(f"-s {rule['source']}")
+        if rule.source:
+            args += ["-s", rule.source.with_prefixlen]
 
-        if rule.get('destination') and rule['destination'].lower() != 'any':
-            parts.append(f"-d {rule['destination']}")
+        if rule.destination:
+            args += ["-d", rule.destination.with_prefixlen]
 
-        return " ".join(parts)
+        return args
 
     def _describe_rule(self, rule):
         """Génère une description lisible d'une règle pour les logs."""
         parts = []
-        if rule.get('source'):
-            parts.append(f"src={rule['source']}")
-        if rule.get('in_interface'):
-            parts.append(f"in={rule['in_interface']}")
-        if rule.get('destination'):
-            parts.append(f"dst={rule['destination']}")
-        if rule.get('out_interface'):
-            parts.append(f"out={rule['out_interface']}")
+        if rule.source:
+            parts.append(f"src={rule.source}")
+        if rule.in_interface:
+            parts.append(f"in={rule.in_interface}")
+        if rule.destination:
+            parts.append(f"dst={rule.destination}")
+        if rule.out_interface:
+            parts.append(f"out={rule.out_interface}")
         return " ".join(parts) if parts else "any"
 
     def _apply_rule(self, rule):
         """Applique une règle firewall unique.
 
-        Paramètres attendus dans le dict `rule` :
-          - name           : str  (obligatoire) — nom descriptif
-          - chain          : str  (obligatoire) — input / forward / output
-          - source         : str  (facultatif)  — IP/CIDR source ou "any"
-          - destination    : str  (facultatif)  — IP/CIDR destination ou "any"
-          - in_interface   : str  (facultatif)  — interface d'entrée
-          - out_interface  : str  (facultatif)  — interface de sortie
-          - protocols      : dict | "any"       — { tcp: ..., udp: ..., icmp: true } ou "any"
-          - action         : str  (obligatoire) — accept / drop / reject
+        `rule` est une yarp_model.Rule :
+          - name           : nom descriptif
+          - chain          : input / forward / output / prerouting
+          - source         : réseau source, None pour "any"
+          - destination    : réseau destination, None pour "any"
+          - in_interface   : interface d'entrée (facultatif)
+          - out_interface  : interface de sortie (facultatif)
+          - protocols      : None pour "any", sinon ((protocole, ports), ...)
+          - action         : accept / drop / reject / mark
+          - mark           : (marque, masque) pour action: mark
+
+        Les règles `action: mark` sont installées dans la table mangle
+        (chaînes YARP-MARK-PREROUTING / YARP-MARK-OUTPUT, voir
+        MARK_CHAINS) pour être vues par les règles de policy routing
+        (routing.rules[].fwmark).
         """
-        name = rule.get('name', 'unnamed')
-        chain = rule.get('chain', 'forward').upper()
-        protocols = rule.get('protocols', 'any')
-        action = rule.get('action', 'accept').upper()
+        name = rule.name
+        chain = rule.chain.upper()
+        action = rule.action.upper()
 
         if action == 'REJECT':
-            target = 'REJECT --reject-with icmp-port-unreachable'
+            target = ["REJECT", "--reject-with", "icmp-port-unreachable"]
+        elif action == 'MARK':
+            mark, mask = rule.mark
+            target = ["MARK", "--set-xmark", f"{mark:#x}/{mask if mask is not None else 0xFFFFFFFF:#x}"]
         else:
-            target = action  # ACCEPT ou DROP
+            target = [action]  # ACCEPT ou DROP
+
+        append_args = ["-t", "mangle", "-A", MARK_CHAINS[chain]] if action == 'MARK' else ["-A", chain]
 
-        comment = f"YARP-FW-RULE-{name}"
+        # Le nom de la règle (texte libre du YAML) reste un seul argument
+        comment_args = ["-m", "comment", "--comment", f"YARP-FW-RULE-{name}"]
         match_args = self._build_match_args(rule)
         description = self._describe_rule(rule)
 
         # --- Cas "any" : tout le trafic, pas de filtre protocole ---
-        if protocols == 'any':
-            cmd = (
-                f"iptables -A {chain} {match_args} "
-                f"-m comment --comment '{comment}' "
-                f"-j {target}"
-            )
+        if rule.protocols is None:
+            cmd = ["iptables", *append_args, *match_args, *comment_args, "-j", *target]
             success, _, stderr = self._run_command(cmd, check=False)
             if not success:
                 self.logger.error(f"Erreur règle '{name}': {stderr}")
@@ -284,28 +282,11 @@ class FirewallManager:
             self.logger.info(f"Règle '{name}' [{chain}]: {description} any → {action}")
             return True
 
-        # --- Cas dict de protocoles ---
-        if not isinstance(protocols, dict):
-            self.logger.error(
-                f"Règle '{name}': protocols doit être un dict ou 'any', "
-                f"reçu {type(protocols).__name__}"
-            )
-            return False
-
-        # Protocoles L3 (sans ports) vs L4 (avec ports)
-        l3_protocols = ('icmp', 'gre', 'esp', 'ah', 'ipip', 'ospf', 'vrrp')
-        l4_protocols = ('tcp', 'udp', 'sctp')
-
-        for proto, port_value in protocols.items():
-            proto = proto.lower()
-
+        for proto, ports in rule.protocols:
             # Protocoles L3 : pas de notion de port
-            if proto in l3_protocols:
-                cmd = (
-                    f"iptables -A {chain} {match_args} -p {proto} "
-                    f"-m comment --comment '{comment}' "
-                    f"-j {target}"
-                )
+            if proto in L3_PROTOCOLS:
+                cmd = ["iptables", *append_args, *match_args, "-p", proto,
+                       *comment_args, "-j", *target]
                 success, _, stderr = self._run_command(cmd, check=False)
                 if not success:
                     self.logger.error(f"Erreur règle '{name}' {proto}: {stderr}")
@@ -316,11 +297,10 @@ class FirewallManager:
                 continue
 
             # Protocoles L4 : TCP / UDP / SCTP avec ports
-            if proto not in l4_protocols:
+            if proto not in L4_PROTOCOLS:
                 self.logger.warning(f"Règle '{name}': protocole '{proto}' non supporté, ignoré")
                 continue
 
-            ports = self._normalize_ports(port_value)
             if not ports:
                 self.logger.warning(
                     f"Règle '{name}': aucun port valide pour {proto}, ignoré"
@@ -329,12 +309,8 @@ class FirewallManager:
 
             port_args = self._build_port_args(ports)
 
-            cmd = (
-                f"iptables -A {chain} {match_args} -p {proto} "
-                f"{port_args} "
-                f"-m comment --comment '{comment}' "
-                f"-j {target}"
-            )
+            cmd = ["iptables", *append_args, *match_args, "-p", proto,
+                   *port_args, *comment_args, "-j", *target]
 
             success, _, stderr = self._run_command(cmd, check=False)
             if not success:
@@ -375,16 +351,21 @@ class FirewallManager:
             return False
 
         # 4. Appliquer les règles utilisateur
-        rules = self.firewall.get('rules', [])
+        rules = self.config.get_model().rules
         if not rules:
             self.logger.info("Aucune règle firewall à appliquer")
             return True
 
+        if any(rule.action == 'mark' for rule in rules) and not self.setup_mark_chains():
+            return False
+
         success_count = 0
         total_count = len(rules)
 
         for rule in rules:
-            if self._apply_rule(rule):
+            with tracer.span(f"rule {rule.name}", "rule"):
+                applied = self._apply_rule(rule)
+            if applied:
                 success_count += 1
 
         self.logger.info(
@@ -404,11 +385,9 @@ class FirewallManager:
         # Politiques par défaut
         print("\n--- Politiques par défaut ---")
         for chain in ['INPUT', 'FORWARD', 'OUTPUT']:
-            success, stdout, _ = self._run_command(
-                f"iptables -L {chain} -n | head -1", check=False
-            )
-            if success:
-                print(f"  {stdout.strip()}")
+            success, stdout, _ = self._run_command(["iptables", "-L", chain, "-n"], check=False)
+            if success and stdout:
+                print(f"  {stdout.splitlines()[0]}")
 
         # Règles YARP-FW
         print("\n--- Règles YARP Firewall ---")
@@ -462,7 +441,7 @@ def main():
         command = sys.argv[2] if len(sys.argv) > 2 else "apply"
 
     config = YARPConfig(config_file)
-    if not config.load():
+    if not config.load() or not config.validate():
         sys.exit(1)
 
     manager = FirewallManager(config)
@@ -4,12 +4,10 @@ YARP NAT Module
 Gestion du NAT et masquerading
 """
 
-import subprocess
 import sys
 import re
 import os
 import time
-import ipaddress
 from pathlib import Path
 
 YARP_DIR = "/opt/yarp"
@@ -17,6 +15,9 @@ sys.path.insert(0, os.path.join(YARP_DIR, 'core'))
 
 from yarp_config import YARPConfig
 from yarp_logger import get_logger
+from yarp_plan import is_read_only
+from yarp_trace import tracer
+from yarp_exec import executor, command_line
 
 class NATManager:
     def __init__(self, config):
@@ -25,60 +26,27 @@ class NATManager:
 
         # Initialiser le logger avec la config YARP
         logging_config = config.get_logging()
-        self.logger = get_logger("firewall", {'logging': logging_config})
+        self.logger = get_logger("nat", {'logging': logging_config})
+
+        # Renseigné par yarp plan (voir yarp_plan.Plan)
+        self.plan = None
 
     def _run_command(self, cmd, check=True):
-        """Exécute une commande système avec logging"""
-        start_time = time.time()
-        try:
-            result = subprocess.run(
-                cmd,
-                shell=True,
-                capture_output=True,
-                text=True,
-                check=check
-            )
-            duration_ms = int((time.time() - start_time) * 1000)
-
-            # Logger l'exécution commande
-            self.logger.command_execution(cmd, result.returncode, duration_ms)
-
-            return result.returncode == 0, result.stdout, result.stderr
-        except subprocess.CalledProcessError as e:
-            duration_ms = int((time.time() - start_time) * 1000)
-            self.logger.command_execution(cmd, e.returncode, duration_ms)
-            return False, e.stdout, e.stderr
-
-    def validate_ip_range(self, cidr):
-        """Valide qu'une plage IP est valide"""
-        try:
-            ipaddress.ip_network(cidr, strict=False)
-            return True
-        except ValueError:
-            return False
+        """Exécute une commande système avec logging (voir yarp_exec)"""
+        if self.plan is not None and not is_read_only(command_line(cmd)):
+            return self.plan.command(command_line(cmd))
+        return executor.run(cmd, logger=self.logger)
 
     def get_nat_interfaces(self):
-        """Retourne les interfaces avec masquerading activé"""
-        nat_interfaces = {}
-
-        for iface_name, iface_config in self.interfaces.items():
-            if iface_config.get('masquerading', False):
-                sources = iface_config.get('masquerade_sources', [])
-
-                # Valider toutes les sources
-                valid_sources = []
-                for source in sources:
-                    if self.validate_ip_range(source):
-                        valid_sources.append(source)
-                        self.logger.debug(f"Source valide pour {iface_name}: {source}")
-                    else:
-                        self.logger.warning(f"Source invalide ignorée pour {iface_name}: {source}")
+        """Retourne les interfaces avec masquerading activé (nom → tuple de NatSource)"""
+        model = self.config.get_model()
+        nat_interfaces = model.nat_sources()
 
-                if valid_sources:
-                    nat_interfaces[iface_name] = valid_sources
-                    self.logger.info(f"Interface NAT: {iface_name} avec {len(valid_sources)} sources")
-                else:
-                    self.logger.warning(f"Interface {iface_name}: masquerading activé mais aucune source valide")
+        for iface_name, iface in model.interfaces.items():
+            if iface_name in nat_interfaces:
+                self.logger.info(f"Interface NAT: {iface_name} avec {len(iface.nat_sources)} sources")
+            elif iface.masquerading:
+                self.logger.warning(f"Interface {iface_name}: masquerading activé mais aucune source")
 
         return nat_interfaces
 
@@ -112,17 +80,9 @@ class NATManager:
 
     def _run_command_silent(self, cmd):
         """Exécute une commande silencieuse (pour nettoyage, sans logging d'erreur)"""
-        try:
-            result = subprocess.run(
-                cmd,
-                shell=True,
-                capture_output=True,
-                text=True,
-                check=False
-            )
-            return result.returncode == 0, result.stdout, result.stderr
-        except Exception:
-            return False, "", ""
+        if self.plan is not None and not is_read_only(command_line(cmd)):
+            return self.plan.command(command_line(cmd))
+        return executor.run(cmd)
 
     def clear_nat_rules(self):
         """Nettoie les règles NAT existantes de YARP"""
@@ -131,10 +91,10 @@ class NATManager:
         rules_cleaned = 0
 
         # Lister les règles POSTROUTING et supprimer celles avec YARP-NAT
-        success, stdout, _ = self._run_command_silent("iptables -t nat -L POSTROUTING --line-numbers -n | grep 'YARP-NAT'")
-        if success and stdout.strip():
+        success, stdout, _ = self._run_command_silent("iptables -t nat -L POSTROUTING --line-numbers -n")
+        lines = [line for line in stdout.splitlines() if 'YARP-NAT' in line] if success else []
+        if lines:
             # Supprimer les règles en partant de la fin
-            lines = stdout.strip().split('\n')
             line_numbers = []
             for line in lines:
                 if 'YARP-NAT' in line:
@@ -160,20 +120,21 @@ class NATManager:
         for interface, sources in nat_interfaces.items():
             self.logger.info(f"Configuration masquerading sur {interface}")
 
-            for source in sources:
-                # Règle MASQUERADE pour chaque source
-                cmd = (f"iptables -t nat -A POSTROUTING "
-                      f"-s {source} -o {interface} "
-                      f"-m comment --comment 'YARP-NAT-{interface}' "
-                      f"-j MASQUERADE")
+            with tracer.span(f"interface {interface}", "interface"):
+                for source in sources:
+                    # Règle MASQUERADE pour chaque source
+                    cmd = ["iptables", "-t", "nat", "-A", "POSTROUTING",
+                           "-s", source.cidr, "-o", interface,
+                           "-m", "comment", "--comment", f"YARP-NAT-{interface}",
+                           "-j", "MASQUERADE"]
 
-                success, _, stderr = self._run_command(cmd, check=False)
+                    success, _, stderr = self._run_command(cmd, check=False)
 
-                if success:
-                    self.logger.info(f"Masquerading configuré: {source} -> {interface}")
-                else:
-                    self.logger.error(f"Erreur masquerading {source} -> {interface}: {stderr}")
-                    return False
+                    if success:
+                        self.logger.info(f"Masquerading configuré: {source.cidr} -> {interface}")
+                    else:
+                        self.logger.error(f"Erreur masquerading {source.cidr} -> {interface}: {stderr}")
+                        return False
 
         return True
 
@@ -251,7 +212,7 @@ def main():
         command = sys.argv[2] if len(sys.argv) > 2 else "apply"
 
     config = YARPConfig(config_file)
-    if not config.load():
+    if not config.load() or not config.validate():
         sys.exit(1)
 
     manager = NATManager(config)
@@ -4,7 +4,6 @@ YARP Network Module
 Gestion des interfaces réseau
 """
 
-import subprocess
 import sys
 import re
 import os
@@ -16,47 +15,38 @@ sys.path.insert(0, os.path.join(YARP_DIR, 'core'))
 
 from yarp_config import YARPConfig
 from yarp_logger import get_logger
+from yarp_plan import is_read_only
+from yarp_trace import tracer
+from yarp_exec import executor, command_line
 
 class NetworkManager:
     def __init__(self, config):
         self.config = config
-        self.interfaces = config.get_interfaces()
+        # Interfaces du modèle typé (adresses déjà analysées)
+        self.interfaces = config.get_model().interfaces
 
         # Initialiser le logger avec la config YARP
         logging_config = config.get_logging()
         self.logger = get_logger("network", {'logging': logging_config})
+
+        # Renseigné par yarp plan : voir _run_command
+        self.plan = None
     
-    def _run_command(self, cmd, check=True):
-        """Exécute une commande système avec logging"""
-        start_time = time.time()
-        try:
-            result = subprocess.run(
-                cmd,
-                shell=True,
-                capture_output=True,
-                text=True,
-                check=check
-            )
-            duration_ms = int((time.time() - start_time) * 1000)
-
-            # Logger l'exécution commande
-            self.logger.command_execution(cmd, result.returncode, duration_ms)
-
-            return result.returncode == 0, result.stdout, result.stderr
-        except subprocess.CalledProcessError as e:
-            duration_ms = int((time.time() - start_time) * 1000)
-            self.logger.command_execution(cmd, e.returncode, duration_ms)
-            return False, e.stdout, e.stderr
-    
+    def _run_command(self, cmd, check=True, timeout=None):
+        """Exécute une commande système avec logging (voir yarp_exec)"""
+        if self.plan is not None and not is_read_only(command_line(cmd)):
+            return self.plan.command(command_line(cmd))
+        return executor.run(cmd, timeout=timeout, logger=self.logger)
+
     def interface_exists(self, iface):
         """Vérifie si une interface existe"""
-        success, stdout, _ = self._run_command(f"ip link show {iface}", check=False)
+        success, stdout, _ = self._run_command(["ip", "link", "show", iface], check=False)
         return success
     
     def bring_interface_up(self, iface):
         """Active une interface"""
         self.logger.debug(f"Activation de l'interface {iface}")
-        success, _, stderr = self._run_command(f"ip link set {iface} up")
+        success, _, stderr = self._run_command(["ip", "link", "set", iface, "up"])
 
         if success:
             self.logger.interface_operation("activation", iface, "success")
@@ -68,7 +58,7 @@ class NetworkManager:
     def bring_interface_down(self, iface):
         """Désactive une interface"""
         self.logger.debug(f"Désactivation de l'interface {iface}")
-        success = self._run_command(f"ip link set {iface} down")[0]
+        success = self._run_command(["ip", "link", "set", iface, "down"])[0]
 
         if success:
             self.logger.interface_operation("deactivation", iface, "success")
@@ -80,7 +70,7 @@ class NetworkManager:
     def flush_addresses(self, iface):
         """Supprime toutes les adresses d'une interface"""
         self.logger.debug(f"Nettoyage des adresses de {iface}")
-        success, _, stderr = self._run_command(f"ip addr flush dev {iface}", check=False)
+        success, _, stderr = self._run_command(["ip", "addr", "flush", "dev", iface], check=False)
 
         if success:
             self.logger.interface_operation("flush_addresses", iface, "success")
@@ -90,9 +80,7 @@ class NetworkManager:
     def set_ipv4_address(self, iface, address):
         """Configure une adresse IPv4"""
         self.logger.info(f"Configuration IPv4 de {iface}: {address}")
-        success, _, stderr = self._run_command(
-            f"ip addr add {address} dev {iface}"
-        )
+        success, _, stderr = self._run_command(["ip", "addr", "add", address, "dev", iface])
 
         if success:
             self.logger.interface_operation("ipv4_config", iface, "success", address=address)
@@ -104,27 +92,24 @@ class NetworkManager:
     def set_ipv6_address(self, iface, address):
         """Configure une adresse IPv6"""
         print(f"Configuration IPv6 de {iface}: {address}")
-        success, _, stderr = self._run_command(
-            f"ip -6 addr add {address} dev {iface}"
-        )
+        success, _, stderr = self._run_command(["ip", "-6", "addr", "add", address, "dev", iface])
         if not success:
             print(f"Erreur IPv6 sur {iface}: {stderr}", file=sys.stderr)
         return success
     
     def has_dhcp_address(self, iface):
         """Vérifie si l'interface a déjà une adresse IP (probablement DHCP)"""
-        success, stdout, _ = self._run_command(f"ip -4 addr show {iface} | grep inet", check=False)
-        if success and stdout.strip():
+        success, stdout, _ = self._run_command(["ip", "-4", "addr", "show", iface], check=False)
+        if success:
             # Exclure les adresses link-local (169.254.x.x)
-            lines = stdout.strip().split('\n')
-            for line in lines:
+            for line in stdout.splitlines():
                 if 'inet ' in line and '169.254.' not in line:
                     return True
         return False
 
     def is_dhcp_running(self, iface):
         """Vérifie si un client DHCP est déjà actif pour cette interface"""
-        success, _, _ = self._run_command(f"pgrep -f 'udhcpc.*{iface}'", check=False)
+        success, _, _ = self._run_command(["pgrep", "-f", f"udhcpc.*{iface}"], check=False)
         return success
 
     def enable_dhcp(self, iface):
@@ -143,19 +128,21 @@ class NetworkManager:
                 print(f"Adresse IP présente mais pas de client DHCP - redémarrage")
 
         # Arrêter les clients DHCP existants pour cette interface
-        self._run_command(f"pkill -f 'dhcpcd.*{iface}'", check=False)
-        self._run_command(f"pkill -f 'udhcpc.*{iface}'", check=False)
+        self._run_command(["pkill", "-f", f"dhcpcd.*{iface}"], check=False)
+        self._run_command(["pkill", "-f", f"udhcpc.*{iface}"], check=False)
 
         # Attendre un peu que les processus se terminent
-        time.sleep(1)
+        if self.plan is None:
+            time.sleep(1)
 
         # Démarrer udhcpc en arrière-plan avec timeout
         print(f"Démarrage du client DHCP pour {iface}...")
 
-        # Utiliser timeout pour éviter le blocage
+        # Délai de 30 s pour éviter le blocage
         success, stdout, stderr = self._run_command(
-            f"timeout 30 udhcpc -i {iface} -t 3 -T 10 -A 10 -n",
-            check=False
+            ["udhcpc", "-i", iface, "-t", "3", "-T", "10", "-A", "10", "-n"],
+            check=False,
+            timeout=30
         )
 
         if success:
@@ -169,12 +156,12 @@ class NetworkManager:
     def enable_ipv6_auto(self, iface):
         """Active l'autoconfiguration IPv6"""
         print(f"Activation autoconfiguration IPv6 sur {iface}")
-        self._run_command(f"sysctl -w net.ipv6.conf.{iface}.autoconf=1")
-        self._run_command(f"sysctl -w net.ipv6.conf.{iface}.accept_ra=1")
+        self._run_command(["sysctl", "-w", f"net.ipv6.conf.{iface}.autoconf=1"])
+        self._run_command(["sysctl", "-w", f"net.ipv6.conf.{iface}.accept_ra=1"])
         return True
     
-    def configure_interface(self, iface, config):
-        """Configure une interface complète"""
+    def configure_interface(self, iface, interface):
+        """Configure une interface complète (interface : yarp_model.Interface)"""
         print(f"\n=== Configuration de {iface} ===")
 
         if not self.interface_exists(iface):
@@ -186,8 +173,8 @@ class NetworkManager:
             return False
 
         # Configuration IPv4
-        if 'ipv4' in config:
-            if config['ipv4'] == 'dhcp':
+        if interface.dhcp or interface.ipv4:
+            if interface.dhcp:
                 # Pour DHCP, on vérifie d'abord si c'est déjà configuré
                 # avant de nettoyer
                 if not (self.has_dhcp_address(iface) and self.is_dhcp_running(iface)):
@@ -201,16 +188,16 @@ class NetworkManager:
             else:
                 # Pour IP statique, on nettoie toujours
                 self.flush_addresses(iface)
-                success = self.set_ipv4_address(iface, config['ipv4'])
+                success = self.set_ipv4_address(iface, str(interface.ipv4))
                 if not success:
                     return False
 
         # Configuration IPv6
-        if 'ipv6' in config:
-            if config['ipv6'] == 'auto':
+        if interface.ipv6_auto or interface.ipv6:
+            if interface.ipv6_auto:
                 self.enable_ipv6_auto(iface)
             else:
-                success = self.set_ipv6_address(iface, config['ipv6'])
+                success = self.set_ipv6_address(iface, str(interface.ipv6))
                 if not success:
                     return False
 
@@ -226,8 +213,11 @@ class NetworkManager:
         success_count = 0
         total_count = len(self.interfaces)
         
-        for iface, config in self.interfaces.items():
-            if self.configure_interface(iface, config):
+        for iface, interface in self.interfaces.items():
+            with tracer.span(f"interface {iface}", "interface") as span:
+                configured = self.configure_interface(iface, interface)
+                span.set(success=configured)
+            if configured:
                 success_count += 1
         
         print(f"\n{success_count}/{total_count} interfaces configurées")
@@ -4,102 +4,1212 @@ YARP Routing Module
 Gestion des routes statiques
 """
 
-import subprocess
 import sys
 import os
+import re
+import csv
+import time
+import json
+import zlib
 import ipaddress
 
 YARP_DIR = "/opt/yarp"
 sys.path.insert(0, os.path.join(YARP_DIR, 'core'))
 
-from yarp_config import YARPConfig
+from yarp_config import YARPConfig, parse_fwmark, ROUTE_TYPES
+from yarp_model import IFNAME_PATTERN
+from yarp_logger import get_logger
+from yarp_plan import is_read_only
+from yarp_exec import executor, command_line
+from yarp_trace import tracer
+
+# Numéro de protocole noyau (rtnetlink) utilisé pour marquer les routes
+# installées par YARP. Permet de retrouver en un seul dump les routes
+# dont YARP est propriétaire, sans toucher aux routes kernel/dhcp/boot.
+YARP_ROUTE_PROTO = 250
+
+# Métrique appliquée par le noyau quand aucune n'est précisée
+DEFAULT_METRIC = {4: 0, 6: 1024}
+
+# Tables de routage réservées du noyau
+MAIN_TABLE = 254
+RESERVED_TABLES = {'default': 253, 'main': MAIN_TABLE, 'local': 255}
+
+# Noms des tables YARP, pour `ip route show table <nom>`
+RT_TABLES_FILE = "/etc/iproute2/rt_tables.d/yarp.conf"
+
+# Priorité d'une règle de policy routing sans 'priority' explicite
+# (seulement possible pour une règle unique, voir yarp_schema)
+DEFAULT_RULE_PRIORITY = 10000
+
+# Types de route affichés en tête de ligne par `ip route show`
+KERNEL_ROUTE_TYPES = frozenset((
+    'unicast', 'local', 'broadcast', 'anycast', 'multicast',
+    'blackhole', 'unreachable', 'prohibit', 'throw', 'nat',
+))
+# Attributs de `ip -o route show` → clés de `ip -j route show`
+KERNEL_ROUTE_ATTRIBUTES = {
+    'via': 'gateway', 'dev': 'dev', 'table': 'table', 'metric': 'metric',
+    'nhid': 'nhid', 'weight': 'weight', 'proto': 'protocol',
+}
+
+# Groupe d'agrégation des routes du noyau non gérées par YARP
+FOREIGN_ROUTE_GROUP = ('foreign',)
+
+# Erreurs ip -batch sans conséquence pour la réconciliation (objet déjà
+# absent lors d'une suppression). "File exists" n'en fait pas partie :
+# les routes sont programmées par replace, ce conflit ne vient que d'un
+# objet concurrent non géré par YARP et doit être signalé
+BENIGN_BATCH_ERRORS = ("No such process",)
+
+# Plages d'identifiants des objets nexthop du noyau gérés par YARP
+# (nexthops simples et groupes ECMP). L'identifiant est dérivé d'un
+# hash stable de la clé du nexthop pour rester identique d'un apply à
+# l'autre.
+NEXTHOP_ID_BASE = 0x10000000
+NEXTHOP_GROUP_ID_BASE = 0x20000000
+NEXTHOP_ID_MASK = 0x0FFFFFFF
+
+# Nombre maximal de lignes par appel ip -batch : les gros volumes (flux
+# de plusieurs centaines de milliers de routes) sont programmés par
+# paquets, avec un point de progression à chaque paquet
+ROUTE_BATCH_SIZE = 5000
+
+# Flux de routes externes (routing.static[].file)
+FEED_PROGRESS_INTERVAL = 100000
+FEED_MAX_REPORTED_ERRORS = 20
+FEED_CSV_COLUMNS = ('to', 'via', 'interface', 'metric', 'type')
+
+
+def _iter_lines(text):
+    """Génère les lignes d'une sortie de commande une à une, sans
+    construire la liste de toutes les lignes"""
+    start = 0
+    while start < len(text):
+        end = text.find("\n", start)
+        if end < 0:
+            end = len(text)
+        yield text[start:end]
+        start = end + 1
+
+
+class FeedError(Exception):
+    """Fichier de routes externe illisible ou mal formé"""
+
+
+class BatchWriter:
+    """Accumule des lignes ip -batch et les programme par paquets.
+
+    Chaque paquet de ROUTE_BATCH_SIZE lignes est envoyé dès qu'il est
+    plein : la mémoire reste bornée quel que soit le nombre de routes.
+    Chaque envoi est un span de trace nommé d'après `label` (objets
+    programmés, table) et la famille.
+    """
+
+    def __init__(self, manager, version, label="routes", size=ROUTE_BATCH_SIZE):
+        self.manager = manager
+        self.version = version
+        self.label = label
+        self.size = size
+        self.lines = []
+        self.sent = 0
+        self.failed = 0
+
+    def add(self, line):
+        self.lines.append(line)
+        if len(self.lines) >= self.size:
+            self.flush()
+
+    def flush(self):
+        if not self.lines:
+            return
+        with tracer.span(f"{self.label} IPv{self.version}", "batch", lines=len(self.lines)) as span:
+            failed = self.manager._run_batch(self.lines, ipv6=(self.version == 6))
+            span.set(failed=failed)
+        self.failed += failed
+        self.sent += len(self.lines)
+        self.lines = []
+        if self.sent >= self.size:
+            self.manager.logger.info(
+                f"{self.label} IPv{self.version}: {self.sent} commandes programmées", sent=self.sent
+            )
+
+    def close(self):
+        """Envoie le dernier paquet et retourne le nombre de lignes en échec"""
+        self.flush()
+        return self.failed
+
 
 class RoutingManager:
     def __init__(self, config):
         self.config = config
         self.routing = config.get_routing()
-        self.static_routes = config.get_static_routes()
-    
-    def _run_command(self, cmd, check=True):
-        """Exécute une commande système"""
-        try:
-            result = subprocess.run(
-                cmd,
-                shell=True,
-                capture_output=True,
-                text=True,
-                check=check
-            )
-            return result.returncode == 0, result.stdout, result.stderr
-        except subprocess.CalledProcessError as e:
-            return False, e.stdout, e.stderr
-    
-    def flush_routes(self, table="main"):
-        """Supprime toutes les routes d'une table"""
-        print(f"Nettoyage de la table de routage {table}")
-        # Conserver seulement les routes link-local
-        self._run_command(
-            f"ip route flush table {table} proto static",
-            check=False
+        self.tables = config.get_routing_tables()
+        self.rules = config.get_routing_rules()
+
+        # Correspondance nom de table → identifiant noyau
+        self._table_ids = dict(RESERVED_TABLES)
+        for name, table in self.tables.items():
+            self._table_ids[name] = table['id']
+
+        # Initialiser le logger avec la config YARP
+        logging_config = config.get_logging()
+        self.logger = get_logger("routing", {'logging': logging_config})
+
+        # yarp plan : lots ip -batch et rt_tables enregistrés au lieu d'être appliqués
+        self.plan = None
+
+        # Objets nexthop désirés (id → objet), voir attach_nexthop_objects()
+        self._nexthop_ids = {}
+        self._nexthop_objects = {}
+
+    def _run_command(self, cmd, check=True, input=None):
+        """Exécute une commande système avec logging (voir yarp_exec)"""
+        if self.plan is not None and not is_read_only(command_line(cmd)):
+            return self.plan.command(command_line(cmd), input)
+        return executor.run(cmd, input=input, logger=self.logger)
+
+    def _run_batch(self, lines, ipv6=False):
+        """Exécute un lot de commandes ip en un seul appel (ip -batch).
+
+        Les lignes sont de la forme "route replace ..." (sans le préfixe ip).
+        Avec -force, ip continue après une erreur et signale chaque ligne
+        en échec par "Command failed -:<n>" sur stderr.
+
+        Retourne le nombre de lignes en échec, hors "No such process"
+        (route déjà absente lors d'une suppression).
+        """
+        if not lines:
+            return 0
+
+        ip_cmd = "ip -6" if ipv6 else "ip"
+        success, _, stderr = self._run_command(
+            f"{ip_cmd} -force -batch -",
+            check=False,
+            input="\n".join(lines) + "\n"
         )
-    
-    def add_route(self, route):
-        """Ajoute une route statique"""
+        if success:
+            return 0
+
+        failed = 0
+        previous = ""
+        for line in stderr.splitlines():
+            if line.startswith("Command failed"):
+                if not any(benign in previous for benign in BENIGN_BATCH_ERRORS):
+                    failed += 1
+                    self.logger.error(f"Échec batch routage ({line}): {previous}")
+            else:
+                previous = line
+        return failed
+
+    # ------------------------------------------------------------------ #
+    #  Normalisation des routes                                            #
+    # ------------------------------------------------------------------ #
+
+    def _normalize_route(self, route, table=MAIN_TABLE):
+        """Normalise une route de la configuration YAML.
+
+        Retourne un dict {version, table, type, dst, via, dev, metric,
+        nexthops} comparable avec les routes du noyau, ou None si la route
+        est invalide. Pour une route multipath, via/dev valent None et
+        `nexthops` est un tuple trié de (via, dev, weight).
+        """
         to = route.get('to')
-        via = route.get('via')
-        interface = route.get('interface')
-        metric = route.get('metric')
-        
         if not to:
-            print("Route sans destination ignorée", file=sys.stderr)
-            return False
-        
-        # Déterminer si c'est IPv4 ou IPv6
+            return None
+
+        route_type = route.get('type') or 'unicast'
+        if route_type not in ROUTE_TYPES:
+            return None
+
         try:
             network = ipaddress.ip_network(to, strict=False)
-            ip_cmd = "ip" if network.version == 4 else "ip -6"
+            via = route.get('via')
+            if via:
+                via = str(ipaddress.ip_address(via))
+
+            nexthops = None
+            if route.get('nexthops'):
+                nexthops = tuple(sorted(
+                    (
+                        str(ipaddress.ip_address(hop['via'])) if hop.get('via') else None,
+                        hop.get('interface'),
+                        int(hop.get('weight', 1)),
+                    )
+                    for hop in route['nexthops']
+                ))
+            metric = int(route.get('metric') or DEFAULT_METRIC[network.version])
+        except (ValueError, TypeError, AttributeError):
+            return None
+
+        dev = route.get('interface')
+        devices = [dev] + [hop[1] for hop in nexthops or ()]
+        if any(name and not IFNAME_PATTERN.match(str(name)) for name in devices):
+            return None
+
+        # Multipath exclusif d'un next-hop simple (comme à la validation) :
+        # une ligne de flux avec via sur une entrée à nexthops est refusée
+        if nexthops and (via or dev):
+            return None
+
+        # Une route unicast a besoin d'un next-hop, les autres types
+        # (blackhole, unreachable, prohibit) n'en ont pas
+        if (route_type == 'unicast') != bool(via or dev or nexthops):
+            return None
+
+        return {
+            'version': network.version,
+            'table': table,
+            'type': route_type,
+            'dst': network.with_prefixlen,
+            'via': via,
+            'dev': dev,
+            'metric': metric,
+            'nexthops': nexthops,
+        }
+
+    def _normalize_kernel_route(self, entry, version):
+        """Normalise une route issue de `ip -j route show`"""
+        dst = entry.get('dst', 'default')
+        if dst == 'default':
+            dst = '0.0.0.0/0' if version == 4 else '::/0'
+        elif '/' not in dst:
+            dst = f"{dst}/{32 if version == 4 else 128}"
+
+        nexthops = None
+        if entry.get('nexthops'):
+            nexthops = tuple(sorted(
+                (hop.get('gateway'), hop.get('dev'), hop.get('weight', 1))
+                for hop in entry['nexthops']
+            ))
+
+        return {
+            'version': version,
+            'table': self._table_id(entry.get('table', 'main')),
+            'type': entry.get('type', 'unicast'),
+            'dst': dst,
+            'via': entry.get('gateway'),
+            'dev': entry.get('dev'),
+            'metric': entry.get('metric', DEFAULT_METRIC[version]),
+            'nexthops': nexthops,
+            'nhid': entry.get('nhid'),
+        }
+
+    def _table_id(self, table):
+        """Convertit un nom ou numéro de table (sortie ip -j) en identifiant"""
+        if isinstance(table, int) or str(table).isdigit():
+            return int(table)
+        return self._table_ids.get(table, table)
+
+    def _route_key(self, route):
+        """Clé d'identité d'une route dans le noyau (table, destination, métrique)"""
+        return (route['version'], route['table'], route['dst'], route['metric'])
+
+    def _route_spec(self, route):
+        """Construit la spécification ip d'une route normalisée"""
+        spec = route['dst']
+        if route['type'] != 'unicast':
+            spec = f"{route['type']} {spec}"
+        if route.get('nhid'):
+            spec += f" nhid {route['nhid']}"
+        else:
+            if route['via']:
+                spec += f" via {route['via']}"
+            if route['dev']:
+                spec += f" dev {route['dev']}"
+        spec += f" metric {route['metric']}"
+        if route['table'] != MAIN_TABLE:
+            spec += f" table {route['table']}"
+        spec += f" proto {YARP_ROUTE_PROTO}"
+
+        # Multipath : les nexthops doivent terminer la commande
+        if not route.get('nhid') and route['nexthops']:
+            for via, dev, weight in route['nexthops']:
+                spec += " nexthop"
+                if via:
+                    spec += f" via {via}"
+                if dev:
+                    spec += f" dev {dev}"
+                spec += f" weight {weight}"
+        return spec
+
+    def _hop_differs(self, desired, current):
+        """Compare un (via, dev) désiré avec celui du noyau.
+
+        Seuls les champs précisés dans la configuration sont comparés :
+        un next-hop sans 'interface' accepte le dev choisi par le noyau.
+        """
+        desired_via, desired_dev = desired
+        current_via, current_dev = current
+        if desired_via != current_via:
+            return True
+        if desired_dev and desired_dev != current_dev:
+            return True
+        return False
+
+    def _route_differs(self, desired, current):
+        """Indique si une route du noyau doit être remplacée"""
+        if desired['type'] != current['type']:
+            return True
+        if desired.get('nhid'):
+            return desired['nhid'] != current.get('nhid')
+        if current.get('nhid'):
+            return True
+
+        if desired['nexthops'] or current['nexthops']:
+            if not desired['nexthops'] or not current['nexthops']:
+                return True
+            if len(desired['nexthops']) != len(current['nexthops']):
+                return True
+            current_hops = sorted(current['nexthops'], key=lambda h: (h[0] or '', h[2]))
+            desired_hops = sorted(desired['nexthops'], key=lambda h: (h[0] or '', h[2]))
+            for wanted, existing in zip(desired_hops, current_hops):
+                if wanted[2] != existing[2] or self._hop_differs(wanted[:2], existing[:2]):
+                    return True
+            return False
+
+        return self._hop_differs((desired['via'], desired['dev']), (current['via'], current['dev']))
+
+    # ------------------------------------------------------------------ #
+    #  Objets nexthop du noyau                                             #
+    # ------------------------------------------------------------------ #
+
+    def _route_hops(self, route):
+        """Retourne la liste (via, dev, weight) des next-hops d'une route"""
+        if route['nexthops']:
+            return list(route['nexthops'])
+        if route['via'] or route['dev']:
+            return [(route['via'], route['dev'], 1)]
+        return []
+
+    def _allocate_nexthop_id(self, key, base):
+        """Associe un identifiant stable à une clé de nexthop ou de groupe"""
+        if key in self._nexthop_ids:
+            return self._nexthop_ids[key]
+
+        nh_id = base | (zlib.crc32(repr(key).encode()) & NEXTHOP_ID_MASK)
+        # Collision de hash (très improbable) : prendre l'identifiant suivant
+        while nh_id in self._nexthop_objects:
+            nh_id = base | ((nh_id + 1) & NEXTHOP_ID_MASK)
+
+        self._nexthop_ids[key] = nh_id
+        return nh_id
+
+    def attach_nexthop_objects(self, routes):
+        """Fait pointer les routes vers des objets nexthop du noyau (nhid).
+
+        Chaque next-hop devient un objet `ip nexthop` et chaque ensemble
+        multipath un groupe pondéré. Un next-hop est identifié par son
+        interface (ou par sa passerelle si plusieurs passerelles partagent
+        la même interface) : changer la passerelle d'un uplink ne met à
+        jour que l'objet nexthop, sans réécrire les routes qui l'utilisent.
+        De même, changer les poids d'un groupe ne modifie que le groupe.
+
+        Le noyau exige une interface pour chaque objet nexthop : une route
+        dont un next-hop n'a pas d'interface reste en forme classique.
+
+        Retourne la liste des routes complétées par 'nhid'.
+        """
+        routes = list(routes)
+        self._nexthop_ids = {}
+        self._nexthop_objects = {}
+
+        gateways_per_dev = {}
+        for route in routes:
+            for via, dev, _ in self._route_hops(route):
+                if dev:
+                    gateways_per_dev.setdefault((route['version'], dev), set()).add(via)
+
+        for route in routes:
+            version = route['version']
+            hops = self._route_hops(route)
+            if route['type'] != 'unicast':
+                continue
+            if not hops or not all(dev for _, dev, _ in hops):
+                self.logger.warning(
+                    f"Route {route['dst']}: next-hop sans interface, objet nexthop non utilisé"
+                )
+                continue
+
+            members = []
+            for via, dev, weight in hops:
+                if dev and len(gateways_per_dev[(version, dev)]) == 1:
+                    key = ('nh', version, dev)
+                else:
+                    key = ('nh', version, dev, via)
+                nh_id = self._allocate_nexthop_id(key, NEXTHOP_ID_BASE)
+                self._nexthop_objects[nh_id] = {
+                    'version': version, 'group': None, 'via': via, 'dev': dev,
+                }
+                members.append((nh_id, weight))
+
+            if len(members) == 1:
+                route['nhid'] = members[0][0]
+                continue
+
+            # Un groupe est identifié par ses membres : changer les poids le
+            # modifie sur place. Si d'autres routes utilisent les mêmes
+            # membres avec d'autres poids, un groupe distinct est créé.
+            members = tuple(sorted(members))
+            key = ('group', version, tuple(nh_id for nh_id, _ in members))
+            existing = self._nexthop_objects.get(self._nexthop_ids.get(key))
+            if existing and existing['group'] != members:
+                key = ('group', version, members)
+            group_id = self._allocate_nexthop_id(key, NEXTHOP_GROUP_ID_BASE)
+            self._nexthop_objects[group_id] = {
+                'version': version, 'group': members, 'via': None, 'dev': None,
+            }
+            route['nhid'] = group_id
+
+        return routes
+
+    def get_owned_nexthops(self):
+        """Retourne les objets nexthop installés par YARP (id → objet)"""
+        owned = {}
+        success, stdout, stderr = self._run_command(
+            f"ip -j nexthop show protocol {YARP_ROUTE_PROTO}", check=False
+        )
+        if not success:
+            self.logger.debug(f"Objets nexthop indisponibles: {stderr.strip()}")
+            return owned
+
+        for entry in json.loads(stdout or "[]"):
+            if str(entry.get('protocol')) != str(YARP_ROUTE_PROTO):
+                continue
+            group = None
+            if entry.get('group'):
+                group = tuple(sorted(
+                    (member['id'], member.get('weight', 1)) for member in entry['group']
+                ))
+            owned[entry['id']] = {
+                'group': group, 'via': entry.get('gateway'), 'dev': entry.get('dev'),
+            }
+        return owned
+
+    def _nexthop_spec(self, nh_id, nexthop):
+        """Construit la spécification ip d'un objet nexthop"""
+        spec = f"id {nh_id}"
+        if nexthop['group']:
+            spec += " group " + "/".join(f"{member},{weight}" for member, weight in nexthop['group'])
+        else:
+            if nexthop['via']:
+                spec += f" via {nexthop['via']}"
+            if nexthop['dev']:
+                spec += f" dev {nexthop['dev']}"
+        return f"{spec} proto {YARP_ROUTE_PROTO}"
+
+    def diff_nexthops(self, current):
+        """Compare les objets nexthop désirés avec ceux du noyau.
+
+        Retourne (à créer ou remplacer, identifiants obsolètes). Les
+        nexthops simples précèdent les groupes qui les référencent.
+        """
+        desired = self._nexthop_objects
+        changes = []
+        for nh_id, nexthop in desired.items():
+            existing = current.get(nh_id)
+            if existing is None:
+                changes.append((nh_id, nexthop))
+            elif nexthop['group'] or existing['group']:
+                if nexthop['group'] != existing['group']:
+                    changes.append((nh_id, nexthop))
+            elif self._hop_differs((nexthop['via'], nexthop['dev']), (existing['via'], existing['dev'])):
+                changes.append((nh_id, nexthop))
+
+        changes.sort(key=lambda change: change[1]['group'] is not None)
+        # Groupes obsolètes d'abord : un nexthop membre d'un groupe ne
+        # peut pas être supprimé avant lui
+        stale = sorted(
+            (nh_id for nh_id in current if nh_id not in desired),
+            key=lambda nh_id: current[nh_id]['group'] is None
+        )
+        return changes, stale
+
+    # ------------------------------------------------------------------ #
+    #  Réconciliation avec le noyau                                        #
+    # ------------------------------------------------------------------ #
+
+    def get_owned_routes(self):
+        """Retourne les routes installées par YARP (proto YARP_ROUTE_PROTO).
+
+        Un dump par famille d'adresses au format une ligne par route
+        (ip -o), analysé ligne par ligne : seules les routes normalisées
+        sont conservées, jamais l'arbre JSON de la table entière.
+        Retourne un dict clé → route normalisée.
+        """
+        owned = {}
+        for version in (4, 6):
+            success, stdout, stderr = self._run_command(
+                f"ip -{version} -o route show table all proto {YARP_ROUTE_PROTO}",
+                check=False
+            )
+            if not success:
+                self.logger.warning(f"Impossible de lister les routes IPv{version}: {stderr.strip()}")
+                continue
+            for line in _iter_lines(stdout):
+                entry = self._parse_kernel_route_line(line)
+                if entry is None:
+                    continue
+                route = self._normalize_kernel_route(entry, version)
+                owned[self._route_key(route)] = route
+        return owned
+
+    def _parse_kernel_route_line(self, line):
+        """Analyse une ligne de `ip -o route show`.
+
+        Retourne un dict aux clés de `ip -j route show` (type, dst,
+        gateway, dev, table, metric, nhid, nexthops), accepté par
+        _normalize_kernel_route(), ou None pour une ligne vide.
+        """
+        # ip -o remplace les retours à la ligne des nexthops par "\"
+        tokens = line.replace("\\", " ").split()
+        if not tokens:
+            return None
+
+        # Segments : la route, puis un par mot-clé nexthop (multipath)
+        segments = [[]]
+        for token in tokens:
+            if token == 'nexthop':
+                segments.append([])
+            else:
+                segments[-1].append(token)
+
+        route = segments[0]
+        entry = {}
+        if route[0] in KERNEL_ROUTE_TYPES:
+            entry['type'] = route.pop(0)
+        if route:
+            entry['dst'] = route.pop(0)
+        entry.update(self._parse_route_attributes(route))
+        entry.pop('weight', None)
+        if len(segments) > 1:
+            entry['nexthops'] = [
+                dict({'weight': 1}, **self._parse_route_attributes(segment))
+                for segment in segments[1:]
+            ]
+        return entry
+
+    def _parse_route_attributes(self, tokens):
+        """Attributs clé valeur d'une route ou d'un nexthop (ip -o)"""
+        attributes = {}
+        for index, token in enumerate(tokens[:-1]):
+            name = KERNEL_ROUTE_ATTRIBUTES.get(token)
+            if name is None:
+                continue
+            value = tokens[index + 1]
+            # via inet6 <adresse> : passerelle d'une autre famille
+            if token == 'via' and value in ('inet', 'inet6') and index + 2 < len(tokens):
+                value = tokens[index + 2]
+            attributes[name] = int(value) if name in ('metric', 'nhid', 'weight') else value
+        return attributes
+
+    def diff_routes(self, desired, current):
+        """Calcule les différences entre routes désirées et routes du noyau.
+
+        `desired` est un itérable de routes normalisées, `current` le dict
+        retourné par get_owned_routes(). Génère des couples (action, route)
+        au fil de `desired`, action valant 'add', 'change' ou 'unchanged',
+        puis les routes à supprimer ('delete') une fois `desired` épuisé :
+        les routes désirées ne sont jamais matérialisées.
+        Un changement de métrique apparaît comme un ajout + une suppression
+        (la métrique fait partie de l'identité de la route dans le noyau).
+        """
+        remaining = dict(current)
+
+        for route in desired:
+            key = self._route_key(route)
+            existing = remaining.pop(key, None)
+            if existing is None:
+                yield 'add', route
+            elif self._route_differs(route, existing):
+                yield 'change', route
+            else:
+                yield 'unchanged', route
+
+        for route in remaining.values():
+            yield 'delete', route
+
+    def _desired_routes(self):
+        """Génère les routes normalisées de la configuration.
+
+        Si routing.aggregate est activé, les routes sont matérialisées puis
+        agrégées (voir aggregate_routes). Si routing.nexthop_objects est
+        activé, elles sont rattachées à des objets nexthop du noyau.
+        """
+        routes = self._iter_static_routes()
+        if self.routing.get('aggregate', False):
+            routes = self.aggregate_routes(list(routes))
+        if self.routing.get('nexthop_objects', False):
+            routes = self.attach_nexthop_objects(routes)
+        return routes
+
+    def _iter_static_routes(self):
+        """Génère les routes statiques normalisées (table main puis tables YARP)"""
+        for route in self.config.get_model().routes:
+            if route.file:
+                yield from self._iter_feed(route)
+                continue
+            yield self._route_from_model(route)
+
+    def _route_from_model(self, route):
+        """Convertit une yarp_model.Route, déjà analysée à la validation"""
+        network = route.network
+        return {
+            'version': network.version,
+            'table': route.table,
+            'type': route.type,
+            'dst': network.with_prefixlen,
+            'via': route.via,
+            'dev': route.interface,
+            'metric': route.metric or DEFAULT_METRIC[network.version],
+            'nexthops': route.nexthops,
+        }
+
+    # ------------------------------------------------------------------ #
+    #  Flux de routes externes                                             #
+    # ------------------------------------------------------------------ #
+
+    def _iter_feed(self, entry):
+        """Génère les routes normalisées d'un fichier externe.
+
+        Le fichier est lu ligne par ligne : chaque ligne est validée puis
+        normalisée à la volée, les champs de l'entrée (yarp_model.Route :
+        via, interface, metric, type, nexthops) servant de valeurs par
+        défaut. Une ligne invalide est ignorée, dont une ligne donnant via
+        ou interface pour une entrée à nexthops ; un fichier illisible lève
+        FeedError pour que la réconciliation ne supprime pas les routes
+        qu'il décrivait.
+        """
+        path = entry.file
+        feed_format = entry.format
+        table = entry.table
+        defaults = {
+            'type': entry.type,
+            'via': entry.via,
+            'interface': entry.interface,
+            'metric': entry.metric,
+        }
+        if entry.nexthops:
+            defaults['nexthops'] = [
+                {'via': via, 'interface': dev, 'weight': weight}
+                for via, dev, weight in entry.nexthops
+            ]
+
+        count = invalid = 0
+        try:
+            with open(path, 'r', newline='') as f:
+                records = self._read_csv_feed(f) if feed_format == 'csv' else self._read_text_feed(f)
+                for line_num, fields in records:
+                    route = None
+                    if fields is not None:
+                        route = self._normalize_route(dict(defaults, **fields), table=table)
+                    if route is None:
+                        invalid += 1
+                        if invalid <= FEED_MAX_REPORTED_ERRORS:
+                            self.logger.error(f"{path}:{line_num}: entrée invalide ignorée")
+                        continue
+
+                    count += 1
+                    if count % FEED_PROGRESS_INTERVAL == 0:
+                        self.logger.info(f"{path}: {count} routes lues")
+                    yield route
+        except (IOError, UnicodeDecodeError, csv.Error, FeedError) as e:
+            raise FeedError(f"{path}: {e}")
+
+        self.logger.info(
+            f"Flux {path}: {count} routes, {invalid} lignes invalides ignorées",
+            feed=path, routes=count, invalid=invalid
+        )
+
+    def _read_text_feed(self, f):
+        """Lit un flux texte : un préfixe par ligne.
+
+        Les commentaires (# ou ;) et lignes vides sont ignorés. Génère
+        (numéro de ligne, champs) avec champs à None si la ligne est mal
+        formée.
+        """
+        for line_num, line in enumerate(f, 1):
+            line = re.split(r'[#;]', line, 1)[0].strip()
+            if not line:
+                continue
+            fields = line.split()
+            yield line_num, {'to': fields[0]} if len(fields) == 1 else None
+
+    def _read_csv_feed(self, f):
+        """Lit un flux CSV : to[,via[,interface[,metric[,type]]]].
+
+        Une première ligne commençant par 'to' est un en-tête qui fixe
+        l'ordre des colonnes. Les cellules vides reprennent la valeur par
+        défaut de l'entrée YAML.
+        """
+        columns = FEED_CSV_COLUMNS
+        first = True
+        reader = csv.reader(f)
+        for row in reader:
+            row = [cell.strip() for cell in row]
+            if not row or not row[0] or row[0].startswith('#'):
+                continue
+            header, first = first and row[0].lower() == 'to', False
+            if header:
+                columns = tuple(cell.lower() for cell in row)
+                unknown = set(columns) - set(FEED_CSV_COLUMNS)
+                if unknown:
+                    raise FeedError(f"colonnes inconnues: {', '.join(sorted(unknown))}")
+                continue
+            if len(row) > len(columns):
+                yield reader.line_num, None
+                continue
+            yield reader.line_num, {name: cell for name, cell in zip(columns, row) if cell}
+
+    # ------------------------------------------------------------------ #
+    #  Agrégation des préfixes                                             #
+    # ------------------------------------------------------------------ #
+
+    def aggregate_routes(self, routes):
+        """Regroupe les préfixes contigus partageant le même next-hop.
+
+        Les routes sont groupées par attributs identiques hors destination
+        (famille, via, interface, métrique, next-hops), puis chaque groupe est réduit à l'ensemble minimal de préfixes
+        couvrant exactement les mêmes adresses (collapse_addresses).
+
+        Une fusion n'est retenue que si elle ne change la décision de
+        forwarding d'aucune adresse : elle est refusée lorsqu'une route
+        d'un autre groupe, ou une route du noyau non gérée par YARP, se
+        trouve entre le préfixe agrégé et l'un des préfixes qu'il remplace
+        (longest prefix match). Dans ce cas, les préfixes d'origine sont
+        conservés.
+
+        Retourne la liste des routes agrégées.
+        """
+        groups = {}
+        # (famille, table, adresse réseau, longueur) → groupes possédant ce préfixe
+        index = {}
+        templates = {}
+        for route in routes:
+            group = tuple(sorted((k, v) for k, v in route.items() if k != 'dst'))
+            network = ipaddress.ip_network(route['dst'])
+            groups.setdefault(group, []).append(network)
+            templates.setdefault(group, route)
+            prefix = (route['version'], route['table'], int(network.network_address), network.prefixlen)
+            index.setdefault(prefix, set()).add(group)
+
+        # Routes du noyau non gérées par YARP (connectées, DHCP, baseline) :
+        # un groupe à part, qu'aucune fusion ne doit recouvrir
+        tables = {(route['version'], route['table']) for route in routes}
+        for version, table, network in self._foreign_routes(tables):
+            prefix = (version, table, int(network.network_address), network.prefixlen)
+            index.setdefault(prefix, set()).add(FOREIGN_ROUTE_GROUP)
+
+        aggregated = []
+        for group, networks in groups.items():
+            template = templates[group]
+            networks.sort(key=lambda n: (int(n.network_address), n.prefixlen))
+            position = 0
+
+            for candidate in ipaddress.collapse_addresses(networks):
+                # Préfixes d'origine couverts par le candidat (balayage trié)
+                components = []
+                last = int(candidate.broadcast_address)
+                while position < len(networks) and int(networks[position].network_address) <= last:
+                    components.append(networks[position])
+                    position += 1
+
+                if self._aggregation_is_safe(candidate, components, group, template['table'], index):
+                    kept = [candidate]
+                else:
+                    kept = sorted(set(components), key=lambda n: (int(n.network_address), n.prefixlen))
+
+                for network in kept:
+                    aggregated.append(dict(template, dst=network.with_prefixlen))
+
+        saved = len(routes) - len(aggregated)
+        self.logger.info(
+            f"Agrégation: {len(routes)} routes → {len(aggregated)} "
+            f"({saved} entrées économisées)",
+            routes_before=len(routes), routes_after=len(aggregated), saved=saved
+        )
+        return aggregated
+
+    def _foreign_routes(self, tables):
+        """Génère (famille, table, réseau) des routes du noyau non marquées
+        proto YARP, pour les couples (famille, table) de `tables`.
+
+        Le dump (ip -o, toutes tables) est lu ligne par ligne.
+        """
+        for version in sorted({version for version, _ in tables}):
+            success, stdout, stderr = self._run_command(
+                f"ip -{version} -o route show table all", check=False
+            )
+            if not success:
+                self.logger.warning(f"Impossible de lister les routes IPv{version}: {stderr.strip()}")
+                continue
+            for line in _iter_lines(stdout):
+                entry = self._parse_kernel_route_line(line)
+                if entry is None or entry.get('protocol') == str(YARP_ROUTE_PROTO):
+                    continue
+                route = self._normalize_kernel_route(entry, version)
+                if (version, route['table']) in tables:
+                    yield version, route['table'], ipaddress.ip_network(route['dst'])
+
+    def _aggregation_is_safe(self, candidate, components, group, table, index):
+        """Vérifie qu'une fusion ne change aucune décision de forwarding.
+
+        Pour chaque préfixe d'origine c, aucune route d'un autre groupe ne
+        doit exister avec une longueur comprise entre celle du candidat et
+        celle de c (bornes incluses) sur les adresses de c : elle perdait
+        face à c et gagnerait (ou ferait jeu égal) face au candidat. Seules
+        les routes de la même table sont concernées.
+        """
+        version = candidate.version
+        max_bits = candidate.max_prefixlen
+        for component in components:
+            if component == candidate:
+                continue
+            address = int(component.network_address)
+            for length in range(candidate.prefixlen, component.prefixlen + 1):
+                mask = ((1 << length) - 1) << (max_bits - length)
+                owners = index.get((version, table, address & mask, length))
+                if owners and owners - {group}:
+                    return False
+        return True
+
+    # ------------------------------------------------------------------ #
+    #  Règles de policy routing (ip rule)                                  #
+    # ------------------------------------------------------------------ #
+
+    def _normalize_rule(self, rule, index):
+        """Normalise une règle routing.rules en une règle par famille.
+
+        Une règle sans 'from'/'to' s'applique à IPv4 et IPv6. Sans
+        'priority' (règle unique, imposé par yarp_schema), la priorité est
+        DEFAULT_RULE_PRIORITY.
+        """
+        src = dst = None
+        versions = (4, 6)
+        try:
+            if rule.get('from'):
+                network = ipaddress.ip_network(str(rule['from']), strict=False)
+                src, versions = network.with_prefixlen, (network.version,)
+            if rule.get('to'):
+                network = ipaddress.ip_network(str(rule['to']), strict=False)
+                dst, versions = network.with_prefixlen, (network.version,)
         except ValueError:
-            print(f"Destination invalide: {to}", file=sys.stderr)
+            self.logger.error(f"Règle de routage {index} invalide ignorée")
+            return []
+
+        fwmark = fwmask = None
+        if 'fwmark' in rule:
+            parsed = parse_fwmark(rule['fwmark'])
+            if parsed is None:
+                self.logger.error(f"Règle de routage {index}: fwmark invalide ignorée")
+                return []
+            fwmark, fwmask = parsed[0], parsed[1] if parsed[1] is not None else 0xFFFFFFFF
+
+        return [
+            {
+                'version': version,
+                'priority': rule.get('priority', DEFAULT_RULE_PRIORITY),
+                'src': src,
+                'dst': dst,
+                'fwmark': fwmark,
+                'fwmask': fwmask,
+                'iif': rule.get('iif'),
+                'table': self._table_id(rule['table']),
+            }
+            for version in versions
+        ]
+
+    def _normalize_kernel_rule(self, entry, version):
+        """Normalise une règle issue de `ip -j rule show`"""
+        def prefix(address, length):
+            if not address or address == 'all':
+                return None
+            if length is None:
+                return ipaddress.ip_network(address).with_prefixlen
+            return ipaddress.ip_network(f"{address}/{length}", strict=False).with_prefixlen
+
+        fwmark = fwmask = None
+        if 'fwmark' in entry:
+            fwmark = int(entry['fwmark'], 16)
+            fwmask = int(entry.get('fwmask', '0xffffffff'), 16)
+
+        return {
+            'version': version,
+            'priority': entry.get('priority', 0),
+            'src': prefix(entry.get('src'), entry.get('srclen')),
+            'dst': prefix(entry.get('dst'), entry.get('dstlen')),
+            'fwmark': fwmark,
+            'fwmask': fwmask,
+            'iif': entry.get('iif'),
+            'table': self._table_id(entry.get('table', 'main')),
+        }
+
+    def _rule_key(self, rule):
+        """Clé d'identité d'une règle (tous ses sélecteurs)"""
+        return tuple(rule[field] for field in (
+            'version', 'priority', 'src', 'dst', 'fwmark', 'fwmask', 'iif', 'table'
+        ))
+
+    def _rule_spec(self, rule):
+        """Construit la spécification ip d'une règle normalisée"""
+        spec = f"priority {rule['priority']}"
+        if rule['src']:
+            spec += f" from {rule['src']}"
+        if rule['dst']:
+            spec += f" to {rule['dst']}"
+        if rule['fwmark'] is not None:
+            spec += f" fwmark {rule['fwmark']:#x}/{rule['fwmask']:#x}"
+        if rule['iif']:
+            spec += f" iif {rule['iif']}"
+        return f"{spec} table {rule['table']} protocol {YARP_ROUTE_PROTO}"
+
+    def _rule_family(self, rule):
+        """Préfixe d'affichage de la famille d'une règle"""
+        return "-6 " if rule['version'] == 6 else ""
+
+    def get_owned_rules(self):
+        """Retourne les règles installées par YARP (clé → règle normalisée)"""
+        owned = {}
+        for version, ip_cmd in ((4, "ip"), (6, "ip -6")):
+            success, stdout, stderr = self._run_command(f"{ip_cmd} -j rule show", check=False)
+            if not success:
+                self.logger.warning(f"Impossible de lister les règles IPv{version}: {stderr.strip()}")
+                continue
+            for entry in json.loads(stdout or "[]"):
+                if str(entry.get('protocol')) != str(YARP_ROUTE_PROTO):
+                    continue
+                rule = self._normalize_kernel_rule(entry, version)
+                owned[self._rule_key(rule)] = rule
+        return owned
+
+    def diff_rules(self, current):
+        """Compare les règles désirées avec celles du noyau.
+
+        Une règle modifiée apparaît comme un ajout + une suppression.
+        """
+        remaining = dict(current)
+        diff = {'add': [], 'delete': [], 'unchanged': 0}
+        for index, rule in enumerate(self.rules):
+            for normalized in self._normalize_rule(rule, index):
+                if remaining.pop(self._rule_key(normalized), None) is None:
+                    diff['add'].append(normalized)
+                else:
+                    diff['unchanged'] += 1
+        diff['delete'] = list(remaining.values())
+        return diff
+
+    def write_rt_tables(self):
+        """Déclare les noms des tables YARP pour iproute2 (ip route show table <nom>)"""
+        lines = ["# Généré par YARP - ne pas modifier manuellement"]
+        for name, table in sorted(self.tables.items(), key=lambda item: item[1]['id']):
+            lines.append(f"{table['id']}\t{name}")
+        content = "\n".join(lines) + "\n"
+
+        try:
+            with open(RT_TABLES_FILE, 'r') as f:
+                if f.read() == content:
+                    return True
+        except IOError:
+            pass
+
+        if not self.tables and not os.path.exists(RT_TABLES_FILE):
+            return True
+
+        if self.plan is not None:
+            self.plan.write(RT_TABLES_FILE)
+            return True
+
+        try:
+            os.makedirs(os.path.dirname(RT_TABLES_FILE), exist_ok=True)
+            with open(RT_TABLES_FILE, 'w') as f:
+                f.write(content)
+            self.logger.info(f"{RT_TABLES_FILE} mis à jour ({len(self.tables)} tables)")
+            return True
+        except IOError as e:
+            self.logger.warning(f"Impossible d'écrire {RT_TABLES_FILE}: {e}")
             return False
-        
-        # Construire la commande
-        cmd = f"{ip_cmd} route add {to}"
-        
-        if via:
-            cmd += f" via {via}"
-        
-        if interface:
-            cmd += f" dev {interface}"
-        
-        if metric:
-            cmd += f" metric {metric}"
-        
-        print(f"Ajout de route: {to} {'via ' + via if via else ''} {'dev ' + interface if interface else ''}")
-        
-        success, stdout, stderr = self._run_command(cmd, check=False)
-        
-        if not success and "File exists" not in stderr:
-            print(f"Erreur lors de l'ajout de la route: {stderr}", file=sys.stderr)
+
+    # ------------------------------------------------------------------ #
+    #  Application                                                         #
+    # ------------------------------------------------------------------ #
+
+    def _plan_reconcile(self):
+        """Calcule les changements de routes, règles et objets nexthop.
+
+        Retourne (générateur diff_routes(), diff des règles, nexthops à
+        créer ou remplacer, nexthops obsolètes). Les objets nexthop sont
+        connus dès cet appel : _desired_routes() matérialise les routes
+        quand routing.nexthop_objects est activé.
+        """
+        routes = self.diff_routes(self._desired_routes(), self.get_owned_routes())
+        rules = self.diff_rules(self.get_owned_rules())
+        nh_changes, nh_stale = self.diff_nexthops(self.get_owned_nexthops())
+        return routes, rules, nh_changes, nh_stale
+
+    def _route_delete_line(self, route):
+        """Ligne ip -batch de suppression d'une route du noyau"""
+        dst = route['dst']
+        if route['type'] != 'unicast':
+            dst = f"{route['type']} {dst}"
+        line = f"route del {dst} metric {route['metric']}"
+        if route['table'] != MAIN_TABLE:
+            line += f" table {route['table']}"
+        return f"{line} proto {YARP_ROUTE_PROTO}"
+
+    def _table_writer(self, writers, route):
+        """BatchWriter de la famille et de la table d'une route"""
+        key = (route['version'], route['table'])
+        writer = writers.get(key)
+        if writer is None:
+            writer = writers[key] = BatchWriter(self, route['version'], f"routes table {route['table']}")
+        return writer
+
+    def reconcile_routes(self):
+        """Aligne les routes et règles possédées par YARP sur la configuration.
+
+        Seules les différences sont programmées, par paquets ip -batch
+        (BatchWriter) : objets nexthop, ajouts et modifications de routes
+        d'abord (make-before-break), puis règles, puis suppressions de
+        routes ; enfin nettoyage des objets nexthop qui ne sont plus
+        référencés. Chaque étape est un span de trace, et chaque paquet un
+        span par famille (et par table pour les routes). Les routes
+        désirées sont programmées au fil de l'eau, sans être matérialisées.
+
+        Les ajouts sont programmés par `route replace` : une route absente
+        du dump proto YARP peut exister dans le noyau sans ce marqueur
+        (installée par la configuration de base, ou avec un autre via).
+        replace la reprend, la marque et applique ses attributs, là où
+        `route add` échouerait sur "File exists".
+
+        Si un flux de routes externe est illisible, rien n'est supprimé.
+        """
+        try:
+            routes, rules, nh_changes, nh_stale = self._plan_reconcile()
+        except FeedError as e:
+            # Flux lu en entier avant programmation (agrégation, objets nexthop)
+            self.logger.error(f"Flux de routes illisible, routage inchangé: {e}")
             return False
-        
-        return True
-    
-    def delete_route(self, route):
-        """Supprime une route statique"""
-        to = route.get('to')
-        
-        if not to:
+        failed = 0
+
+        with tracer.span("nexthops", "routing", objects=len(nh_changes)):
+            writers = {4: BatchWriter(self, 4, "nexthops"), 6: BatchWriter(self, 6, "nexthops")}
+            for nh_id, nexthop in nh_changes:
+                writers[nexthop['version']].add(f"nexthop replace {self._nexthop_spec(nh_id, nexthop)}")
+            failed += sum(writer.close() for writer in writers.values())
+
+        counts = {'add': 0, 'change': 0, 'delete': 0, 'unchanged': 0}
+        deleted = []
+        with tracer.span("routes", "routing") as span:
+            writers = {}
+            try:
+                for action, route in routes:
+                    counts[action] += 1
+                    if action in ('add', 'change'):
+                        self._table_writer(writers, route).add(f"route replace {self._route_spec(route)}")
+                    elif action == 'delete':
+                        deleted.append(route)
+            except FeedError as e:
+                self.logger.error(f"Flux de routes illisible, suppressions annulées: {e}")
+                for writer in writers.values():
+                    writer.close()
+                return False
+            failed += sum(writer.close() for writer in writers.values())
+            span.set(added=counts['add'], changed=counts['change'])
+
+        with tracer.span("rules", "routing", added=len(rules['add']), deleted=len(rules['delete'])):
+            writers = {4: BatchWriter(self, 4, "rules"), 6: BatchWriter(self, 6, "rules")}
+            for rule in rules['add']:
+                writers[rule['version']].add(f"rule add {self._rule_spec(rule)}")
+            for rule in rules['delete']:
+                writers[rule['version']].add(f"rule del {self._rule_spec(rule)}")
+            failed += sum(writer.close() for writer in writers.values())
+
+        with tracer.span("route deletions", "routing", routes=len(deleted)):
+            writers = {}
+            for route in deleted:
+                self._table_writer(writers, route).add(self._route_delete_line(route))
+            failed += sum(writer.close() for writer in writers.values())
+
+        with tracer.span("nexthop cleanup", "routing", objects=len(nh_stale)):
+            failed += self._run_batch([f"nexthop del id {nh_id}" for nh_id in nh_stale])
+
+        self.logger.info(
+            f"Routes: {counts['add']} ajoutées, {counts['change']} modifiées, "
+            f"{counts['delete']} supprimées, {counts['unchanged']} inchangées",
+            added=counts['add'], changed=counts['change'],
+            deleted=counts['delete'], unchanged=counts['unchanged']
+        )
+        if rules['add'] or rules['delete']:
+            self.logger.info(
+                f"Règles: {len(rules['add'])} ajoutées, {len(rules['delete'])} supprimées, "
+                f"{rules['unchanged']} inchangées"
+            )
+        if nh_changes or nh_stale:
+            self.logger.info(
+                f"Objets nexthop: {len(nh_changes)} créés/modifiés, {len(nh_stale)} supprimés"
+            )
+        return failed == 0
+
+    def show_diff(self):
+        """Affiche les changements qu'appliquerait reconcile_routes()"""
+        try:
+            routes, rules, nh_changes, nh_stale = self._plan_reconcile()
+        except FeedError as e:
+            print(f"Erreur: flux de routes illisible: {e}", file=sys.stderr)
             return False
-        
+
+        for nh_id, nexthop in nh_changes:
+            print(f"~ nexthop {self._nexthop_spec(nh_id, nexthop)}")
+
+        counts = {'add': 0, 'change': 0, 'delete': 0, 'unchanged': 0}
+        deleted = []
         try:
-            network = ipaddress.ip_network(to, strict=False)
-            ip_cmd = "ip" if network.version == 4 else "ip -6"
-        except ValueError:
+            for action, route in routes:
+                counts[action] += 1
+                if action == 'add':
+                    print(f"+ {self._route_spec(route)}")
+                elif action == 'change':
+                    print(f"~ {self._route_spec(route)}")
+                elif action == 'delete':
+                    deleted.append(route)
+        except FeedError as e:
+            print(f"Erreur: flux de routes illisible: {e}", file=sys.stderr)
             return False
-        
-        cmd = f"{ip_cmd} route del {to}"
-        return self._run_command(cmd, check=False)[0]
-    
+
+        for rule in rules['add']:
+            print(f"+ {self._rule_family(rule)}rule {self._rule_spec(rule)}")
+        for rule in rules['delete']:
+            print(f"- {self._rule_family(rule)}rule {self._rule_spec(rule)}")
+        for route in deleted:
+            print(f"- {self._route_spec(route)}")
+        for nh_id in nh_stale:
+            print(f"- nexthop id {nh_id}")
+        print(f"\n{counts['add']} à ajouter, {counts['change']} à modifier, "
+              f"{counts['delete']} à supprimer, {counts['unchanged']} inchangées")
+        print(f"Règles: {len(rules['add'])} à ajouter, {len(rules['delete'])} à supprimer, "
+              f"{rules['unchanged']} inchangées")
+        return True
+
+    def flush_routes(self, table="all"):
+        """Supprime les routes et règles YARP ainsi que les objets nexthop YARP"""
+        print(f"Nettoyage des routes YARP (table {table})")
+        for ip_cmd in ("ip", "ip -6"):
+            self._run_command(
+                f"{ip_cmd} route flush table {table} proto {YARP_ROUTE_PROTO}",
+                check=False
+            )
+
+        rules = self.get_owned_rules().values()
+        for version in (4, 6):
+            self._run_batch(
+                [f"rule del {self._rule_spec(rule)}" for rule in rules if rule['version'] == version],
+                ipv6=(version == 6)
+            )
+
+        current = self.get_owned_nexthops()
+        stale = sorted(current, key=lambda nh_id: current[nh_id]['group'] is None)
+        self._run_batch([f"nexthop del id {nh_id}" for nh_id in stale])
+
     def show_routes(self, ipv6=False):
         """Affiche les routes"""
         cmd = "ip -6 route" if ipv6 else "ip route"
@@ -107,30 +1217,20 @@ class RoutingManager:
         if success:
             print(stdout)
         return success
-    
+
     def apply_static_routes(self):
-        """Applique toutes les routes statiques"""
+        """Applique toutes les routes statiques (réconciliation avec le noyau)"""
         print("\n" + "="*50)
         print("Configuration des routes statiques")
         print("="*50)
-        
-        if not self.static_routes:
-            print("Aucune route statique à configurer")
-            return True
-        
-        success_count = 0
-        total_count = len(self.static_routes)
-        
-        for route in self.static_routes:
-            if self.add_route(route):
-                success_count += 1
-        
-        print(f"\n{success_count}/{total_count} routes configurées")
-        return success_count == total_count
-    
+
+        # Même sans route configurée, la réconciliation supprime les
+        # routes YARP retirées du YAML
+        return self.reconcile_routes()
+
     def apply_all(self):
         """Applique toute la configuration de routage"""
-        # Pour l'instant, seulement les routes statiques
+        self.write_rt_tables()
         return self.apply_static_routes()
 
 def main():
@@ -141,13 +1241,15 @@ def main():
         print("Usage: routing.py <config_file> [command]")
         print("   ou: routing.py <command>")
         print("Commands:")
-        print("  apply      - Appliquer les routes")
+        print("  apply      - Appliquer les routes (réconciliation)")
+        print("  diff       - Afficher les changements sans les appliquer")
+        print("  flush      - Supprimer toutes les routes YARP")
         print("  show       - Afficher les routes IPv4")
         print("  show6      - Afficher les routes IPv6")
         sys.exit(1)
 
-    # Cas 1: routing.py apply/show/show6 (utilise config par défaut)
-    if sys.argv[1] in ["apply", "show", "show6"]:
+    # Cas 1: routing.py apply/diff/flush/show/show6 (utilise config par défaut)
+    if sys.argv[1] in ["apply", "diff", "flush", "show", "show6"]:
         config_file = "/etc/yarp/config.yaml"
         command = sys.argv[1]
     # Cas 2: routing.py <config_file> [command]
@@ -166,6 +1268,11 @@ def main():
             sys.exit(0)
         else:
             sys.exit(1)
+    elif command == "diff":
+        if not manager.show_diff():
+            sys.exit(1)
+    elif command == "flush":
+        manager.flush_routes()
     elif command == "show":
         manager.show_routes(ipv6=False)
     elif command == "show6":
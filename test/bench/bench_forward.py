@@ -0,0 +1,446 @@
+#!/usr/bin/env python3
+"""
+Benchmark de forwarding (débit et latence) en namespaces réseau
+
+Construit une topologie client ↔ routeur ↔ serveur (paires veth dans
+trois namespaces), applique une configuration YARP au namespace routeur
+(modules network, routing, nat, firewall) puis envoie du trafic UDP du
+client au serveur avec un générateur local. Chaque paquet porte son
+numéro et son heure d'émission (horloge monotone, commune aux
+namespaces) : le serveur en déduit le débit, les pertes et la latence.
+
+Les mesures sont répétées pour chaque combinaison de taille de ruleset
+(règles firewall traversées par chaque paquet), de backend iptables et
+de mode NAT. Nécessite root et iproute2, aucun matériel particulier.
+
+Usage: bench_forward.py [--rules 0,100,1000] [--backends system,legacy,nft]
+                        [--nat off,on] [--duration S] [--rate PPS]
+                        [--streams N] [--size OCTETS] [-o résultats.json]
+"""
+
+import argparse
+import array
+import json
+import os
+import platform
+import shutil
+import signal
+import socket
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SRC_DIR = os.path.join(BENCH_DIR, '..', '..', 'src')
+
+# Adressage : LAN client 10.10.0.0/24, WAN serveur 192.0.2.0/24
+CLIENT_ADDRESS = "10.10.0.2"
+ROUTER_LAN = "10.10.0.1/24"
+ROUTER_WAN = "192.0.2.1/24"
+SERVER_ADDRESS = "192.0.2.2"
+PORT = 9000
+
+# En-tête des paquets : numéro de séquence, heure d'émission (ns)
+HEADER = struct.Struct('!QQ')
+# Taille des en-têtes IPv4 + UDP, pour le débit au niveau IP
+IP_UDP_HEADERS = 28
+
+# Fin de réception : aucun paquet depuis IDLE_TIMEOUT secondes
+IDLE_TIMEOUT = 1.0
+
+
+def run(cmd, check=True):
+    """Exécute une commande de mise en place (argv) ; lève en cas d'échec"""
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if check and result.returncode != 0:
+        raise RuntimeError(f"{' '.join(cmd)}: {result.stderr.strip()}")
+    return result
+
+
+def percentile(values, fraction):
+    """Percentile d'une liste triée"""
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+# ---------------------------------------------------------------------- #
+#  Topologie                                                              #
+# ---------------------------------------------------------------------- #
+
+class Topology:
+    """Trois namespaces reliés par deux paires veth.
+
+    client:eth0 (10.10.0.2) ↔ routeur:lan0 | routeur:wan0 ↔ serveur:eth0
+    (192.0.2.2). Les adresses du routeur sont posées par YARP.
+    """
+
+    def __init__(self):
+        prefix = f"yarpb{os.getpid()}"
+        self.client = f"{prefix}-client"
+        self.router = f"{prefix}-router"
+        self.server = f"{prefix}-server"
+
+    def exec_argv(self, netns, argv):
+        return ["ip", "netns", "exec", netns] + argv
+
+    def create(self):
+        for netns in (self.client, self.router, self.server):
+            run(["ip", "netns", "add", netns])
+            run(self.exec_argv(netns, ["ip", "link", "set", "lo", "up"]))
+
+        run(["ip", "link", "add", "lan0", "netns", self.router, "type", "veth",
+             "peer", "name", "eth0", "netns", self.client])
+        run(["ip", "link", "add", "wan0", "netns", self.router, "type", "veth",
+             "peer", "name", "eth0", "netns", self.server])
+
+        client = lambda *argv: run(self.exec_argv(self.client, list(argv)))
+        client("ip", "addr", "add", f"{CLIENT_ADDRESS}/24", "dev", "eth0")
+        client("ip", "link", "set", "eth0", "up")
+        client("ip", "route", "add", "default", "via", ROUTER_LAN.split('/')[0])
+
+        server = lambda *argv: run(self.exec_argv(self.server, list(argv)))
+        server("ip", "addr", "add", f"{SERVER_ADDRESS}/24", "dev", "eth0")
+        server("ip", "link", "set", "eth0", "up")
+        # Retour vers le LAN sans NAT
+        server("ip", "route", "add", "10.10.0.0/24", "via", ROUTER_WAN.split('/')[0])
+
+        # Sans masquerading, le module NAT n'active pas le forwarding
+        run(self.exec_argv(self.router, ["sysctl", "-qw", "net.ipv4.ip_forward=1"]))
+
+    def destroy(self):
+        for netns in (self.client, self.router, self.server):
+            run(["ip", "netns", "del", netns], check=False)
+
+
+# ---------------------------------------------------------------------- #
+#  Configuration YARP du routeur                                          #
+# ---------------------------------------------------------------------- #
+
+def router_config(rules, nat, workdir):
+    """Configuration du routeur : `rules` règles firewall que le trafic de
+    test traverse sans les déclencher, puis la règle qui l'autorise"""
+    masquerade = ", masquerading: true, masquerade_sources: [10.10.0.0/24]" if nat else ""
+    lines = [
+        "system:\n",
+        "  hostname: bench-router\n",
+        "interfaces:\n",
+        f"  lan0: {{ipv4: {ROUTER_LAN}}}\n",
+        f"  wan0: {{ipv4: {ROUTER_WAN}{masquerade}}}\n",
+        "logging:\n",
+        "  level: WARNING\n",
+        "  files:\n",
+        f"    application: {workdir}/apply.log\n",
+        f"    error: {workdir}/error.log\n",
+    ]
+    if rules:
+        lines.append("firewall:\n  stateful: true\n  default: {input: accept, forward: drop, output: accept}\n  rules:\n")
+        for index in range(rules):
+            a, b = (index >> 8) & 0xFF, index & 0xFF
+            lines.append(
+                f"    - {{name: f{index}, chain: forward, action: drop, "
+                f"source: 172.{16 + (index >> 16)}.{a}.{b}, protocols: {{udp: {PORT}}}}}\n"
+            )
+        lines.append(
+            "    - {name: bench, chain: forward, action: accept, in_interface: lan0, "
+            f"out_interface: wan0, protocols: {{udp: {PORT}}}}}\n"
+        )
+    return "".join(lines)
+
+
+def backend_path(backend, workdir):
+    """Répertoire à placer en tête du PATH pour que `iptables` désigne le
+    backend demandé (None : iptables du système)"""
+    if backend == 'system':
+        return None
+    directory = os.path.join(workdir, f"bin-{backend}")
+    os.makedirs(directory, exist_ok=True)
+    for program in ('iptables', 'ip6tables'):
+        target = shutil.which(f"{program}-{backend}")
+        if target is None:
+            raise RuntimeError(f"{program}-{backend} introuvable")
+        link = os.path.join(directory, program)
+        if not os.path.lexists(link):
+            os.symlink(target, link)
+    return directory
+
+
+def apply_in_netns(config_file, workdir):
+    """Applique la configuration (exécuté dans le namespace routeur)"""
+    sys.path.insert(0, os.path.join(SRC_DIR, 'core'))
+    sys.path.insert(0, os.path.join(SRC_DIR, 'modules'))
+    import yarp_config
+    import routing
+    from network import NetworkManager
+    from nat import NATManager
+    from firewall import FirewallManager
+
+    # Fichiers d'état du système hôte laissés intacts
+    yarp_config.CONFIG_CACHE_DIR = os.path.join(workdir, "config-cache")
+    routing.RT_TABLES_FILE = os.path.join(workdir, "rt_tables.conf")
+
+    config = yarp_config.YARPConfig(config_file)
+    if not config.load() or not config.validate():
+        return False
+    for manager_class in (NetworkManager, routing.RoutingManager, NATManager, FirewallManager):
+        if not manager_class(config).apply_all():
+            print(f"Échec de {manager_class.__name__}", file=sys.stderr)
+            return False
+    return True
+
+
+# ---------------------------------------------------------------------- #
+#  Générateur de trafic                                                   #
+# ---------------------------------------------------------------------- #
+
+def send(duration, rate, size):
+    """Envoie des paquets UDP pendant `duration` s (rate pps, 0 : au
+    maximum) ; affiche le nombre envoyé (JSON)"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.connect((SERVER_ADDRESS, PORT))
+    payload = bytearray(max(size, HEADER.size))
+    sent = errors = 0
+    start = time.monotonic_ns()
+    end = start + int(duration * 1e9)
+    interval = int(1e9 / rate) if rate else 0
+    next_send = start
+    while True:
+        now = time.monotonic_ns()
+        if now >= end:
+            break
+        if interval:
+            if now < next_send:
+                time.sleep((next_send - now) / 1e9)
+                now = time.monotonic_ns()
+            next_send += interval
+        HEADER.pack_into(payload, 0, sent, now)
+        try:
+            sock.send(payload)
+            sent += 1
+        except OSError:
+            # File d'émission pleine (ENOBUFS) : paquet non envoyé
+            errors += 1
+    print(json.dumps({'sent': sent, 'errors': errors}))
+
+
+def receive(duration, latency_file):
+    """Reçoit jusqu'à IDLE_TIMEOUT s sans paquet (au plus duration + 5 s) ;
+    écrit les latences (ns) dans `latency_file` et affiche les compteurs"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 8 * 1024 * 1024)
+    sock.bind(("0.0.0.0", PORT))
+    sock.settimeout(IDLE_TIMEOUT)
+    print("ready", flush=True)
+
+    buffer = bytearray(65535)
+    latencies = array.array('q')
+    received = octets = 0
+    first = last = None
+    deadline = time.monotonic() + duration + 5
+    while time.monotonic() < deadline:
+        try:
+            length = sock.recv_into(buffer)
+        except socket.timeout:
+            if received:
+                break
+            continue
+        now = time.monotonic_ns()
+        if length < HEADER.size:
+            continue
+        _, sent_at = HEADER.unpack_from(buffer)
+        latencies.append(now - sent_at)
+        received += 1
+        octets += length
+        first = first or now
+        last = now
+
+    with open(latency_file, 'wb') as f:
+        latencies.tofile(f)
+    print(json.dumps({'received': received, 'octets': octets, 'first': first, 'last': last}))
+
+
+# ---------------------------------------------------------------------- #
+#  Mesure                                                                 #
+# ---------------------------------------------------------------------- #
+
+class Bench:
+    """Mesures de forwarding pour chaque combinaison demandée"""
+
+    def __init__(self, args, workdir):
+        self.args = args
+        self.workdir = workdir
+
+    def _helper(self, netns, *argv, env=None):
+        return subprocess.Popen(
+            ["ip", "netns", "exec", netns, sys.executable, os.path.abspath(__file__)] + list(argv),
+            stdout=subprocess.PIPE, stderr=subprocess.STDOUT if argv[0] == "_apply" else None,
+            text=True, env=env,
+        )
+
+    def apply(self, topology, rules, backend, nat):
+        config_file = os.path.join(self.workdir, f"router-{rules}-{backend}-{nat}.yaml")
+        with open(config_file, 'w') as f:
+            f.write(router_config(rules, nat, self.workdir))
+        # Sortie non bufferisée : logs et messages d'échec dans l'ordre
+        env = dict(os.environ, PYTHONUNBUFFERED="1")
+        directory = backend_path(backend, self.workdir)
+        if directory:
+            env['PATH'] = f"{directory}:{env.get('PATH', '')}"
+        start = time.monotonic()
+        process = self._helper(topology.router, "_apply", config_file, self.workdir, env=env)
+        output = process.communicate()[0]
+        if process.returncode != 0:
+            errors = [
+                line for line in output.splitlines()
+                if any(word in line for word in ("ERROR", "échouée", "Échec"))
+            ]
+            raise RuntimeError(f"apply YARP: {errors[0] if errors else 'échec'}")
+        return int((time.monotonic() - start) * 1000)
+
+    def traffic(self, topology):
+        """Lance récepteurs puis émetteurs ; retourne les mesures agrégées"""
+        args = self.args
+        receivers = []
+        for index in range(args.streams):
+            latency_file = os.path.join(self.workdir, f"latency-{index}.bin")
+            process = self._helper(topology.server, "_receive", str(args.duration), latency_file)
+            if process.stdout.readline().strip() != "ready":
+                raise RuntimeError("Récepteur non démarré")
+            receivers.append((process, latency_file))
+
+        rate = args.rate // args.streams if args.rate else 0
+        senders = [
+            self._helper(topology.client, "_send", str(args.duration), str(rate), str(args.size))
+            for _ in range(args.streams)
+        ]
+        sent = errors = 0
+        for process in senders:
+            counters = json.loads(process.communicate()[0])
+            sent += counters['sent']
+            errors += counters['errors']
+
+        received = octets = 0
+        first, last = [], []
+        latencies = array.array('q')
+        for process, latency_file in receivers:
+            counters = json.loads(process.communicate()[0])
+            received += counters['received']
+            octets += counters['octets']
+            if counters['first']:
+                first.append(counters['first'])
+                last.append(counters['last'])
+            with open(latency_file, 'rb') as f:
+                latencies.frombytes(f.read())
+
+        elapsed = (max(last) - min(first)) / 1e9 if first and max(last) > min(first) else 0
+        ordered = sorted(latencies)
+        return {
+            'sent': sent,
+            'send_errors': errors,
+            'received': received,
+            'loss_pct': round(100 * (sent - received) / sent, 2) if sent else None,
+            'pps': int(received / elapsed) if elapsed else 0,
+            'mbps': round((octets + received * IP_UDP_HEADERS) * 8 / elapsed / 1e6, 1) if elapsed else 0,
+            'latency_us': {
+                name: round(percentile(ordered, fraction) / 1000, 1) if ordered else None
+                for name, fraction in (('p50', 0.5), ('p90', 0.9), ('p99', 0.99), ('max', 1.0))
+            },
+        }
+
+    def case(self, rules, backend, nat):
+        """Une mesure sur une topologie neuve"""
+        topology = Topology()
+        try:
+            topology.create()
+            apply_ms = self.apply(topology, rules, backend, nat)
+            result = {'rules': rules, 'backend': backend, 'nat': nat, 'apply_ms': apply_ms}
+            result.update(self.traffic(topology))
+            return result
+        finally:
+            topology.destroy()
+
+
+def print_result(result):
+    latency = result['latency_us']
+    print(f"  {result['rules']:>6} {result['backend']:<7} {'on' if result['nat'] else 'off':<4} "
+          f"{result['pps']:>9} {result['mbps']:>8} {result['loss_pct']:>6} "
+          f"{latency['p50']:>8} {latency['p90']:>8} {latency['p99']:>8}")
+
+
+def parse_list(value, convert=str):
+    return [convert(item.strip()) for item in value.split(",") if item.strip()]
+
+
+def main():
+    # Cas 1: rôles internes, exécutés dans un namespace par le benchmark
+    if len(sys.argv) > 1 and sys.argv[1] == "_apply":
+        sys.exit(0 if apply_in_netns(sys.argv[2], sys.argv[3]) else 1)
+    if len(sys.argv) > 1 and sys.argv[1] == "_send":
+        send(float(sys.argv[2]), int(sys.argv[3]), int(sys.argv[4]))
+        return
+    if len(sys.argv) > 1 and sys.argv[1] == "_receive":
+        receive(float(sys.argv[2]), sys.argv[3])
+        return
+
+    # Cas 2: benchmark
+    parser = argparse.ArgumentParser(description="Benchmark de forwarding YARP (namespaces réseau)")
+    parser.add_argument('--rules', default="0,100,1000", help="tailles de ruleset (défaut: 0,100,1000)")
+    parser.add_argument('--backends', default="system",
+                        help="backends iptables : system, legacy, nft (défaut: system)")
+    parser.add_argument('--nat', default="off,on", help="modes NAT : off, on (défaut: off,on)")
+    parser.add_argument('--duration', type=float, default=5, help="durée d'émission par mesure (s, défaut: 5)")
+    parser.add_argument('--rate', type=int, default=0, help="débit demandé en pps (défaut: 0, au maximum)")
+    parser.add_argument('--streams', type=int, default=1, help="flux UDP parallèles (défaut: 1)")
+    parser.add_argument('--size', type=int, default=64, help="taille de la charge UDP en octets (défaut: 64)")
+    parser.add_argument('-o', '--output', help="fichier de résultats JSON")
+    args = parser.parse_args()
+
+    if os.geteuid() != 0:
+        print("Erreur: les namespaces réseau nécessitent root", file=sys.stderr)
+        sys.exit(1)
+
+    cases = [
+        (rules, backend, nat == "on")
+        for backend in parse_list(args.backends)
+        for nat in parse_list(args.nat)
+        for rules in parse_list(args.rules, int)
+    ]
+
+    results = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'hostname': socket.gethostname(),
+        'kernel': platform.release(),
+        'parameters': {'duration': args.duration, 'rate': args.rate, 'streams': args.streams, 'size': args.size},
+        'cases': [],
+    }
+
+    # Interruption : nettoyer les namespaces comme en fin normale
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(1))
+    print(f"  {'règles':>6} {'backend':<7} {'nat':<4} {'pps':>9} {'Mbit/s':>8} {'perte%':>6} "
+          f"{'p50 µs':>8} {'p90 µs':>8} {'p99 µs':>8}")
+    failed = False
+    with tempfile.TemporaryDirectory(prefix="yarp-forward-") as workdir:
+        bench = Bench(args, workdir)
+        for rules, backend, nat in cases:
+            try:
+                result = bench.case(rules, backend, nat)
+            except RuntimeError as e:
+                print(f"  {rules:>6} {backend:<7} {'on' if nat else 'off':<4} échec: {e}", file=sys.stderr)
+                results['cases'].append({'rules': rules, 'backend': backend, 'nat': nat, 'error': str(e)})
+                failed = True
+                continue
+            results['cases'].append(result)
+            print_result(result)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+        print(f"\nRésultats écrits dans {args.output}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
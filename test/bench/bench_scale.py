@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+Benchmark de montée en charge
+
+Pour chaque scénario (configuration synthétique de gen_config.py), mesure
+le chargement et la validation de la configuration, puis, pour chaque
+manager (network, routing, nat, firewall), la compilation (mode plan) et
+l'apply contre un exécuteur factice : aucune commande n'est lancée, ni
+root ni réseau ne sont nécessaires. Un second passage sous tracemalloc
+relève le pic mémoire de chaque étape.
+
+Les résultats sont écrits en JSON ; avec --baseline, le code de sortie
+est 1 si une étape régresse au-delà de --max-regression.
+
+Usage: bench_scale.py [--scenarios a,b] [--runs N] [-o résultats.json]
+                      [--baseline référence.json] [--max-regression PCT]
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import socket
+import sys
+import tempfile
+import time
+import tracemalloc
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SRC_DIR = os.path.join(BENCH_DIR, '..', '..', 'src')
+sys.path.insert(0, os.path.join(SRC_DIR, 'core'))
+sys.path.insert(0, os.path.join(SRC_DIR, 'modules'))
+sys.path.insert(0, BENCH_DIR)
+
+import yarp_config
+import routing
+from yarp_exec import executor
+from yarp_plan import Plan
+from network import NetworkManager
+from routing import RoutingManager
+from nat import NATManager
+from firewall import FirewallManager
+from gen_config import generate
+
+# name: (interfaces, règles firewall, routes, sources masqueradées)
+SCENARIOS = {
+    'small': (10, 100, 100, 10),
+    'medium': (50, 5000, 10000, 100),
+    'large': (200, 20000, 50000, 500),
+    'xlarge': (500, 50000, 100000, 2000),
+}
+
+MANAGERS = (
+    ('network', NetworkManager),
+    ('routing', RoutingManager),
+    ('nat', NATManager),
+    ('firewall', FirewallManager),
+)
+
+# Étapes trop courtes pour être comparées d'une exécution à l'autre
+MIN_COMPARED_MS = 20
+
+
+def stub_runner(argv, input=None, timeout=None):
+    """Exécuteur factice : toute commande réussit, les lectures ip -j
+    retournent un état vide (rien à supprimer, tout à créer)"""
+    if '-j' in argv:
+        return 0, "[]", ""
+    return 0, "", ""
+
+
+class Scenario:
+    """Configuration synthétique écrite dans un répertoire temporaire
+    (logs et cache de validation compris)"""
+
+    def __init__(self, name, interfaces, rules, routes, nat_sources, workdir):
+        self.name = name
+        self.sizes = {
+            'interfaces': interfaces,
+            'firewall_rules': rules,
+            'routes': routes,
+            'nat_sources': nat_sources,
+        }
+        self.config_file = os.path.join(workdir, f"{name}.yaml")
+        with open(self.config_file, 'w') as f:
+            generate(rules, routes, f, interfaces, nat_sources)
+            f.write(
+                "logging:\n"
+                "  level: WARNING\n"
+                "  files:\n"
+                f"    application: {workdir}/apply.log\n"
+                f"    error: {workdir}/error.log\n"
+                "  modules: {network: WARNING, routing: WARNING, dns: WARNING, firewall: WARNING}\n"
+            )
+        self.cache_dir = os.path.join(workdir, f"cache-{name}")
+
+    def load(self):
+        """Chargement sans cache (fichier YAML analysé à chaque fois)"""
+        yarp_config.CONFIG_CACHE_DIR = os.path.join(self.cache_dir, str(time.perf_counter_ns()))
+        config = yarp_config.YARPConfig(self.config_file)
+        if not config.load():
+            raise RuntimeError(f"{self.config_file}: chargement impossible")
+        return config
+
+
+def stages(scenario):
+    """Étapes mesurées : [(nom, préparation, exécution)].
+
+    La préparation (non chronométrée) repart d'un état propre :
+    configuration rechargée, manager neuf. L'exécution reçoit son
+    résultat et retourne le nombre d'opérations produites.
+    """
+    state = {}
+
+    def validate(config):
+        if not config.validate(report=False):
+            raise RuntimeError(f"{scenario.config_file}: configuration invalide")
+        state['config'] = config
+        return len(config.diagnostics)
+
+    def compile_with(manager_class):
+        def prepare():
+            manager = manager_class(state['config'])
+            manager.plan = Plan()
+            return manager
+
+        def run(manager):
+            manager.apply_all()
+            return sum(operation.count for operation in manager.plan.operations())
+        return prepare, run
+
+    def apply_with(manager_class):
+        def run(manager):
+            commands = []
+            executor.add_hook(commands.append)
+            try:
+                manager.apply_all()
+            finally:
+                executor.remove_hook(commands.append)
+            return len(commands)
+        return lambda: manager_class(state['config']), run
+
+    steps = [
+        ('load', lambda: None, lambda _: len(scenario.load().fragments)),
+        ('validate', scenario.load, validate),
+    ]
+    for name, manager_class in MANAGERS:
+        steps.append((f"{name}.compile", *compile_with(manager_class)))
+        steps.append((f"{name}.apply", *apply_with(manager_class)))
+    return steps
+
+
+def measure(scenario, runs):
+    """Meilleure durée de chaque étape, puis pic mémoire sous tracemalloc"""
+    results = {}
+    for name, prepare, run in stages(scenario):
+        best = None
+        for _ in range(runs):
+            arg = prepare()
+            start = time.perf_counter()
+            operations = run(arg)
+            duration = (time.perf_counter() - start) * 1000
+            best = duration if best is None else min(best, duration)
+        results[name] = {'ms': round(best, 1), 'operations': operations}
+
+    # tracemalloc ralentit l'exécution : passage séparé, non chronométré
+    tracemalloc.start()
+    try:
+        for name, prepare, run in stages(scenario):
+            arg = prepare()
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+            run(arg)
+            results[name]['peak_kb'] = (tracemalloc.get_traced_memory()[1] - base) // 1024
+    finally:
+        tracemalloc.stop()
+    return results
+
+
+def compare(results, baseline, max_regression):
+    """Étapes plus lentes que la référence : [(scénario, étape, ms, ms ref)]"""
+    regressions = []
+    for name, scenario in results['scenarios'].items():
+        reference = baseline.get('scenarios', {}).get(name)
+        if reference is None or reference.get('sizes') != scenario['sizes']:
+            continue
+        for stage, values in scenario['stages'].items():
+            previous = reference['stages'].get(stage)
+            if previous is None or max(values['ms'], previous['ms']) < MIN_COMPARED_MS:
+                continue
+            if values['ms'] > previous['ms'] * (1 + max_regression / 100):
+                regressions.append((name, stage, values['ms'], previous['ms']))
+    return regressions
+
+
+def print_results(results):
+    for name, scenario in results['scenarios'].items():
+        sizes = scenario['sizes']
+        print(f"\n{name}: {sizes['interfaces']} interfaces, {sizes['firewall_rules']} règles, "
+              f"{sizes['routes']} routes, {sizes['nat_sources']} sources NAT")
+        print(f"  {'étape':<18} {'ms':>9} {'opérations':>11} {'pic Ko':>9}")
+        for stage, values in scenario['stages'].items():
+            print(f"  {stage:<18} {values['ms']:>9.1f} {values['operations']:>11} {values['peak_kb']:>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de montée en charge YARP")
+    parser.add_argument('--scenarios', default=",".join(SCENARIOS),
+                        help=f"scénarios à mesurer (défaut: {','.join(SCENARIOS)})")
+    parser.add_argument('--runs', type=int, default=1, help="nombre de mesures (meilleure retenue)")
+    parser.add_argument('-o', '--output', help="fichier de résultats JSON")
+    parser.add_argument('--baseline', help="résultats de référence (JSON) à comparer")
+    parser.add_argument('--max-regression', type=float, default=25,
+                        help="ralentissement toléré par étape, en %% (défaut: 25)")
+    args = parser.parse_args()
+
+    names = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        print(f"Scénario inconnu: {', '.join(unknown)} (disponibles: {', '.join(SCENARIOS)})", file=sys.stderr)
+        sys.exit(1)
+
+    results = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'hostname': socket.gethostname(),
+        'python': platform.python_version(),
+        'scenarios': {},
+    }
+
+    with tempfile.TemporaryDirectory(prefix="yarp-bench-") as workdir:
+        routing.RT_TABLES_FILE = os.path.join(workdir, "rt_tables.conf")
+        executor.use(stub_runner)
+        for name in names:
+            print(f"Scénario {name}...", file=sys.stderr)
+            scenario = Scenario(name, *SCENARIOS[name], workdir)
+            # Sortie des managers (print, console) écartée pendant les mesures
+            with contextlib.redirect_stdout(io.StringIO()):
+                stages_results = measure(scenario, args.runs)
+            results['scenarios'][name] = {'sizes': scenario.sizes, 'stages': stages_results}
+
+    print_results(results)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+        print(f"\nRésultats écrits dans {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.max_regression)
+        if regressions:
+            print(f"\nRégressions (> {args.max_regression:g} %) :")
+            for name, stage, value, previous in regressions:
+                print(f"  {name} {stage}: {value:.1f} ms (référence {previous:.1f} ms)")
+            sys.exit(1)
+        print(f"\nAucune régression au-delà de {args.max_regression:g} % par rapport à {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
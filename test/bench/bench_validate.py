@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Benchmark de la validation de configuration
+
+Génère une configuration synthétique (gen_config.py), puis mesure le
+chargement YAML, la validation par le schéma et la construction du
+modèle typé (complet, et interfaces seules comme après une reprise du
+cache). Le code de sortie est 1 si la validation dépasse le budget.
+
+Usage: bench_validate.py [--rules N] [--routes N] [--runs N] [--max-ms N] [config_file]
+"""
+
+import argparse
+import io
+import os
+import sys
+import time
+
+import yaml
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, '..', '..', 'src', 'core'))
+sys.path.insert(0, BENCH_DIR)
+
+import yarp_schema
+from yarp_model import build_model
+from gen_config import generate
+
+
+def best_of(runs, func):
+    """Meilleure durée (ms) de `runs` exécutions, et le dernier résultat"""
+    best, result = None, None
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = func()
+        duration = (time.perf_counter() - start) * 1000
+        best = duration if best is None else min(best, duration)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de la validation YARP")
+    parser.add_argument('config_file', nargs='?', help="configuration à valider (défaut: synthétique)")
+    parser.add_argument('--rules', type=int, default=50000, help="règles firewall générées")
+    parser.add_argument('--routes', type=int, default=20000, help="routes statiques générées")
+    parser.add_argument('--runs', type=int, default=3, help="nombre de mesures (meilleure retenue)")
+    parser.add_argument('--max-ms', type=float, default=1000, help="budget de la validation (ms)")
+    args = parser.parse_args()
+
+    if args.config_file:
+        with open(args.config_file, 'rb') as f:
+            source = f.read()
+        label = args.config_file
+    else:
+        buffer = io.StringIO()
+        generate(args.rules, args.routes, buffer)
+        source = buffer.getvalue().encode()
+        label = f"synthétique ({args.rules} règles, {args.routes} routes)"
+
+    load_ms, config = best_of(1, lambda: yaml.load(source, Loader=yarp_schema.SafeLoader))
+    validate_ms, diagnostics = best_of(args.runs, lambda: yarp_schema.validate(config))
+    if yarp_schema.has_errors(diagnostics):
+        print(f"Configuration invalide ({len(diagnostics)} diagnostics) :", file=sys.stderr)
+        for diagnostic in diagnostics[:20]:
+            print(f"  - {diagnostic}", file=sys.stderr)
+        sys.exit(1)
+    model_ms, _ = best_of(args.runs, lambda: build_model(config))
+    # Reprise du cache : un module ne construit que les sections qu'il lit
+    interfaces_ms, _ = best_of(args.runs, lambda: build_model(config, lazy=True).interfaces)
+
+    print(f"Configuration : {label}")
+    print(f"  chargement YAML : {load_ms:8.1f} ms")
+    print(f"  validation      : {validate_ms:8.1f} ms (budget {args.max_ms:.0f} ms)")
+    print(f"  modèle          : {model_ms:8.1f} ms")
+    print(f"  interfaces      : {interfaces_ms:8.1f} ms (modèle repris du cache)")
+
+    sys.exit(0 if validate_ms <= args.max_ms else 1)
+
+
+if __name__ == "__main__":
+    main()
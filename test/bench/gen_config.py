@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Génère une configuration YARP synthétique de grande taille
+
+Usage: gen_config.py [--interfaces N] [--rules N] [--routes N] [--nat-sources N] [-o fichier]
+"""
+
+import argparse
+import sys
+
+
+def protocols(index):
+    """Protocoles et ports : port unique, liste, plage, L3 ou any"""
+    port = 1024 + index % 60000
+    return (
+        f"{{tcp: {port}}}",
+        f"{{tcp: [80, 443], udp: {port}}}",
+        f"{{udp: \"{port}:{port + 10}\"}}",
+        "{icmp: true}",
+        "any",
+    )[index % 5]
+
+
+def firewall_rule(index):
+    """Règle firewall variée (chaînes, protocoles, adresses)"""
+    a, b = (index >> 8) & 0xFF, index & 0xFF
+    if index % 3 == 0:
+        match = f"in_interface: eth1, source: 10.{a}.{b}.0/24"
+        chain = "input"
+    else:
+        match = f"in_interface: eth1, out_interface: eth0, source: 10.{a}.{b}.0/24, destination: 172.16.{b}.{a}"
+        chain = "forward"
+    action = ("accept", "drop", "reject")[index % 3]
+    return (
+        f"    - {{name: r{index}, chain: {chain}, action: {action}, {match}, "
+        f"protocols: {protocols(index)}}}\n"
+    )
+
+
+def route(index):
+    """Route IPv4 ou IPv6 vers l'une des deux passerelles"""
+    a, b = (index >> 8) & 0xFF, index & 0xFF
+    if index % 10 == 9:
+        return f"    - {{to: \"2001:db8:{a:x}:{b:x}::/64\", via: \"2001:db8::1\", interface: eth0}}\n"
+    if index % 10 == 8:
+        return f"    - {{to: 100.{a}.{b}.0/24, type: blackhole}}\n"
+    return f"    - {{to: 100.{64 + a % 64}.{b}.0/24, via: 192.0.2.{1 + index % 2}, metric: {index % 5 * 10}}}\n"
+
+
+def nat_source(index):
+    """Réseau source masqueradé (le premier couvre tout le LAN)"""
+    if index == 0:
+        return "10.0.0.0/8"
+    return f"10.{(index >> 8) & 0xFF}.{index & 0xFF}.0/24"
+
+
+def interface(index):
+    """Interface LAN supplémentaire (VLAN), masqueradée sur eth0"""
+    return f"  lan{index}: {{ipv4: 198.{18 + (index >> 8) % 2}.{index & 0xFF}.1/24}}\n"
+
+
+def generate(rules, routes, out, interfaces=2, nat_sources=1):
+    sources = ", ".join(nat_source(index) for index in range(max(nat_sources, 1)))
+    out.write(
+        "system:\n"
+        "  hostname: bench\n"
+        "  dns_servers: [192.0.2.53]\n"
+        "interfaces:\n"
+        f"  eth0: {{ipv4: 192.0.2.10/24, masquerading: true, masquerade_sources: [{sources}]}}\n"
+        "  eth1: {ipv4: 10.0.0.1/8}\n"
+    )
+    for index in range(max(interfaces - 2, 0)):
+        out.write(interface(index))
+    out.write(
+        "routing:\n"
+        "  static:\n"
+    )
+    table_routes = routes // 4
+    for index in range(routes - table_routes):
+        out.write(route(index))
+    out.write("  tables:\n    isp2:\n      id: 100\n      routes:\n")
+    for index in range(routes - table_routes, routes):
+        out.write("  " + route(index))
+    out.write("  rules:\n    - {from: 10.128.0.0/9, table: isp2}\n")
+    out.write("firewall:\n  stateful: true\n  default: {input: drop, forward: drop, output: accept}\n  rules:\n")
+    for index in range(rules):
+        out.write(firewall_rule(index))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Configuration YARP synthétique")
+    parser.add_argument('--interfaces', type=int, default=2, help="interfaces (défaut: 2, maximum 512)")
+    parser.add_argument('--rules', type=int, default=50000, help="règles firewall (défaut: 50000)")
+    parser.add_argument('--routes', type=int, default=20000, help="routes statiques (défaut: 20000)")
+    parser.add_argument('--nat-sources', type=int, default=1, help="sources masqueradées sur eth0 (défaut: 1)")
+    parser.add_argument('-o', '--output', help="fichier de sortie (défaut: stdout)")
+    args = parser.parse_args()
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            generate(args.rules, args.routes, f, args.interfaces, args.nat_sources)
+    else:
+        generate(args.rules, args.routes, sys.stdout, args.interfaces, args.nat_sources)
+
+
+if __name__ == "__main__":
+    main()
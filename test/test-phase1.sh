@@ -29,12 +29,25 @@ for file in \
     "src/core/yarp-apply.sh" \
     "src/core/yarp_config.py" \
     "src/core/yarp_logger.py" \
+    "src/core/yarp_apply.py" \
+    "src/core/yarp_model.py" \
+    "src/core/yarp_schema.py" \
+    "src/core/yarp_plan.py" \
+    "src/core/yarp_diff.py" \
+    "src/core/yarp_rollback.py" \
+    "src/core/yarp_metrics.py" \
+    "src/core/yarp_trace.py" \
+    "src/core/yarp_exec.py" \
+    "src/core/yarp_status.py" \
+    "src/core/yarp_stats.py" \
+    "src/core/yarp_conntrack.py" \
     "src/modules/network.py" \
     "src/modules/routing.py" \
     "src/modules/nat.py" \
     "src/modules/dns.py" \
     "src/modules/firewall.py" \
     "src/init/yarp-motd.sh" \
+    "src/init/yarp-stats" \
     "install/setup.sh"
 do
     if [ -f "$file" ]; then
@@ -65,11 +78,27 @@ echo "Test 3: Syntaxe Python"
 for file in \
     "src/core/yarp_config.py" \
     "src/core/yarp_logger.py" \
+    "src/core/yarp_apply.py" \
+    "src/core/yarp_model.py" \
+    "src/core/yarp_schema.py" \
+    "src/core/yarp_plan.py" \
+    "src/core/yarp_diff.py" \
+    "src/core/yarp_rollback.py" \
+    "src/core/yarp_metrics.py" \
+    "src/core/yarp_trace.py" \
+    "src/core/yarp_exec.py" \
+    "src/core/yarp_status.py" \
+    "src/core/yarp_stats.py" \
+    "src/core/yarp_conntrack.py" \
     "src/modules/network.py" \
     "src/modules/routing.py" \
     "src/modules/nat.py" \
     "src/modules/dns.py" \
-    "src/modules/firewall.py"
+    "src/modules/firewall.py" \
+    "test/bench/gen_config.py" \
+    "test/bench/bench_validate.py" \
+    "test/bench/bench_scale.py" \
+    "test/bench/bench_forward.py"
 do
     if python3 -m py_compile "$file" 2>/dev/null; then
         test_pass "Syntaxe Python valide: $file"
@@ -85,7 +114,8 @@ for file in \
     "src/core/yarp" \
     "src/core/yarp-apply.sh" \
     "install/setup.sh" \
-    "src/init/yarp-motd.sh"
+    "src/init/yarp-motd.sh" \
+    "src/init/yarp-stats"
 do
     if bash -n "$file" 2>/dev/null; then
         test_pass "Syntaxe Bash valide: $file"
@@ -107,6 +137,214 @@ else
     test_fail "Fichier config/yarp.yaml.example manquant"
 fi
 
+# Test 6: Diagnostics du schéma sur des valeurs de type inattendu
+echo ""
+echo "Test 6: Validation du schéma"
+if python3 - <<'PYEOF'
+import sys
+sys.path.insert(0, "src/core")
+import yarp_schema
+
+# Listes YAML là où une chaîne est attendue : diagnostics, pas d'exception
+config = {
+    'routing': {
+        'static': [{'to': ['10.0.0.0/8'], 'via': '192.0.2.1'}],
+        'tables': {'isp2': {'id': 100}},
+        'rules': [{'from': '10.0.0.0/8', 'table': ['isp2']}],
+    },
+}
+paths = {yarp_schema.format_path(d.path) for d in yarp_schema.validate(config)
+         if d.severity == yarp_schema.ERROR}
+assert 'routing.static[0].to' in paths, paths
+assert 'routing.rules[0].table' in paths, paths
+PYEOF
+then
+    test_pass "Destination et table de type liste signalées"
+else
+    test_fail "Valeurs de type liste mal signalées par le schéma"
+fi
+
+# Test 7: Agrégation des routes face aux routes du noyau
+echo ""
+echo "Test 7: Agrégation des routes"
+if python3 - <<'PYEOF'
+import sys, tempfile
+sys.path[:0] = ["src/core", "src/modules"]
+from yarp_config import YARPConfig
+from yarp_exec import executor
+import routing
+
+logs = tempfile.mkdtemp()
+config = YARPConfig()
+config.config = {'logging': {'files': {'application': f"{logs}/apply.log", 'error': f"{logs}/error.log"}}}
+manager = routing.RoutingManager(config)
+routes = [manager._normalize_route({'to': to, 'via': '192.0.2.1', 'metric': 100})
+          for to in ('10.0.0.0/24', '10.0.1.0/25', '10.0.1.128/25')]
+
+def kernel(lines):
+    executor.use(lambda argv, input=None, timeout=None: (0, "".join(f"{line} \n" for line in lines), ""))
+
+# Ancien agrégat YARP (proto 250) : n'empêche pas la fusion
+kernel(["10.0.0.0/23 via 192.0.2.1 dev eth0 proto 250 metric 100"])
+assert [r['dst'] for r in manager.aggregate_routes(routes)] == ['10.0.0.0/23']
+
+# Route connectée entre la /23 et les /25 : elle l'emporterait sur la /23
+kernel(["default via 192.0.2.254 dev eth0 proto dhcp src 192.0.2.10 metric 202",
+        "10.0.1.0/24 dev eth1 proto kernel scope link src 10.0.1.1"])
+assert sorted(r['dst'] for r in manager.aggregate_routes(routes)) == ['10.0.0.0/24', '10.0.1.0/25', '10.0.1.128/25']
+executor.use()
+PYEOF
+then
+    test_pass "Route du noyau non YARP prise en compte par l'agrégation"
+else
+    test_fail "Agrégation recouvrant une route du noyau non YARP"
+fi
+
+# Test 8: Forwarder DNS local (configurations dnsmasq/unbound, resolv.conf)
+echo ""
+echo "Test 8: Forwarder DNS local"
+if python3 - <<'PYEOF'
+import sys, os, tempfile
+sys.path[:0] = ["src/core", "src/modules"]
+from yarp_config import YARPConfig
+import dns
+
+tmp = tempfile.mkdtemp()
+dns.RESOLV_CONF = f"{tmp}/resolv.conf"
+dns.RESOLV_BACKUP = f"{tmp}/resolv.conf.yarp-backup"
+dns.FORWARDER_CONF = {backend: f"{tmp}/{backend}.conf" for backend in dns.FORWARDER_CONF}
+dns.RUN_DIR = f"{tmp}/run"
+dns.PROBE_STATE = f"{tmp}/dns-probe.json"
+
+config = YARPConfig()
+config.config = {
+    'logging': {'files': {'application': f"{tmp}/apply.log", 'error': f"{tmp}/error.log"}},
+    'system': {'dns_servers': ['192.0.2.53', '198.51.100.53']},
+    'interfaces': {'eth1': {'ipv4': '10.0.0.1/24'}},
+    'dns': {'forwarder': {'enabled': True, 'interfaces': ['eth1'],
+                          'cache_size': 5000, 'min_ttl': 60, 'max_ttl': 3600}},
+}
+manager = dns.DNSManager(config)
+
+dnsmasq = manager._render_dnsmasq().splitlines()
+for line in ("server=192.0.2.53", "server=198.51.100.53", "interface=lo", "interface=eth1",
+             "cache-size=5000", "min-cache-ttl=60", "max-cache-ttl=3600"):
+    assert line in dnsmasq, line
+assert dnsmasq.index("server=192.0.2.53") < dnsmasq.index("server=198.51.100.53")
+
+unbound = [line.strip() for line in manager._render_unbound().splitlines()]
+for line in ("interface: 127.0.0.1", "interface: 10.0.0.1",
+             "access-control: 127.0.0.0/8 allow", "access-control: 10.0.0.0/24 allow",
+             "forward-addr: 192.0.2.53", "forward-addr: 198.51.100.53",
+             f"rrset-cache-size: {5000 * dns.UNBOUND_BYTES_PER_ENTRY}",
+             "cache-min-ttl: 60", "cache-max-ttl: 3600"):
+    assert line in unbound, line
+
+def nameservers():
+    with open(dns.RESOLV_CONF) as f:
+        return [line.split()[1] for line in f if line.startswith("nameserver")]
+
+# Forwarder qui ne démarre pas : serveurs amont utilisés directement
+manager._start_forwarder = lambda backend: False
+assert not manager.apply()
+assert os.path.exists(dns.FORWARDER_CONF['dnsmasq'])
+assert nameservers() == ['192.0.2.53', '198.51.100.53']
+
+manager._start_forwarder = lambda backend: True
+assert manager.apply()
+assert nameservers() == [dns.FORWARDER_ADDRESS]
+PYEOF
+then
+    test_pass "Configurations dnsmasq/unbound et resolv.conf du forwarder"
+else
+    test_fail "Forwarder DNS local"
+fi
+
+# Test 9: Mesure des serveurs DNS amont (dns.py probe)
+echo ""
+echo "Test 9: Mesure des serveurs DNS"
+if python3 - <<'PYEOF'
+import sys, os, json, socket, tempfile, threading, time
+sys.path[:0] = ["src/core", "src/modules"]
+from yarp_config import YARPConfig
+import dns
+
+tmp = tempfile.mkdtemp()
+dns.RESOLV_CONF = f"{tmp}/resolv.conf"
+dns.RESOLV_BACKUP = f"{tmp}/resolv.conf.yarp-backup"
+dns.RUN_DIR = f"{tmp}/run"
+dns.PROBE_STATE = f"{tmp}/dns-probe.json"
+
+# Serveurs DNS factices sur 127.0.0.1 et 127.0.0.2 (même port), délai
+# de réponse réglable
+delays = {}
+
+def serve(sock, address):
+    while True:
+        data, peer = sock.recvfrom(512)
+        time.sleep(delays[address])
+        sock.sendto(data[:2] + b'\x81\x80' + data[4:], peer)
+
+port = None
+for address in ('127.0.0.1', '127.0.0.2'):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind((address, port or 0))
+    port = sock.getsockname()[1]
+    threading.Thread(target=serve, args=(sock, address), daemon=True).start()
+
+config = YARPConfig()
+config.config = {
+    'logging': {'files': {'application': f"{tmp}/apply.log", 'error': f"{tmp}/error.log"}},
+    'system': {'dns_servers': ['127.0.0.2', '127.0.0.1']},
+    'dns': {'probe': {'port': port, 'queries': 3, 'timeout': 1.0}},
+}
+manager = dns.DNSManager(config)
+
+def state():
+    with open(dns.PROBE_STATE) as f:
+        return json.load(f)
+
+def seed(scores, order):
+    with open(dns.PROBE_STATE, 'w') as f:
+        json.dump({'servers': {s: {'score': v} for s, v in scores.items()}, 'order': order}, f)
+
+def nameservers():
+    with open(dns.RESOLV_CONF) as f:
+        return [line.split()[1] for line in f if line.startswith("nameserver")]
+
+# Première mesure : score = latence moyenne, serveur le plus rapide en tête
+delays.update({'127.0.0.1': 0.005, '127.0.0.2': 0.040})
+assert manager.probe()
+for entry in state()['servers'].values():
+    assert entry['loss'] == 0 and abs(entry['score'] - entry['latency_ms']) <= 0.01
+assert state()['order'] == ['127.0.0.1', '127.0.0.2']
+assert nameservers() == ['127.0.0.1', '127.0.0.2']
+
+# Gain de 6 % (< PROBE_REORDER_GAIN) : ordre conservé, resolv.conf non réécrit
+delays.update({'127.0.0.1': 0.024, '127.0.0.2': 0.020})
+seed({'127.0.0.1': 24.0, '127.0.0.2': 20.0}, ['127.0.0.1', '127.0.0.2'])
+mtime = os.stat(dns.RESOLV_CONF).st_mtime_ns
+assert manager.probe()
+for server, previous in (('127.0.0.1', 24.0), ('127.0.0.2', 20.0)):
+    entry = state()['servers'][server]
+    expected = dns.PROBE_EWMA_ALPHA * entry['latency_ms'] + (1 - dns.PROBE_EWMA_ALPHA) * previous
+    assert abs(entry['score'] - expected) <= 0.01
+assert state()['order'] == ['127.0.0.1', '127.0.0.2']
+assert os.stat(dns.RESOLV_CONF).st_mtime_ns == mtime
+
+# Même gain au-dessus du seuil : nouvel ordre écrit dans resolv.conf
+dns.PROBE_REORDER_GAIN = 0.01
+seed({'127.0.0.1': 24.0, '127.0.0.2': 20.0}, ['127.0.0.1', '127.0.0.2'])
+assert manager.probe()
+assert state()['order'] == ['127.0.0.2', '127.0.0.1']
+assert nameservers() == ['127.0.0.2', '127.0.0.1']
+PYEOF
+then
+    test_pass "Scores, seuil de réordonnancement et resolv.conf inchangé"
+else
+    test_fail "Mesure des serveurs DNS"
+fi
+
 echo ""
 echo "==================================="
 echo "Tous les tests sont passés !"
@@ -51,11 +51,23 @@ safe_cp src/core/yarp-apply.sh "$BINDIR/yarp-apply"
 safe_cp src/core/yarp-check.sh "$BINDIR/yarp-check"
 safe_cp src/core/yarp_config.py "$COREDIR/yarp_config.py"
 safe_cp src/core/yarp_logger.py "$COREDIR/yarp_logger.py"
+safe_cp src/core/yarp_apply.py "$COREDIR/yarp_apply.py"
+safe_cp src/core/yarp_model.py "$COREDIR/yarp_model.py"
+safe_cp src/core/yarp_schema.py "$COREDIR/yarp_schema.py"
+safe_cp src/core/yarp_plan.py "$COREDIR/yarp_plan.py"
+safe_cp src/core/yarp_diff.py "$COREDIR/yarp_diff.py"
+safe_cp src/core/yarp_rollback.py "$COREDIR/yarp_rollback.py"
+safe_cp src/core/yarp_metrics.py "$COREDIR/yarp_metrics.py"
+safe_cp src/core/yarp_trace.py "$COREDIR/yarp_trace.py"
+safe_cp src/core/yarp_exec.py "$COREDIR/yarp_exec.py"
+safe_cp src/core/yarp_status.py "$COREDIR/yarp_status.py"
+safe_cp src/core/yarp_stats.py "$COREDIR/yarp_stats.py"
+safe_cp src/core/yarp_conntrack.py "$COREDIR/yarp_conntrack.py"
 safe_cp VERSION "$PREFIX/VERSION"
 
 # Permissions core
 chmod 755 "$BINDIR/yarp" "$BINDIR/yarp-apply" "$BINDIR/yarp-check"
-chmod 644 "$COREDIR/yarp_config.py" "$COREDIR/yarp_logger.py"
+chmod 644 "$COREDIR/yarp_config.py" "$COREDIR/yarp_logger.py" "$COREDIR/yarp_apply.py" "$COREDIR/yarp_model.py" "$COREDIR/yarp_schema.py" "$COREDIR/yarp_plan.py" "$COREDIR/yarp_diff.py" "$COREDIR/yarp_rollback.py" "$COREDIR/yarp_metrics.py" "$COREDIR/yarp_trace.py" "$COREDIR/yarp_exec.py" "$COREDIR/yarp_status.py" "$COREDIR/yarp_stats.py" "$COREDIR/yarp_conntrack.py"
 
 # Mise à jour des modules
 echo "[2/5] Mise à jour des modules..."
@@ -67,7 +79,8 @@ done
 # Mise à jour du service OpenRC
 echo "[3/5] Mise à jour du service OpenRC..."
 safe_cp src/init/yarp /etc/init.d/yarp
-chmod 755 /etc/init.d/yarp
+safe_cp src/init/yarp-stats /etc/init.d/yarp-stats
+chmod 755 /etc/init.d/yarp /etc/init.d/yarp-stats
 
 # Mise à jour du MOTD
 echo "[4/5] Mise à jour du MOTD..."
@@ -84,7 +97,7 @@ echo "Mise à jour terminée (v${YARP_VERSION})"
 echo "==================================="
 echo ""
 echo "Fichiers mis à jour :"
-echo "  Core    : yarp, yarp-apply, yarp-check, yarp_config.py, yarp_logger.py"
+echo "  Core    : yarp, yarp-apply, yarp-check, yarp_config.py, yarp_logger.py, yarp_apply.py, yarp_model.py, yarp_schema.py, yarp_plan.py, yarp_diff.py, yarp_rollback.py, yarp_metrics.py, yarp_trace.py, yarp_exec.py, yarp_status.py, yarp_stats.py, yarp_conntrack.py"
 echo "  Modules :"
 for module in "$MODULEDIR"/*.py; do
     [ "$(basename "$module")" = "__init__.py" ] && continue